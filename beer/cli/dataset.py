@@ -1,11 +1,19 @@
 'Structure over a dataset.'
 
 from dataclasses import dataclass, field
+import os
+import queue
 import random
+import threading
 from typing import NamedTuple, Any
+import zipfile
 import numpy as np
 import torch
 
+from .featurestore import load_features
+from .featurestore import FeatureStore
+from .kaldi import KaldiArchive
+
 
 class Utterance(NamedTuple):
     'An audio recording and the associated meta-data.'
@@ -15,6 +23,33 @@ class Utterance(NamedTuple):
     #transcription: str = None
 
 
+def _features_tensor(array):
+    # The features are used as float. The tensor shares the memory of
+    # the array if it already has the right type.
+    tensor = torch.from_numpy(array)
+    if tensor.dtype != torch.float32:
+        tensor = tensor.float()
+    return tensor
+
+
+def _npz_lengths(path):
+    # Number of frames of each array of the archive read from the
+    # header of the arrays (i.e. without loading the data).
+    lengths = {}
+    with zipfile.ZipFile(path) as archive:
+        for name in archive.namelist():
+            with archive.open(name) as fid:
+                version = np.lib.format.read_magic(fid)
+                if version == (1, 0):
+                    shape, _, _ = np.lib.format.read_array_header_1_0(fid)
+                else:
+                    shape, _, _ = np.lib.format.read_array_header_2_0(fid)
+            if name.endswith('.npy'):
+                name = name[:-len('.npy')]
+            lengths[name] = shape[0]
+    return lengths
+
+
 class UtteranceIterator:
 
     def __init__(self, utts, fea_dict):
@@ -30,25 +65,112 @@ class UtteranceIterator:
             uttid = self.utts[self.idx]
         except IndexError:
             raise StopIteration
-        features = torch.from_numpy(self.fea_dict[uttid]).float()
+        features = _features_tensor(self.fea_dict[uttid])
         self.idx += 1
         return Utterance(id=uttid, features=features)
 
 
+_END_OF_ITERATION = object()
+
+
+class _IterationError:
+
+    def __init__(self, error):
+        self.error = error
+
+
+def _prefetch(iterator, items, stop):
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    try:
+        for item in iterator:
+            if not put(item):
+                return
+        put(_END_OF_ITERATION)
+    except Exception as error:
+        put(_IterationError(error))
+
+
+class PrefetchIterator:
+    '''Iterator over the items of another iterator which are loaded in
+    advance by a background thread.
+
+    '''
+
+    def __init__(self, iterator, depth=2):
+        '''
+        Args:
+            iterator (iterator): Iterator to wrap.
+            depth (int): Maximum number of items loaded in advance.
+        '''
+        self._items = queue.Queue(maxsize=depth)
+        self._stop = threading.Event()
+        self._done = False
+        self._thread = threading.Thread(
+            target=_prefetch,
+            args=(iterator, self._items, self._stop),
+            daemon=True
+        )
+        self._thread.start()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._done:
+            raise StopIteration
+        item = self._items.get()
+        if item is _END_OF_ITERATION:
+            self._done = True
+            raise StopIteration
+        if isinstance(item, _IterationError):
+            self._done = True
+            raise item.error
+        return item
+
+    def close(self):
+        'Stop the background thread.'
+        self._stop.set()
+        self._done = True
+
+    def __del__(self):
+        self.close()
+
+
 @dataclass
 class Dataset:
-    'A collection of utterances with their features and meta-data.'
+    '''A collection of utterances with their features and meta-data.
+
+    Attributes:
+        utt2spk (dict): Speaker of each utterance (optional).
+        spk_stats (dict): Mean, variance and number of frames of the
+            features of each speaker (optional).
+    '''
 
     feapath: str
     mean: torch.Tensor
     var: torch.Tensor
     size: int
     _fea_dict: Any = field(default=None)
+    utt2spk: dict = field(default=None)
+    spk_stats: dict = field(default=None)
+    _lengths: dict = field(default=None, repr=False)
 
     @property
     def fea_dict(self):
-        if self._fea_dict is None:
-            self._fea_dict = np.load(self.feapath)
+        # The archive is re-opened by each process (e.g. after a fork)
+        # as the file handle cannot be shared.
+        if self._fea_dict is None or \
+                self.__dict__.get('_pid', None) != os.getpid():
+            self._fea_dict = load_features(self.feapath)
+            self._pid = os.getpid()
         return self._fea_dict
 
     def __getstate__(self):
@@ -56,15 +178,30 @@ class Dataset:
         return self.__dict__
 
     def __len__(self):
-        features = np.load(self.feapath)
-        return len(features.files)
+        return len(self.lengths())
 
-    def utterances(self, random_order=True):
+    def lengths(self):
+        '''Number of frames of each utterance.
+
+        Returns:
+            dict: Number of frames indexed by utterance id.
+
+        '''
+        if self._lengths is None:
+            if isinstance(self.fea_dict, (FeatureStore, KaldiArchive)):
+                self._lengths = self.fea_dict.lengths()
+            else:
+                self._lengths = _npz_lengths(self.feapath)
+        return self._lengths
+
+    def utterances(self, random_order=True, prefetch=0):
         '''Return an iterator over the utterances.
 
         Args:
             random_order (boolean): If False, iterate over the
                 utterances sorted alphabetically by their id.
+            prefetch (int): Number of utterances loaded in advance by
+                a background thread (0 means no prefetching).
 
         Returns:
             ``iterable``
@@ -73,9 +210,46 @@ class Dataset:
         uttsid = sorted(list(self.fea_dict.keys()))
         if random_order:
             random.shuffle(uttsid)
-        return UtteranceIterator(uttsid, self.fea_dict)
+        iterator = UtteranceIterator(uttsid, self.fea_dict)
+        if prefetch > 0:
+            return PrefetchIterator(iterator, depth=prefetch)
+        return iterator
+
+    def batches(self, batch_size, random_order=True, bucketing=False,
+                prefetch=0):
+        '''Return an iterator over batches of utterances.
+
+        Args:
+            batch_size (int): Number of utterances per batch.
+            random_order (boolean): If False, the utterances are
+                sorted alphabetically by id (or by length if
+                `bucketing` is True) and the batches are not shuffled.
+            bucketing (boolean): If True, group the utterances of
+                similar length in the same batch.
+            prefetch (int): Number of batches loaded in advance by a
+                background thread (0 means no prefetching).
+
+        Returns:
+            ``iterable`` of list of :any:`Utterance`
+
+        '''
+        uttsid = sorted(list(self.fea_dict.keys()))
+        if random_order:
+            random.shuffle(uttsid)
+        if bucketing:
+            lengths = self.lengths()
+            uttsid.sort(key=lambda uttid: lengths[uttid])
+        batches = [uttsid[i: i + batch_size]
+                   for i in range(0, len(uttsid), batch_size)]
+        if random_order:
+            random.shuffle(batches)
+        iterator = (list(UtteranceIterator(batch, self.fea_dict))
+                    for batch in batches)
+        if prefetch > 0:
+            return PrefetchIterator(iterator, depth=prefetch)
+        return iterator
 
     def __getitem__(self, key):
-        features = torch.from_numpy(self.fea_dict[key]).float()
+        features = _features_tensor(self.fea_dict[key])
         return Utterance(key, features)
 
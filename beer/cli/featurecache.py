@@ -0,0 +1,134 @@
+'''Content-addressed cache of the extracted features.
+
+The features of an utterance are stored in a file named after a hash
+of:
+
+  * the audio: the path, modification time and size of the audio
+    file (or of the files used by the command when the audio is read
+    from a command),
+  * the configuration of the features,
+  * the code producing the features: the features extraction
+    (:any:`beer.features`) and the reading/resampling of the audio
+    ("beer features extract").
+
+Re-extracting the features of an unchanged audio file with the same
+configuration is then a simple read of the cached features.
+
+'''
+
+import hashlib
+import json
+import os
+import shlex
+import tempfile
+
+import numpy as np
+
+from .. import features as _features
+
+
+# Source files of the code producing the features. The package has no
+# version number to rely on.
+_CODE_FILES = [
+    _features.__file__,
+    os.path.join(os.path.dirname(__file__), 'subcommands', 'features',
+                 'extract.py'),
+]
+
+
+def _code_digest():
+    digest = hashlib.sha256()
+    for path in _CODE_FILES:
+        with open(path, 'rb') as fid:
+            digest.update(fid.read())
+    return digest.hexdigest()
+
+
+def _file_identity(path):
+    stat = os.stat(path)
+    return [os.path.abspath(path), stat.st_mtime_ns, stat.st_size]
+
+
+def audio_identity(inwav):
+    '''Identity of the audio of an utterance.
+
+    Args:
+        inwav (str): Path to a wav file or command ending with "|".
+
+    Returns:
+        list: Path, modification time and size of the audio file. For
+            a command, the command itself and the identity of the
+            existing files in its arguments.
+
+    '''
+    if inwav[-1] != '|':
+        return _file_identity(inwav)
+    identity = [inwav]
+    try:
+        tokens = shlex.split(inwav[:-1])
+    except ValueError:
+        tokens = inwav[:-1].split()
+    for token in tokens:
+        if os.path.isfile(token):
+            identity.append(_file_identity(token))
+    return identity
+
+
+class FeatureCache:
+    '''Cache of the features stored in a directory.
+
+    Note:
+        The audio read from a command is assumed to depend only on
+        the command and on the files given as arguments.
+
+    '''
+
+    def __init__(self, path, conf):
+        '''
+        Args:
+            path (str): Directory of the cache.
+            conf (dict): Configuration of the features.
+        '''
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.conf_digest = hashlib.sha256(json.dumps(
+            [json.dumps(conf, sort_keys=True), _code_digest()]
+        ).encode('utf-8')).hexdigest()
+
+    def key(self, inwav):
+        'Key of the features of an audio file (or command).'
+        data = json.dumps([self.conf_digest, audio_identity(inwav)])
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.path, key[:2], key + '.npy')
+
+    def __contains__(self, key):
+        return os.path.isfile(self._path(key))
+
+    def get(self, key):
+        '''Cached features or None if the features are not in the
+        cache.'''
+        try:
+            return np.load(self._path(key))
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, features):
+        'Store features in the cache.'
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # The features are written in a temporary file and renamed so
+        # that concurrent readers never see a partial file.
+        fid, tmppath = tempfile.mkstemp(dir=os.path.dirname(path),
+                                        suffix='.tmp')
+        try:
+            with os.fdopen(fid, 'wb') as f:
+                np.save(f, features)
+            os.replace(tmppath, path)
+        except BaseException:
+            os.remove(tmppath)
+            raise
+
+
+__all__ = ['FeatureCache', 'audio_identity']
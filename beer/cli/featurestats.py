@@ -0,0 +1,153 @@
+'''Statistics (mean, variance and frame counts) of the features of a
+data set computed in a single parallel pass.
+
+'''
+
+import multiprocessing
+from typing import NamedTuple
+
+import numpy as np
+import torch
+
+from .featurestore import load_features
+
+
+class Moments:
+    '''Frame count, mean and sum of the squared deviations from the
+    mean of a set of frames. Moments of different sets are merged
+    with the parallel version of Welford's algorithm which, contrary
+    to the E[x^2] - E[x]^2 formula, is numerically stable.'''
+
+    def __init__(self, count, mean, m2):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+    @classmethod
+    def from_features(cls, features):
+        features = np.asarray(features, dtype=np.float64)
+        if len(features) == 0:
+            zeros = np.zeros(features.shape[1])
+            return cls(0, zeros, zeros)
+        mean = features.mean(axis=0)
+        return cls(len(features), mean, ((features - mean) ** 2).sum(axis=0))
+
+    def __add__(self, other):
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            return other
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        mean = self.mean + delta * (other.count / count)
+        m2 = self.m2 + other.m2 + \
+            delta ** 2 * (self.count * other.count / count)
+        return Moments(count, mean, m2)
+
+    @property
+    def var(self):
+        return self.m2 / self.count
+
+
+class FeaturesStatistics(NamedTuple):
+    'Statistics of the features of a data set.'
+    mean: torch.Tensor
+    var: torch.Tensor
+    nframes: int
+    lengths: dict
+    spk_stats: dict
+
+
+def _merge_pairwise(moments):
+    # Merge the moments in a balanced tree: each moment is merged
+    # with moments accumulated over similar number of frames.
+    moments = list(moments)
+    while len(moments) > 1:
+        merged = []
+        for i in range(0, len(moments) - 1, 2):
+            merged.append(moments[i] + moments[i + 1])
+        if len(moments) % 2 == 1:
+            merged.append(moments[-1])
+        moments = merged
+    return moments[0]
+
+
+def _accumulate_chunk(feature_file, uttids, utt2spk):
+    feats = load_features(feature_file)
+    utt_moments, spk_moments, lengths = [], {}, {}
+    for uttid in uttids:
+        moments = Moments.from_features(feats[uttid])
+        lengths[uttid] = moments.count
+        utt_moments.append(moments)
+        if utt2spk is not None:
+            spk_moments.setdefault(utt2spk[uttid], []).append(moments)
+    spk_moments = {spk: _merge_pairwise(moments)
+                   for spk, moments in spk_moments.items()}
+    return _merge_pairwise(utt_moments), spk_moments, lengths
+
+
+def _to_tensor(array):
+    return torch.from_numpy(array).float()
+
+
+def accumulate(feature_file, jobs=1, utt2spk=None, chunk_size=100):
+    '''Compute the global mean, variance and frame counts of the
+    features in a single pass. The utterances are processed by chunks
+    in parallel.
+
+    Args:
+        feature_file (str): feature file (npz) or feature store
+        jobs (int): number of parallel jobs
+        utt2spk (dict): mapping utterance -> speaker. If given, the
+            mean and variance of each speaker are computed as well.
+        chunk_size (int): number of utterances processed by a job
+            at once
+    Returns:
+        :any:`FeaturesStatistics`
+    '''
+    uttids = sorted(load_features(feature_file).keys())
+    if not uttids:
+        raise ValueError(f'no features in {feature_file}')
+    if utt2spk is not None:
+        missing = [uttid for uttid in uttids if uttid not in utt2spk]
+        if missing:
+            raise ValueError(f'unknown speaker for utterance: {missing[0]}')
+        utt2spk = {uttid: utt2spk[uttid] for uttid in uttids}
+    tasks = [(feature_file, uttids[i: i + chunk_size], utt2spk)
+             for i in range(0, len(uttids), chunk_size)]
+    if jobs > 1 and len(tasks) > 1:
+        with multiprocessing.Pool(jobs) as pool:
+            results = pool.starmap(_accumulate_chunk, tasks)
+    else:
+        results = [_accumulate_chunk(*task) for task in tasks]
+
+    lengths, spk_moments = {}, {}
+    for _, chunk_spk_moments, chunk_lengths in results:
+        lengths.update(chunk_lengths)
+        for spk, moments in chunk_spk_moments.items():
+            spk_moments.setdefault(spk, []).append(moments)
+    spk_stats = None
+    if utt2spk is not None:
+        spk_stats = {}
+        for spk, moments in spk_moments.items():
+            moments = _merge_pairwise(moments)
+            spk_stats[spk] = (_to_tensor(moments.mean),
+                              _to_tensor(moments.var), moments.count)
+    total = _merge_pairwise(result[0] for result in results)
+    return FeaturesStatistics(_to_tensor(total.mean), _to_tensor(total.var),
+                              int(total.count), lengths, spk_stats)
+
+
+def read_utt2spk(path):
+    'Read a "utt2spk" file (one "<uttid> <speaker>" per line).'
+    with open(path, 'r') as fid:
+        return dict(line.strip().split(None, 1) for line in fid
+                    if line.strip())
+
+
+__all__ = [
+    'FeaturesStatistics',
+    'Moments',
+    'accumulate',
+    'read_utt2spk',
+]
@@ -0,0 +1,450 @@
+'''Memory-mapped storage of the features.
+
+A feature store is a directory containing the features of all the
+utterances concatenated in one or several ".npy" files (the shards)
+and an index with one line per utterance:
+
+.. code-block:: text
+
+   <uttid> <shard> <offset> <nframes> <row>
+
+where "row" is the position of the utterance in its shard.
+
+Each shard is written by a single writer along with its own index
+file ("index.<shard>") so that several processes can write the
+shards of a store concurrently. The index of the store is the union
+of the indices of the shards; it can be consolidated in a single
+"index" file with :any:`build_index`.
+
+The ".npy" files are opened with ``numpy.memmap`` so that loading the
+features of an utterance is a zero-copy slice.
+
+To reduce the size of the store, the features can be stored with a
+reduced precision: "float16" or "int16"/"int8". For the integer
+types, the features of each utterance are quantized with an affine
+transformation (one per dimension) whose parameters are stored in
+"quant.<shard>.npy" (one row per utterance, given by the "row" field
+of the index). The features are dequantized when they are loaded.
+
+'''
+
+import glob
+import os
+
+import numpy as np
+
+from .kaldi import KaldiArchive
+from .kaldi import is_kaldi_archive
+
+
+INDEX_FNAME = 'index'
+
+# Size (in bytes) reserved for the header of the ".npy" files. The
+# header is written once all the features have been stored.
+_HEADER_SIZE = 128
+
+
+def _shard_fname(shard):
+    return f'features.{shard}.npy'
+
+
+def _shard_index_fname(shard):
+    return f'{INDEX_FNAME}.{shard}'
+
+
+def _quant_fname(shard):
+    return f'quant.{shard}.npy'
+
+
+PRECISIONS = ['float32', 'float16', 'int16', 'int8']
+
+
+def _quantize(features, dtype):
+    # Affine quantization of each dimension: the range of values of
+    # the utterance is mapped to the range of the integer type. The
+    # offset is the minimum of the values (stored exactly) and the
+    # integers are shifted by the minimum of the integer type.
+    info = np.iinfo(dtype)
+    if len(features) > 0:
+        fmin, fmax = features.min(axis=0), features.max(axis=0)
+    else:
+        fmin, fmax = np.zeros(features.shape[1]), np.zeros(features.shape[1])
+    params = np.stack([fmin, (fmax - fmin) / (int(info.max) - int(info.min))])
+    params = params.astype(np.float32)
+    # The constant dimensions have a null scale: all their values are
+    # quantized to the minimum of the integer type and restored
+    # exactly.
+    scale = np.where(params[1] > 0, params[1], 1.)
+    quantized = np.rint((features - params[0]) / scale) + int(info.min)
+    quantized = np.clip(quantized, info.min, info.max).astype(dtype)
+    return quantized, params
+
+
+def _dequantize(quantized, params):
+    shift = np.float32(np.iinfo(quantized.dtype).min)
+    return (quantized.astype(np.float32) - shift) * params[1] + params[0]
+
+
+def _npy_header(dtype, shape):
+    header = repr({
+        'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)),
+        'fortran_order': False,
+        'shape': tuple(shape),
+    })
+    preamble = np.lib.format.MAGIC_PREFIX + bytes([1, 0])
+    # Magic string (6 bytes) + version (2 bytes) + header length (2
+    # bytes) + header padded with spaces and terminated by a new line.
+    hlen = _HEADER_SIZE - len(preamble) - 2
+    if len(header) + 1 > hlen:
+        raise ValueError('Array header too long')
+    header = header.ljust(hlen - 1) + '\n'
+    return preamble + hlen.to_bytes(2, 'little') + header.encode('latin1')
+
+
+class FeatureStoreWriter:
+    '''Write the features of utterances in a shard of a feature store.
+    Different shards of the same store can be written concurrently.
+
+    Example:
+        >>> with FeatureStoreWriter('feats') as store:
+        ...     for uttid, features in utterances:
+        ...         store.add(uttid, features)
+
+    '''
+
+    def __init__(self, path, shard=0, precision=None):
+        '''
+        Args:
+            path (str): Directory of the store.
+            shard (int): Index of the shard to write.
+            precision (str): Type used to store the features (one of
+                :any:`PRECISIONS`). By default, the type of the
+                features is kept.
+        '''
+        if precision is not None and precision not in PRECISIONS:
+            raise ValueError(f'Unknown precision: {precision}')
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.shard = shard
+        self.index = []
+        self.dtype = np.dtype(precision) if precision is not None else None
+        self.dim = None
+        self.nframes = 0
+        self.max_error = 0.
+        self._quant = []
+        self.sqerror = 0.
+        self.nvalues = 0
+        self._fid = open(os.path.join(path, _shard_fname(shard)), 'wb')
+        self._fid.write(bytes(_HEADER_SIZE))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def add(self, uttid, features):
+        '''Add the features of an utterance.
+
+        Args:
+            uttid (str): Utterance id.
+            features (``numpy.ndarray[nframes, dim]``): Features.
+
+        '''
+        features = np.asarray(features)
+        if features.ndim != 2:
+            raise ValueError('The features should be a 2D array')
+        if self.dtype is None:
+            self.dtype = features.dtype
+        if self.dim is None:
+            self.dim = features.shape[1]
+        if features.shape[1] != self.dim:
+            raise ValueError(f'{uttid}: expected features of dimension '
+                             f'{self.dim}, got {features.shape[1]}')
+        if np.issubdtype(self.dtype, np.integer):
+            data, params = _quantize(features, self.dtype)
+            self._quant.append(params)
+            self._update_error(features, _dequantize(data, params))
+        else:
+            data = np.ascontiguousarray(features, dtype=self.dtype)
+            if data.dtype.itemsize < features.dtype.itemsize:
+                self._update_error(features, data)
+        self._fid.write(data.tobytes())
+        self.index.append((uttid, self.shard, self.nframes, len(data),
+                           len(self.index)))
+        self.nframes += len(data)
+
+    def _update_error(self, features, stored):
+        if features.size == 0:
+            return
+        error = np.abs(stored.astype(np.float64) - features)
+        self.max_error = max(self.max_error, float(error.max()))
+        self.sqerror += float((error ** 2).sum())
+        self.nvalues += error.size
+
+    def quantization_error(self):
+        '''Error due to the storage of the features with a reduced
+        precision.
+
+        Returns:
+            tuple: Maximum absolute error and Root Mean Squared error.
+
+        '''
+        if self.nvalues == 0:
+            return 0., 0.
+        return self.max_error, (self.sqerror / self.nvalues) ** .5
+
+    def abort(self):
+        '''Stop writing the shard and remove its (incomplete) features
+        file. The index of the shard is not written.'''
+        if self._fid is None:
+            return
+        self._fid.close()
+        self._fid = None
+        os.remove(os.path.join(self.path, _shard_fname(self.shard)))
+
+    def close(self):
+        'Write the header of the features file and the index.'
+        if self._fid is None:
+            return
+        dtype = self.dtype if self.dtype is not None else np.float32
+        dim = self.dim if self.dim is not None else 0
+        self._fid.seek(0)
+        self._fid.write(_npy_header(dtype, (self.nframes, dim)))
+        self._fid.close()
+        self._fid = None
+        if np.issubdtype(dtype, np.integer):
+            quant = np.array(self._quant, dtype=np.float32).reshape(-1, 2, dim)
+            np.save(os.path.join(self.path, _quant_fname(self.shard)), quant)
+        write_index(os.path.join(self.path, _shard_index_fname(self.shard)),
+                    self.index)
+
+
+def write_index(path, index):
+    '''Write the index of a feature store.
+
+    Args:
+        path (str): Path of the index file.
+        index (list): List of (uttid, shard, offset, nframes, row).
+
+    '''
+    with open(path, 'w') as fid:
+        for entry in index:
+            print(*(field for field in entry if field is not None),
+                  file=fid)
+
+
+def read_index(path):
+    '''Read the index of a feature store.
+
+    Args:
+        path (str): Path of the index file.
+
+    Returns:
+        dict: (shard, offset, nframes, row) indexed by utterance id.
+            The row is None for the indices written without it (the
+            features cannot be dequantized).
+
+    '''
+    index = {}
+    with open(path, 'r') as fid:
+        for line in fid:
+            uttid, *fields = line.split()
+            if len(fields) == 3:
+                fields.append(None)
+            shard, offset, nframes, row = fields
+            index[uttid] = (int(shard), int(offset), int(nframes),
+                            None if row is None else int(row))
+    return index
+
+
+def _read_shards_index(path):
+    index = {}
+    for fname in glob.glob(os.path.join(path, _shard_index_fname('*'))):
+        for uttid, value in read_index(fname).items():
+            if uttid in index:
+                raise ValueError(f'{uttid}: duplicated utterance in {path}')
+            index[uttid] = value
+    return index
+
+
+def build_index(path):
+    '''Merge the indices of the shards of a feature store into the
+    index of the store.
+
+    Args:
+        path (str): Directory of the store.
+
+    Returns:
+        int: Number of utterances in the store.
+
+    '''
+    index = _read_shards_index(path)
+    items = sorted(index.items(), key=lambda item: item[1][:2])
+    write_index(os.path.join(path, INDEX_FNAME),
+                [(uttid,) + value for uttid, value in items])
+    return len(items)
+
+
+class FeatureStore:
+    '''Read-only access to a feature store. The store behaves like
+    (read-only) dictionary of features indexed by utterance id.
+
+    Note:
+        The arrays returned are (copy-on-write) views of the memory
+        mapped file unless the features are quantized.
+
+    '''
+
+    def __init__(self, path):
+        '''
+        Args:
+            path (str): Directory of the store.
+        '''
+        self.path = path
+        index_path = os.path.join(path, INDEX_FNAME)
+        if os.path.isfile(index_path):
+            self.index = read_index(index_path)
+        else:
+            self.index = _read_shards_index(path)
+        self._shards = {}
+        self._quant = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_shards'] = {}
+        state['_quant'] = {}
+        return state
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, uttid):
+        return uttid in self.index
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def keys(self):
+        'Utterance ids of the store.'
+        return self.index.keys()
+
+    def _shard(self, shard):
+        try:
+            return self._shards[shard]
+        except KeyError:
+            path = os.path.join(self.path, _shard_fname(shard))
+            array = np.load(path, mmap_mode='c')
+            self._shards[shard] = array
+            return array
+
+    def _quantization(self, shard):
+        # Parameters of the quantization of the shard or None if the
+        # features are not quantized.
+        try:
+            return self._quant[shard]
+        except KeyError:
+            path = os.path.join(self.path, _quant_fname(shard))
+            quant = np.load(path) if os.path.isfile(path) else None
+            self._quant[shard] = quant
+            return quant
+
+    def __getitem__(self, uttid):
+        shard, offset, nframes, row = self.index[uttid]
+        features = np.asarray(self._shard(shard)[offset: offset + nframes])
+        quant = self._quantization(shard)
+        if quant is not None:
+            if row is None:
+                raise ValueError(f'{uttid}: missing quantization row in '
+                                 f'the index of {self.path}')
+            features = _dequantize(features, quant[row])
+        return features
+
+    def lengths(self):
+        '''Number of frames of each utterance.
+
+        Returns:
+            dict: Number of frames indexed by utterance id.
+
+        '''
+        return {uttid: nframes
+                for uttid, (_, _, nframes, _) in self.index.items()}
+
+    def shards(self):
+        '''Utterances of each shard of the store.
+
+        Returns:
+            dict: List of utterance ids indexed by shard.
+
+        '''
+        shards = {}
+        for uttid, (shard, _, _, _) in self.index.items():
+            shards.setdefault(shard, []).append(uttid)
+        return shards
+
+    def partition(self, nparts):
+        '''Split the utterances into groups of whole shards so that
+        each group can be read from a few files only (e.g. one group
+        per process for distributed training). The shards are
+        assigned so as to balance the number of frames of the groups.
+
+        Args:
+            nparts (int): Number of groups.
+
+        Returns:
+            list: `nparts` lists of utterance ids.
+
+        '''
+        lengths = self.lengths()
+        shards = sorted(self.shards().values(),
+                        key=lambda uttids: sum(lengths[uttid]
+                                               for uttid in uttids),
+                        reverse=True)
+        parts = [[] for _ in range(nparts)]
+        counts = [0] * nparts
+        for uttids in shards:
+            idx = counts.index(min(counts))
+            parts[idx] += uttids
+            counts[idx] += sum(lengths[uttid] for uttid in uttids)
+        return parts
+
+
+def is_feature_store(path):
+    'Return True if `path` is a feature store.'
+    if os.path.isfile(os.path.join(path, INDEX_FNAME)):
+        return True
+    return bool(glob.glob(os.path.join(path, _shard_index_fname('*'))))
+
+
+def load_features(path):
+    '''Open a features archive: either a feature store, a binary
+    Kaldi archive (".ark") or script file (".scp") or a ".npz"
+    archive.
+
+    Args:
+        path (str): Path to the features.
+
+    Returns:
+        (read-only) dictionary like object.
+
+    '''
+    if is_feature_store(path):
+        return FeatureStore(path)
+    if is_kaldi_archive(path):
+        return KaldiArchive(path)
+    return np.load(path)
+
+
+__all__ = [
+    'PRECISIONS',
+    'FeatureStore',
+    'FeatureStoreWriter',
+    'build_index',
+    'is_feature_store',
+    'load_features',
+    'read_index',
+    'write_index',
+]
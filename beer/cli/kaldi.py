@@ -0,0 +1,266 @@
+'''Reader of the features stored in binary Kaldi archives (".ark")
+and script files (".scp").
+
+The archives are memory mapped: the uncompressed matrices are
+returned as zero-copy views of the file and the compressed matrices
+are decompressed with vectorized operations. Only the binary
+matrices are supported (tokens "FM", "DM", "CM", "CM2" and "CM3").
+
+'''
+
+import mmap
+import os
+
+import numpy as np
+
+
+_BINARY_MARKER = b'\0B'
+
+# Types of the uncompressed matrices.
+_DTYPES = {
+    'FM': np.dtype('<f4'),
+    'DM': np.dtype('<f8'),
+}
+
+# Kaldi's conversion factor of the 16 bits integers to float.
+_UINT16_TO_FLOAT = 1.52590218966964e-05
+
+
+def _read_token(buffer, offset):
+    end = buffer.find(b' ', offset)
+    if end < 0:
+        raise ValueError(f'Truncated Kaldi archive (offset: {offset})')
+    return bytes(buffer[offset:end]).decode('latin1'), end + 1
+
+
+def _read_int32(buffer, offset):
+    # Kaldi's binary integers are preceded by their size.
+    if buffer[offset] != 4:
+        raise ValueError(f'Expected 32 bits integer (offset: {offset})')
+    return int.from_bytes(buffer[offset + 1: offset + 5], 'little',
+                          signed=True), offset + 5
+
+
+def _matrix_header(buffer, offset):
+    # Return the type, the shape, the offset and the size (in bytes)
+    # of the data of a matrix.
+    if buffer[offset: offset + 2] != _BINARY_MARKER:
+        raise ValueError(f'Only the binary Kaldi archives are supported '
+                         f'(offset: {offset})')
+    token, offset = _read_token(buffer, offset + 2)
+    if token in _DTYPES:
+        nrows, offset = _read_int32(buffer, offset)
+        ncols, offset = _read_int32(buffer, offset)
+        nbytes = nrows * ncols * _DTYPES[token].itemsize
+    elif token in ('CM', 'CM2', 'CM3'):
+        nrows, ncols = np.frombuffer(buffer, dtype='<i4', count=2,
+                                     offset=offset + 8)
+        nrows, ncols = int(nrows), int(ncols)
+        offset += 16
+        if token == 'CM':
+            nbytes = 8 * ncols + nrows * ncols
+        elif token == 'CM2':
+            nbytes = 2 * nrows * ncols
+        else:
+            nbytes = nrows * ncols
+    else:
+        raise ValueError(f'Unsupported Kaldi object: "{token}"')
+    return token, nrows, ncols, offset, nbytes
+
+
+def _uncompress_cm(buffer, offset, min_value, value_range, nrows, ncols):
+    # Each column is quantized with 8 bits with a piecewise linear
+    # function defined by its 0th, 25th, 75th and 100th percentiles.
+    headers = np.frombuffer(buffer, dtype='<u2', count=4 * ncols,
+                            offset=offset).reshape(ncols, 4)
+    percentiles = min_value + value_range * np.float32(_UINT16_TO_FLOAT) * \
+        headers.astype(np.float32)
+    p0, p25, p75, p100 = [percentiles[:, i: i + 1] for i in range(4)]
+    data = np.frombuffer(buffer, dtype=np.uint8, count=nrows * ncols,
+                         offset=offset + 8 * ncols).reshape(ncols, nrows)
+    data = data.astype(np.float32)
+    matrix = np.where(
+        data <= 64,
+        p0 + (p25 - p0) * data * np.float32(1 / 64),
+        np.where(data <= 192,
+                 p25 + (p75 - p25) * (data - 64) * np.float32(1 / 128),
+                 p75 + (p100 - p75) * (data - 192) * np.float32(1 / 63))
+    )
+    return matrix.T
+
+
+def read_matrix(buffer, offset):
+    '''Read a binary Kaldi matrix.
+
+    Args:
+        buffer (object): Buffer (e.g. ``mmap.mmap``) containing the
+            matrix.
+        offset (int): Offset of the matrix (i.e. of the binary marker
+            "\\0B") in the buffer.
+
+    Returns:
+        ``numpy.ndarray[nrows, ncols]``: The matrix. For uncompressed
+            matrices, this is a view of the buffer.
+
+    '''
+    token, nrows, ncols, data_offset, _ = _matrix_header(buffer, offset)
+    if token in _DTYPES:
+        return np.frombuffer(buffer, dtype=_DTYPES[token],
+                             count=nrows * ncols,
+                             offset=data_offset).reshape(nrows, ncols)
+    min_value, value_range = np.frombuffer(buffer, dtype='<f4', count=2,
+                                           offset=data_offset - 16)
+    if token == 'CM':
+        return _uncompress_cm(buffer, data_offset, min_value, value_range,
+                              nrows, ncols)
+    if token == 'CM2':
+        dtype, increment = '<u2', value_range * np.float32(1 / 65535)
+    else:
+        dtype, increment = np.uint8, value_range * np.float32(1 / 255)
+    data = np.frombuffer(buffer, dtype=dtype, count=nrows * ncols,
+                         offset=data_offset).reshape(nrows, ncols)
+    return min_value + increment * data.astype(np.float32)
+
+
+def _open(path):
+    with open(path, 'rb') as fid:
+        if os.fstat(fid.fileno()).st_size == 0:
+            return b''
+        # Copy-on-write mapping: the arrays are writable but the
+        # modifications are not written to the file.
+        return mmap.mmap(fid.fileno(), 0, access=mmap.ACCESS_COPY)
+
+
+def read_ark_index(path):
+    '''Index the matrices of a binary Kaldi archive.
+
+    Args:
+        path (str): Path to the archive.
+
+    Returns:
+        dict: Offset of the matrices indexed by key.
+
+    '''
+    buffer = _open(path)
+    index = {}
+    offset = 0
+    while offset < len(buffer):
+        key, offset = _read_token(buffer, offset)
+        index[key] = offset
+        _, _, _, data_offset, nbytes = _matrix_header(buffer, offset)
+        offset = data_offset + nbytes
+    return index
+
+
+def read_scp(path):
+    '''Read a Kaldi script file.
+
+    Args:
+        path (str): Path to the script file.
+
+    Returns:
+        dict: (path, offset) of the matrices indexed by key.
+
+    '''
+    index = {}
+    with open(path, 'r') as fid:
+        for line in fid:
+            line = line.strip()
+            if not line:
+                continue
+            key, rxfilename = line.split(None, 1)
+            if rxfilename.endswith('|') or rxfilename.endswith(']'):
+                raise ValueError(f'{key}: only the "<path>:<offset>" '
+                                 f'entries are supported')
+            arkpath, _, offset = rxfilename.rpartition(':')
+            if arkpath and offset.isdigit():
+                index[key] = (arkpath, int(offset))
+            else:
+                index[key] = (rxfilename, 0)
+    return index
+
+
+class KaldiArchive:
+    '''Read-only access to the features stored in a binary Kaldi
+    archive or in the archives listed in a script file. The object
+    behaves like a (read-only) dictionary of features indexed by
+    utterance id.
+
+    Example:
+        >>> feats = KaldiArchive('data/train/feats.scp')
+        >>> feats['utt1'].shape
+        (345, 13)
+
+    '''
+
+    def __init__(self, path):
+        '''
+        Args:
+            path (str): Path to the archive (".ark") or to the script
+                file (".scp").
+        '''
+        self.path = path
+        if path.endswith('.scp'):
+            self.index = read_scp(path)
+        else:
+            self.index = {key: (path, offset)
+                          for key, offset in read_ark_index(path).items()}
+        self._buffers = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_buffers'] = {}
+        return state
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, uttid):
+        return uttid in self.index
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def keys(self):
+        'Utterance ids of the archive.'
+        return self.index.keys()
+
+    def _buffer(self, path):
+        try:
+            return self._buffers[path]
+        except KeyError:
+            buffer = _open(path)
+            self._buffers[path] = buffer
+            return buffer
+
+    def __getitem__(self, uttid):
+        path, offset = self.index[uttid]
+        return read_matrix(self._buffer(path), offset)
+
+    def lengths(self):
+        '''Number of frames of each utterance (read from the header of
+        the matrices).
+
+        Returns:
+            dict: Number of frames indexed by utterance id.
+
+        '''
+        lengths = {}
+        for uttid, (path, offset) in self.index.items():
+            _, nrows, _, _, _ = _matrix_header(self._buffer(path), offset)
+            lengths[uttid] = nrows
+        return lengths
+
+
+def is_kaldi_archive(path):
+    'Return True if `path` is a Kaldi archive or script file.'
+    return path.endswith('.ark') or path.endswith('.scp')
+
+
+__all__ = [
+    'KaldiArchive',
+    'is_kaldi_archive',
+    'read_ark_index',
+    'read_matrix',
+    'read_scp',
+]
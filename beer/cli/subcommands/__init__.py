@@ -2,10 +2,12 @@
 from . import dataset
 from . import features
 from . import hmm
+from . import stats
 
 __all__ = [
     'dataset',
     'features',
     'hmm',
+    'stats',
 ]
 
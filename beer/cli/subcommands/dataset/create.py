@@ -5,59 +5,45 @@ import argparse
 import os
 import pickle
 
-import numpy as np
-import torch
-
 from ...dataset import Dataset
-
-
-def accumulate(feature_file):
-    '''Compute global mean, variance, frame counts
-    Argument:
-        feature_file(str): feature file(npz)
-    Returns:
-        mean: np array (float)
-        var: np array (float)
-        tot_counts(int): total frames in feature files
-    '''
-    feats = np.load(feature_file)
-    keys = list(feats.keys())
-    dim = feats[keys[0]].shape[1]
-    tot_sum = np.zeros(dim)
-    tot_square_sum = np.zeros(dim)
-    tot_counts = 0
-    for k in keys:
-        nframes_per_utt = len(feats[k])
-        per_square_sum = (feats[k] ** 2).sum(axis=0)
-        tot_sum += feats[k].sum(axis=0)
-        tot_square_sum += per_square_sum
-        tot_counts += nframes_per_utt
-    mean = tot_sum / tot_counts
-    var = tot_square_sum / tot_counts - mean ** 2
-    return torch.from_numpy(mean).float(), torch.from_numpy(var).float(), \
-           int(tot_counts)
+from ...featurestats import accumulate
+from ...featurestats import read_utt2spk
 
 
 def setup(parser):
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of parallel jobs (default: 1)')
+    parser.add_argument('-s', '--per-speaker', action='store_true',
+                        help='compute the statistics of each speaker ' \
+                             '(read from "<datadir>/utt2spk")')
     parser.add_argument('datadir', help='data directory')
-    parser.add_argument('features', help='features archive (npz format)')
+    parser.add_argument('features', help='features archive (npz format) '
+                                         'or feature store')
     parser.add_argument('out', help='output compiled dataset')
 
 
 def main(args, logger):
+    utt2spk = None
+    if args.per_speaker:
+        logger.debug('reading the speakers of the utterances...')
+        utt2spk = read_utt2spk(os.path.join(args.datadir, 'utt2spk'))
+
     logger.debug('computing features statistics...')
-    mean, var, size = accumulate(args.features)
+    stats = accumulate(args.features, jobs=args.jobs, utt2spk=utt2spk)
 
     logger.debug('creating the dataset...')
-    dataset = Dataset(os.path.abspath(args.features), mean, var, size)
+    dataset = Dataset(os.path.abspath(args.features), stats.mean, stats.var,
+                      stats.nframes, utt2spk=utt2spk,
+                      spk_stats=stats.spk_stats, _lengths=stats.lengths)
 
     logger.debug('saving the dataset on disk...')
     with open(args.out, 'wb') as f:
         pickle.dump(dataset, f)
 
-    logger.info(f'created dataset with {len(dataset)} utterances '\
-                f'(total frame count: {dataset.size})')
+    msg = f'created dataset with {len(stats.lengths)} utterances '
+    if stats.spk_stats is not None:
+        msg += f'and {len(stats.spk_stats)} speakers '
+    logger.info(msg + f'(total frame count: {dataset.size})')
 
 if __name__ == "__main__":
     main()
-
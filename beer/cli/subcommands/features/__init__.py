@@ -3,9 +3,10 @@
 
 from . import extract
 from . import archive
+from . import mkstore
 
 
-cmds = [extract, archive]
+cmds = [extract, archive, mkstore]
 
 
 def setup(parser):
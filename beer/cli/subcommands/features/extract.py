@@ -2,42 +2,27 @@
 
 
 import argparse
+import asyncio
 import beer
+import functools
 import io
+import multiprocessing
 import os
+import queue
 import subprocess
 import sys
+import threading
 
 import yaml
 import numpy as np
 from scipy.io.wavfile import read
 
+from ...featurecache import FeatureCache
+from ...featurestore import FeatureStoreWriter
+from ...featurestore import PRECISIONS
 
-feaconf = {
-    'srate': 16000,
-    'preemph': 0.97,
-    'window_len': 0.025,
-    'framerate': 0.01,
-    'apply_fbank': True,
-    'nfilters': 26,
-    'cutoff_hfreq': 8000,
-    'cutoff_lfreq': 20,
-    'apply_deltas': True,
-    'delta_order': 2,
-    'delta_winlen': 2,
-    'apply_dct': True,
-    'n_dct_coeff': 13,
-    'lifter_coeff': 22,
-    'utt_mnorm': False,
-    'add_energy': True,
-}
-
-
-def compute_dct_bases(nfilters, n_dct_coeff):
-    dct_bases = np.zeros((nfilters, n_dct_coeff))
-    for m in range(n_dct_coeff):
-        dct_bases[:, m] = np.cos((m+1) * np.pi / nfilters * (np.arange(nfilters) + 0.5))
-    return dct_bases
+
+feaconf = dict(beer.features.FeaturePipeline.default_conf)
 
 
 class ShowDefaultsAction(argparse.Action):
@@ -48,9 +33,225 @@ class ShowDefaultsAction(argparse.Action):
         parser.exit()
 
 
+def read_audio(inwav, data=None):
+    '''Read an audio file. If 'inwav' ends up with the '|' symbol,
+    'inwav' is interpreted as a command otherwise we assume 'inwav' to
+    be a path to a wav file. If given, 'data' is the output of the
+    command (already run).'''
+    if data is not None:
+        return read(io.BytesIO(data))
+    if inwav[-1] == '|':
+        cmd = inwav[:-1]
+        proc = subprocess.run(cmd, shell=True, stdout=subprocess.PIPE)
+        if proc.returncode != 0:
+            raise ValueError(f'command failed with exit status '
+                             f'{proc.returncode}: {cmd}')
+        return read(io.BytesIO(proc.stdout))
+    return read(inwav)
+
+
+_END_OF_ITERATION = object()
+
+
+class _ReaderError:
+
+    def __init__(self, error):
+        self.error = error
+
+
+class PipedAudioReader:
+    '''Run the commands of the piped audio (entries ending with
+    "|") of groups of utterances concurrently with asyncio. The
+    groups are output in order, with the output of the commands,
+    while the following commands are running.
+
+    Example:
+        >>> for group in PipedAudioReader(read_groups(infile, 16), jobs=8):
+        ...     for uttid, inwav, data in group:
+        ...         sr, signal = read_audio(inwav, data)
+
+    '''
+
+    def __init__(self, groups, jobs=4, depth=4, skip=None):
+        '''
+        Args:
+            groups (iterable): Groups of (uttid, inwav, None).
+            jobs (int): Maximum number of commands run concurrently.
+            depth (int): Maximum number of groups read in advance.
+            skip (function): Predicate on "inwav": if true, the
+                command is not run (e.g. the features are cached).
+        '''
+        self.groups = groups
+        self.jobs = jobs
+        self.depth = depth
+        self.skip = skip
+        self._queue = queue.Queue(maxsize=depth)
+        self._done = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            asyncio.run(self._read_groups())
+            self._queue.put(_END_OF_ITERATION)
+        except BaseException as error:
+            self._queue.put(_ReaderError(error))
+
+    async def _run_command(self, semaphore, uttid, cmd):
+        async with semaphore:
+            proc = await asyncio.create_subprocess_shell(
+                cmd, stdout=asyncio.subprocess.PIPE)
+            data, _ = await proc.communicate()
+        if proc.returncode != 0:
+            raise ValueError(f'{uttid}: command failed with exit status '
+                             f'{proc.returncode}: {cmd}')
+        return data
+
+    async def _start_groups(self, semaphore, pending):
+        # Start the commands of the groups as they are read.
+        loop = asyncio.get_running_loop()
+        groups = iter(self.groups)
+        while True:
+            group = await loop.run_in_executor(None, next, groups, None)
+            if group is None:
+                break
+            tasks = []
+            for uttid, inwav, _ in group:
+                task = None
+                if inwav[-1] == '|' and \
+                        (self.skip is None or not self.skip(inwav)):
+                    task = asyncio.ensure_future(
+                        self._run_command(semaphore, uttid, inwav[:-1]))
+                tasks.append(task)
+            await pending.put((group, tasks))
+        await pending.put(None)
+
+    async def _read_groups(self):
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(self.jobs)
+        pending = asyncio.Queue(maxsize=self.depth)
+        producer = asyncio.ensure_future(self._start_groups(semaphore,
+                                                            pending))
+        while True:
+            item = await pending.get()
+            if item is None:
+                break
+            group, tasks = item
+            result = []
+            for (uttid, inwav, data), task in zip(group, tasks):
+                if task is not None:
+                    data = await task
+                result.append((uttid, inwav, data))
+            await loop.run_in_executor(None, self._queue.put, result)
+        await producer
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._done:
+            raise StopIteration
+        item = self._queue.get()
+        if item is _END_OF_ITERATION:
+            self._done = True
+            raise StopIteration
+        if isinstance(item, _ReaderError):
+            self._done = True
+            raise item.error
+        return item
+
+
+def process_group(group, pipeline, cache=None, resample=False):
+    '''Read the audio and extract the features of a group of
+    utterances.
+
+    Args:
+        group (list): List of (uttid, wav file or command, output
+            of the command or None).
+        pipeline (:any:`beer.features.FeaturePipeline`): Features
+            extractor.
+        cache (:any:`FeatureCache`): Cache of the features. The audio
+            of the utterances found in the cache is not read.
+        resample (boolean): Resample the audio whose sampling rate
+            differs from the one of the features (otherwise raise an
+            error).
+
+    Returns:
+        list of (uttid, features) and the number of cache hits.
+
+    Raises:
+        ValueError: if the audio of an utterance cannot be read.
+
+    '''
+    features, keys, signals, missing = {}, {}, [], []
+    for uttid, inwav, data in group:
+        try:
+            if cache is not None:
+                keys[uttid] = cache.key(inwav)
+                cached = cache.get(keys[uttid])
+                if cached is not None:
+                    features[uttid] = cached
+                    continue
+            sr, signal = read_audio(inwav, data)
+        except (OSError, ValueError) as error:
+            raise ValueError(f'{uttid}: cannot read the audio ({error})')
+        if sr != pipeline.conf['srate'] and resample:
+            signal = beer.features.resample(signal, sr, pipeline.conf['srate'])
+        elif sr != pipeline.conf['srate']:
+            msg = '{}: sampling rate ({}) does not match the one ' \
+                  'of the given file ({}).'
+            raise ValueError(msg.format(uttid, pipeline.conf['srate'], sr))
+        signals.append(signal)
+        missing.append(uttid)
+    nhits = len(features)
+    for uttid, utt_features in zip(missing, pipeline.batch(signals)):
+        features[uttid] = utt_features
+        if cache is not None:
+            cache.put(keys[uttid], utt_features)
+    return [(uttid, features[uttid]) for uttid, _, _ in group], nhits
+
+
+def read_groups(infile, group_size):
+    'Group the utterances of a wav list: (uttid, inwav, None).'
+    group = []
+    for line in infile:
+        tokens = line.strip().split()
+        if not tokens:
+            continue
+        group.append((tokens[0], ' '.join(tokens[1:]), None))
+        if len(group) == group_size:
+            yield group
+            group = []
+    if group:
+        yield group
+
+
 def setup(parser):
     parser.add_argument('--show-default-conf', action=ShowDefaultsAction,
                         help='show the default configuration and exit')
+    parser.add_argument('-b', '--batch-size', type=int, default=16,
+                        help='number of utterances processed at once ' \
+                             'by a job (default: 16)')
+    parser.add_argument('-c', '--cache',
+                        help='directory of the cache of the features')
+    parser.add_argument('-d', '--decoders', type=int, default=0,
+                        help='number of audio commands (entries ending ' \
+                             'with "|") run concurrently ahead of the ' \
+                             'extraction (default: 0, the commands are ' \
+                             'run by the extraction jobs)')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of parallel jobs (default: 1)')
+    parser.add_argument('-r', '--resample', action='store_true',
+                        help='resample the audio files whose sampling ' \
+                             'rate differs from the one of the features ' \
+                             'configuration (default: error)')
+    parser.add_argument('-s', '--shard', type=int,
+                        help='write the features in the given shard of a ' \
+                             'feature store (the output directory) ' \
+                             'instead of one file per utterance')
+    parser.add_argument('-p', '--precision', choices=PRECISIONS,
+                        help='precision of the features stored in the ' \
+                             'shard (default: float32)')
     parser.add_argument('feaconf', help='configuration file of the '
                                         'features')
     parser.add_argument('wav_list', help='list of WAV files or "-" for stdin')
@@ -61,7 +262,7 @@ def main(args, logger):
 
     # Override the default configuration.
     with open(args.feaconf, 'r') as fid:
-        new_conf = yaml.load(fid)
+        new_conf = yaml.safe_load(fid)
 
     # Check for unknown options.
     for key in new_conf:
@@ -70,9 +271,8 @@ def main(args, logger):
             exit(1)
     feaconf.update(new_conf)
 
-    # Pre-compute the DCT bases.
-    dct_bases = compute_dct_bases(feaconf['nfilters'], feaconf['n_dct_coeff'])
-
+    # The window, filter bank and DCT are computed once.
+    pipeline = beer.features.FeaturePipeline.from_conf(feaconf)
 
     if args.wav_list == '-':
         infile = sys.stdin
@@ -80,101 +280,69 @@ def main(args, logger):
         with open(args.wav_list, 'r') as f:
             infile = f.readlines()
 
-    counts = 0
-    for line in infile:
-        tokens = line.strip().split()
-        uttid, inwav = tokens[0], ' '.join(tokens[1:])
-        logger.debug(f'processing utterance: {uttid}')
-
-        # If 'inwav' ends up with the '|' symbol, 'inwav' is
-        # interpreted as a command otherwise we assume 'inwav' to
-        # be a path to a wav file.
-        if inwav[-1] == '|':
-            cmd = inwav[:-1]
-            logger.debug(f'reading command: {cmd}')
-            proc = subprocess.run(cmd, shell=True,
-                                  stdout=subprocess.PIPE)
-            sr, signal = read(io.BytesIO(proc.stdout))
-        else:
-            logger.debug(f'reading file: {inwav}')
-            sr, signal = read(inwav)
-        if not sr == feaconf['srate']:
-            msg = 'Sampling rate ({}) does not match the one ' \
-                  'of the given file ({}).'
-            logger.error(msg.format(feaconf['srate'], sr))
-            exit(1)
-
-        # Mel spectrum.
-        logger.debug('extracting STFT')
-        melspec, fft_len = beer.features.short_term_mspec(
-            signal,
-            flen=feaconf['window_len'],
-            frate=feaconf['framerate'],
-            preemph=feaconf['preemph'],
-            srate=feaconf['srate'],
-        )
-
-        # Filter bank.
-        if feaconf['apply_fbank']:
-            logger.debug(f'applying filter bank (F={feaconf["nfilters"]})')
-            fbank = beer.features.create_fbank(feaconf['nfilters'], fft_len,
-                                               lowfreq=feaconf['cutoff_lfreq'],
-                                               highfreq=feaconf['cutoff_hfreq'])
-            melspec = melspec @ fbank.T
-
-        # Take the logarithm of the magnitude spectrum.
-        logger.debug('log of the STFT')
-        log_melspec = np.log(1e-6 + melspec)
-
-        # HTK compatibility normalization (probably doesn't change
-        # the accuracy of the recognition).
-        norm = np.sqrt(2. / feaconf['nfilters'])
-
-        # DCT transform.
-        if feaconf['apply_dct']:
-            logger.debug('cosine transform of the log STFT')
-            features = log_melspec @ dct_bases
-
-            features *= norm
-
-            # Liftering.
-            logger.debug('cepstrum liftering')
-            l_coeff = feaconf['lifter_coeff']
-            lifter = 1 + (l_coeff / 2) * np.sin(np.pi * \
-                (1 + np.arange(feaconf['n_dct_coeff'])) / l_coeff)
-            features *= lifter
-        else:
-            features = log_melspec
-
-        # Signal enery (per-frame).
-        if feaconf['add_energy']:
-            logger.debug('add the energy to the features')
-            energy = log_melspec.sum(axis=-1) * norm
-            features = np.c_[energy, features]
-
-        # Deltas.
-        if feaconf['apply_deltas']:
-            logger.debug('concatenating derivatives')
-            delta_order = feaconf['delta_order']
-            delta_winlen = feaconf['delta_winlen']
-            features = beer.features.add_deltas(features,
-                tuple([delta_winlen] * delta_order))
-
-        # Mean normalization.
-        if feaconf['utt_mnorm']:
-            logger.debug('utterance mean normalization')
-            features -= features.mean(axis=0)[None, :]
-
-        # Store the features as a numpy file.
-        path = os.path.join(args.outdir, uttid)
-        logger.debug(f'saving features to: {path}')
-        np.save(path, features)
-
-        counts += 1
-
+    store = None
+    if args.shard is not None:
+        store = FeatureStoreWriter(args.outdir, shard=args.shard,
+                                   precision=args.precision)
+
+    groups = read_groups(infile, args.batch_size)
+    cache = None
+    if args.cache is not None:
+        cache = FeatureCache(args.cache, pipeline.conf)
+    if args.decoders > 0:
+        logger.debug(f'running {args.decoders} audio commands concurrently')
+        skip = None
+        if cache is not None:
+            skip = lambda inwav: cache.key(inwav) in cache
+        groups = PipedAudioReader(groups, jobs=args.decoders,
+                                  depth=max(2, 2 * args.jobs), skip=skip)
+    process = functools.partial(process_group, pipeline=pipeline,
+                                cache=cache, resample=args.resample)
+    pool = None
+    if args.jobs > 1:
+        logger.debug(f'extracting the features with {args.jobs} jobs')
+        pool = multiprocessing.Pool(args.jobs)
+        results = pool.imap(process, groups)
+    else:
+        results = map(process, groups)
+
+    counts, nhits, completed = 0, 0, False
+    try:
+        # The results are written in the order of the list.
+        for group, group_nhits in results:
+            nhits += group_nhits
+            for uttid, features in group:
+                if store is not None:
+                    logger.debug(f'adding {uttid} to shard: {args.shard}')
+                    store.add(uttid, features)
+                else:
+                    # Store the features as a numpy file.
+                    path = os.path.join(args.outdir, uttid)
+                    logger.debug(f'saving features to: {path}')
+                    np.save(path, features)
+                counts += 1
+        completed = True
+    except (OSError, ValueError) as error:
+        logger.error(str(error))
+        exit(1)
+    finally:
+        if pool is not None:
+            pool.terminate()
+        # Do not leave an incomplete shard in the store.
+        if store is not None and not completed:
+            store.abort()
+
+    if store is not None:
+        store.close()
+        if args.precision is not None:
+            max_error, rms_error = store.quantization_error()
+            logger.info(f'quantization error: max={max_error:.3g} ' \
+                        f'rms={rms_error:.3g}')
+
+    if cache is not None:
+        logger.info(f'{nhits} file(s) found in the cache')
     logger.info(f'extracted features for {counts} file(s)')
 
 
 if __name__ == '__main__':
     main()
-
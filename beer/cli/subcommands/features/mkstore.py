@@ -0,0 +1,58 @@
+
+'convert a features archive into a memory-mapped feature store'
+
+import argparse
+import multiprocessing
+
+from ...featurestore import FeatureStoreWriter
+from ...featurestore import PRECISIONS
+from ...featurestore import build_index
+from ...featurestore import load_features
+
+
+def write_shard(features_path, out, shard, uttids, precision=None):
+    features = load_features(features_path)
+    with FeatureStoreWriter(out, shard=shard, precision=precision) as store:
+        for uttid in uttids:
+            store.add(uttid, features[uttid])
+    return store.max_error, store.sqerror, store.nvalues
+
+
+def setup(parser):
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of shards written in parallel ' \
+                             '(default: 1)')
+    parser.add_argument('-p', '--precision', choices=PRECISIONS,
+                        help='store the features with the given ' \
+                             'precision (default: same as the archive)')
+    parser.add_argument('-s', '--shards', type=int, default=1,
+                        help='number of shards of the store (default: 1)')
+    parser.add_argument('features', help='features archive (npz format) ' \
+                                         'or Kaldi archive/script (ark/scp)')
+    parser.add_argument('out', help='output feature store directory')
+
+
+def main(args, logger):
+    uttids = sorted(load_features(args.features).keys())
+    tasks = [(args.features, args.out, shard, uttids[shard::args.shards],
+              args.precision)
+             for shard in range(args.shards)]
+    logger.debug(f'writing {args.shards} shard(s) with {args.jobs} job(s)')
+    if args.jobs > 1:
+        with multiprocessing.Pool(args.jobs) as pool:
+            errors = pool.starmap(write_shard, tasks)
+    else:
+        errors = [write_shard(*task) for task in tasks]
+    counts = build_index(args.out)
+
+    nvalues = sum(error[2] for error in errors)
+    if nvalues > 0:
+        max_error = max(error[0] for error in errors)
+        rms_error = (sum(error[1] for error in errors) / nvalues) ** .5
+        logger.info(f'quantization error: max={max_error:.3g} ' \
+                    f'rms={rms_error:.3g}')
+    logger.info(f'created feature store from {counts} utterances')
+
+
+if __name__ == "__main__":
+    main()
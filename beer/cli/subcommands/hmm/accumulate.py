@@ -11,7 +11,7 @@ import beer
 def setup(parser):
     parser.add_argument('model', help='hmm based model')
     parser.add_argument('dataset', help='training data set')
-    parser.add_argument('out', help='output accumulated ELBO')
+    parser.add_argument('out', help='output accumulated statistics')
 
 
 def main(args, logger):
@@ -24,7 +24,8 @@ def main(args, logger):
         dataset = pickle.load(f)
 
 
-    elbo = beer.evidence_lower_bound(datasize=dataset.size)
+    elbo = beer.StatsAccumulator(model.bayesian_parameters(),
+                                 datasize=dataset.size)
     count = 0
     for line in sys.stdin:
         utt = dataset[line.strip().split()[0]]
@@ -35,8 +36,9 @@ def main(args, logger):
         count += 1
 
     logger.debug('saving the accumulated ELBO...')
-    with open(args.out, 'wb') as f:
-        pickle.dump((elbo, count), f)
+    stats = beer.AccumulatedStatistics.from_accumulator(elbo, model,
+                                                        nutts=count)
+    stats.save(args.out)
 
     logger.info(f'accumulated ELBO over {count} utterances: {float(elbo) / (count * dataset.size) :.3f}.')
 
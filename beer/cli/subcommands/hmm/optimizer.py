@@ -9,6 +9,9 @@ import beer
 
 
 def setup(parser):
+    parser.add_argument('--contiguous', action='store_true',
+                        help='store the parameters in a contiguous buffer ' \
+                             '(faster update for large models)')
     parser.add_argument('model', help='hmm based model')
     parser.add_argument('optimizer', help='output parameters\' optimizer')
 
@@ -18,7 +21,8 @@ def main(args, logger):
     with open(args.model, 'rb') as f:
         model = pickle.load(f)
 
-    optim = beer.BayesianModelOptimizer(model.mean_field_factorization())
+    optim = beer.BayesianModelOptimizer(model.mean_field_factorization(),
+                                        contiguous=args.contiguous)
     optim.init_step()
 
     logger.debug('saving the optimizer')
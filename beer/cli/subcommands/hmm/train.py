@@ -3,19 +3,40 @@
 
 import argparse
 import pickle
-import sys
+import random
 
+import torch
 import beer
 
+from ...featurestore import FeatureStore
+
 
 def setup(parser):
+    parser.add_argument('--contiguous', action='store_true',
+                        help='store the parameters in a contiguous buffer ' \
+                             '(faster update for large models)')
     parser.add_argument('-b', '--batch-size', type=int, default=-1,
                         help='batch size in number of utterance ' \
-                             '(-1 means all the utterances as one batch)')
+                             '(-1 or 0 means all the utterances as one ' \
+                             'batch)')
+    parser.add_argument('--distributed', action='store_true',
+                        help='distributed training with torch.distributed ' \
+                             '("gloo" backend), the processes are ' \
+                             'configured by the environment variables ' \
+                             'MASTER_ADDR, MASTER_PORT, RANK and WORLD_SIZE')
+    parser.add_argument('-c', '--stats-cache', type=int, default=0,
+                        help='size (in MB) of the cache for the sufficient ' \
+                             'statistics of the features (0 means no ' \
+                             'cache, -1 means unbounded)')
     parser.add_argument('-e', '--epochs', type=int, default=1,
                         help='number of epochs')
     parser.add_argument('-l', '--lrate', type=float, default=1.,
                         help='learning rate')
+    parser.add_argument('-p', '--prefetch', type=int, default=0,
+                        help='number of utterances loaded in advance ' \
+                             '(0 means no prefetching)')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help='number of worker processes')
     parser.add_argument('model', help='hmm based model')
     parser.add_argument('dataset', help='training data set')
     parser.add_argument('out', help='phone loop model')
@@ -30,34 +51,138 @@ def main(args, logger):
     with open(args.dataset, 'rb') as f:
         dataset = pickle.load(f)
 
+    if args.distributed:
+        train_distributed(args, logger, model, dataset)
+        if torch.distributed.get_rank() != 0:
+            return
+    elif args.workers > 1:
+        train_parallel(args, logger, model, dataset)
+    else:
+        train(args, logger, model, dataset)
+
+    logger.debug('save the model on disk...')
+    with open(args.out, 'wb') as f:
+        pickle.dump(model, f)
+
+    logger.info(f'finished training after {args.epochs} epochs. ' \
+                f'KL(q || p) = {float(model.kl_div_posterior_prior()): .3f}')
+
+
+def batch_size(args, nutts):
+    '''Number of utterances per batch, the same for all the training
+    modes. A non-positive batch size means one batch with all the
+    utterances.'''
+    if args.batch_size > 0:
+        return max(1, min(args.batch_size, nutts))
+    return max(1, nutts)
+
+
+def train_distributed(args, logger, model, dataset):
+    logger.debug('initialize the process group')
+    torch.distributed.init_process_group('gloo', init_method='env://')
+    try:
+        rank = torch.distributed.get_rank()
+        world_size = torch.distributed.get_world_size()
+        uttids = sorted(dataset.fea_dict.keys())
+        bsize = batch_size(args, len(uttids))
+        nbatches = (len(uttids) + bsize - 1) // bsize
+        load_features = lambda uttid: dataset[uttid].features
+
+        # If the features are stored in enough shards, each process reads
+        # its own shards only.
+        store = dataset.fea_dict
+        local = isinstance(store, FeatureStore) and \
+            len(store.shards()) >= world_size
+        if local:
+            logger.debug('assigning the shards of the features to the processes')
+            parts = store.partition(world_size)
+            uttids = sorted(parts[rank])
+
+        trainer = beer.DistributedTrainer(model, load_features, dataset.size,
+                                          lrate=args.lrate)
+        for epoch in range(1, args.epochs + 1):
+            # All the processes have to use the same order of utterances
+            # (or, for local utterances, the same number of batches).
+            random.Random(epoch).shuffle(uttids)
+            for batchno in range(nbatches):
+                if local:
+                    batch = uttids[batchno::nbatches]
+                    nutts = sum(len(part[batchno::nbatches]) for part in parts)
+                else:
+                    batch = uttids[batchno * bsize: (batchno + 1) * bsize]
+                    nutts = len(batch)
+                elbo = trainer.step(batch, local=local)
+                if rank == 0:
+                    logger.info(f'{"epoch=" + str(epoch):<20}  ' \
+                                f'{"batch=" + str(batchno + 1) + "/" + str(nbatches):<20} ' \
+                                f'{"ELBO=" + str(round(float(elbo) / (nutts * dataset.size), 3)):<20}')
+    finally:
+        torch.distributed.destroy_process_group()
+
+
+def train_parallel(args, logger, model, dataset):
+    if args.stats_cache != 0:
+        logger.warning('the sufficient statistics cache is not used ' \
+                       'with several workers')
+    uttids = sorted(dataset.fea_dict.keys())
+    bsize = batch_size(args, len(uttids))
+    nbatches = (len(uttids) + bsize - 1) // bsize
+    load_features = lambda uttid: dataset[uttid].features
+
+    logger.debug(f'start {args.workers} workers')
+    with beer.DataParallelTrainer(model, load_features, dataset.size,
+                                  workers=args.workers,
+                                  lrate=args.lrate) as trainer:
+        for epoch in range(1, args.epochs + 1):
+            random.shuffle(uttids)
+            for batchno in range(nbatches):
+                batch = uttids[batchno * bsize: (batchno + 1) * bsize]
+                elbo = trainer.step(batch)
+                logger.info(f'{"epoch=" + str(epoch):<20}  ' \
+                            f'{"batch=" + str(batchno + 1) + "/" + str(nbatches):<20} ' \
+                            f'{"ELBO=" + str(round(float(elbo) / (len(batch) * dataset.size), 3)):<20}')
+
+
+def train(args, logger, model, dataset):
     logger.debug('create the optimizer')
     optim = beer.BayesianModelOptimizer(model.mean_field_factorization(),
-                                        lrate=args.lrate)
+                                        lrate=args.lrate,
+                                        contiguous=args.contiguous)
+
+    stats_cache = None
+    if args.stats_cache != 0:
+        logger.debug('create the sufficient statistics cache')
+        stats_cache = beer.SufficientStatisticsCache(
+            model, max_size=args.stats_cache * 1024 ** 2)
 
+    nutts = len(dataset)
+    bsize = batch_size(args, nutts)
+    nbatches = (nutts + bsize - 1) // bsize
+    elbo = beer.StatsAccumulator(model.bayesian_parameters(),
+                                 datasize=dataset.size)
     for epoch in range(1, args.epochs + 1):
-        elbo = beer.evidence_lower_bound(datasize=dataset.size)
+        elbo.reset()
         optim.init_step()
-        for i, utt in enumerate(dataset.utterances(), start=1):
+        for i, utt in enumerate(dataset.utterances(prefetch=args.prefetch),
+                                start=1):
             logger.debug(f'processing utterance: {utt.id}')
             elbo += beer.evidence_lower_bound(model, utt.features,
-                                              datasize=dataset.size)
+                                              datasize=dataset.size,
+                                              stats_cache=stats_cache,
+                                              cache_key=utt.id)
 
-            # Update the model after N utterances.
-            if i % args.batch_size == 0:
+            # Update the model after N utterances (and after the last
+            # utterance of the epoch).
+            if i % bsize == 0 or i == nutts:
+                batchno = (i - 1) // bsize
                 elbo.backward()
                 optim.step()
                 logger.info(f'{"epoch=" + str(epoch):<20}  ' \
-                            f'{"batch=" + str(i // args.batch_size) + "/" + str(int(len(dataset) / args.batch_size)):<20} ' \
-                            f'{"ELBO=" + str(round(float(elbo) / (args.batch_size * dataset.size), 3)):<20}')
-                elbo = beer.evidence_lower_bound(datasize=dataset.size)
+                            f'{"batch=" + str(batchno + 1) + "/" + str(nbatches):<20} ' \
+                            f'{"ELBO=" + str(round(float(elbo) / ((i - batchno * bsize) * dataset.size), 3)):<20}')
+                elbo.reset()
                 optim.init_step()
 
-    logger.debug('save the model on disk...')
-    with open(args.out, 'wb') as f:
-        pickle.dump(model, f)
-
-    logger.info(f'finished training after {args.epochs} epochs. ' \
-                f'KL(q || p) = {float(model.kl_div_posterior_prior()): .3f}')
 
 if __name__ == "__main__":
     main()
@@ -9,6 +9,9 @@ import beer
 
 
 def setup(parser):
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of parallel jobs to merge the ' \
+                             'statistics')
     parser.add_argument('model', help='hmm based model')
     parser.add_argument('optimizer', help='parameters\' optimizer')
     parser.add_argument('out_model', help='updated model')
@@ -27,24 +30,12 @@ def main(args, logger):
     logger.debug('give the model parameters to the optimizer')
     optimizer.groups = model.mean_field_factorization()
 
-    elbo = None
-    nutts = 0
-    count = 0
-    for line in sys.stdin:
-        path = line.strip()
-        logger.debug(f'loading ELBO stored in {path}')
-        with open(path, 'rb') as f:
-            elbo_batch, nutts_batch = pickle.load(f)
-        if elbo is None:
-            elbo = elbo_batch
-            nutts = nutts_batch
-        else:
-            elbo += elbo_batch
-            nutts += nutts_batch
-        count += 1
+    paths = [line.strip() for line in sys.stdin if line.strip()]
+    logger.debug(f'merging the statistics of {len(paths)} files')
+    stats = beer.merge_statistics(paths, jobs=args.jobs)
+    elbo = stats.to_accumulator(model)
 
     logger.debug('computing the gradient')
-    elbo._model_parameters = set(optimizer._parameters)
     elbo.backward()
 
     logger.debug('updating the model')
@@ -61,7 +52,7 @@ def main(args, logger):
     with open(args.out_optim, 'wb') as f:
         pickle.dump(optimizer, f)
 
-    logger.info(f'accumulated ELBO={float(elbo)/(nutts * elbo._datasize):.3f}')
+    logger.info(f'accumulated ELBO={float(elbo)/(stats.nutts * elbo.datasize):.3f}')
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,30 @@
+
+'merge the accumulated statistics of the files listed on stdin'
+
+import argparse
+import sys
+
+import beer
+
+
+def setup(parser):
+    parser.add_argument('-f', '--fanin', type=int, default=8,
+                        help='number of files merged by a single job')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='number of parallel jobs')
+    parser.add_argument('out', help='output merged statistics')
+
+
+def main(args, logger):
+    paths = [line.strip() for line in sys.stdin if line.strip()]
+    logger.debug(f'merging the statistics of {len(paths)} files')
+    stats = beer.merge_statistics(paths, jobs=args.jobs, fanin=args.fanin)
+
+    logger.debug('saving the merged statistics')
+    stats.save(args.out)
+
+    logger.info(f'merged {len(paths)} files: {stats.nutts} utterances, ' \
+                f'{stats.nframes} frames')
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,7 @@
 
 from functools import lru_cache
 import numpy as np
+import scipy.fft
 import scipy.signal
 
 
@@ -31,7 +32,7 @@ def bark2hz(bark):
 def __triangle(center, start, end, freqs):
     'Create triangular filter.'
     slopes = 1. / (center - start), 1./ (end - center)
-    retval = np.zeros_like(freqs).astype(np.float)
+    retval = np.zeros_like(freqs).astype(float)
     idxs = np.logical_and(freqs >= start, freqs <= center)
     retval[idxs] = np.linspace(slopes[0] * (freqs[idxs][0] - start),
                                slopes[0] * (freqs[idxs][-1] - start),
@@ -79,6 +80,41 @@ def create_fbank(nfilters, fft_len=512, srate=16000, lowfreq=0, highfreq=None,
     return filters
 
 
+@lru_cache(maxsize=8)
+def _resampling_filter(up, down):
+    # Low-pass filter of the polyphase resampling (same design as
+    # ``scipy.signal.resample_poly``).
+    max_rate = max(up, down)
+    half_len = 10 * max_rate
+    taps = scipy.signal.firwin(2 * half_len + 1, 1. / max_rate,
+                               window=('kaiser', 5.0))
+    taps.flags.writeable = False
+    return taps
+
+
+def resample(signal, srate, target_srate):
+    '''Resample a signal with a polyphase filter. The design of the
+    filter is cached for each pair of sampling rates.
+
+    Args:
+        signal (numpy.ndarray): The raw audio signal.
+        srate (int): Sampling rate of the signal.
+        target_srate (int): Sampling rate of the output signal.
+
+    Returns:
+        (numpy.ndarray): The resampled signal (float32).
+
+    '''
+    signal = np.asarray(signal, dtype=np.float32)
+    if srate == target_srate:
+        return signal
+    gcd = np.gcd(int(srate), int(target_srate))
+    up, down = int(target_srate) // gcd, int(srate) // gcd
+    resampled = scipy.signal.resample_poly(signal, up, down,
+                                           window=_resampling_filter(up, down))
+    return resampled.astype(np.float32, copy=False)
+
+
 def add_deltas(fea, winlens=(2, 2)):
     '''Add derivatives to features (deltas, double deltas, triple_delas, ...)
 
@@ -202,3 +238,387 @@ def fbank(signal, flen=0.025, frate=0.01, hifreq=8000, lowfreq=20, nfilters=26,
     melspec = magspec @ filters.T
 
     return np.log(melspec + 1)
+
+
+class FeaturePipeline:
+    '''Extraction of the MFCC/FBANK features.
+
+    The constant parts of the extraction (window, filter bank, DCT
+    and liftering) are computed once when the pipeline is created and
+    the features are computed in single precision with buffers
+    reused from one call to another.
+
+    The pipeline computes, for each frame: DC offset removal and
+    pre-emphasis -> window -> |FFT| -> filter bank -> log -> DCT ->
+    liftering, then the energy, the derivatives and the mean
+    normalization (all optional, see :any:`FeaturePipeline.default_conf`).
+
+    Note:
+        A pipeline should not be used by several threads at the same
+        time as they would share the same buffers.
+
+    Example:
+        >>> pipeline = beer.features.FeaturePipeline.from_conf(
+        ...     {'nfilters': 30, 'apply_deltas': False})
+        >>> features = pipeline(signal)
+
+    '''
+
+    default_conf = {
+        'srate': 16000,
+        'preemph': 0.97,
+        'window_len': 0.025,
+        'framerate': 0.01,
+        'apply_fbank': True,
+        'nfilters': 26,
+        'cutoff_hfreq': 8000,
+        'cutoff_lfreq': 20,
+        'apply_deltas': True,
+        'delta_order': 2,
+        'delta_winlen': 2,
+        'apply_dct': True,
+        'n_dct_coeff': 13,
+        'lifter_coeff': 22,
+        'utt_mnorm': False,
+        'add_energy': True,
+    }
+
+    @classmethod
+    def from_conf(cls, conf):
+        '''Create a pipeline from a configuration (e.g. read from a
+        YAML file). The settings missing from the configuration are
+        set to their default value.
+
+        Args:
+            conf (dict): Configuration of the features.
+
+        Returns:
+            :any:`FeaturePipeline`
+
+        '''
+        for key in conf:
+            if key not in cls.default_conf:
+                raise ValueError(f'Unknown setting "{key}"')
+        return cls(**{**cls.default_conf, **conf})
+
+    def __init__(self, srate, preemph, window_len, framerate, apply_fbank,
+                 nfilters, cutoff_hfreq, cutoff_lfreq, apply_deltas,
+                 delta_order, delta_winlen, apply_dct, n_dct_coeff,
+                 lifter_coeff, utt_mnorm, add_energy):
+        self.conf = {
+            'srate': srate, 'preemph': preemph, 'window_len': window_len,
+            'framerate': framerate, 'apply_fbank': apply_fbank,
+            'nfilters': nfilters, 'cutoff_hfreq': cutoff_hfreq,
+            'cutoff_lfreq': cutoff_lfreq, 'apply_deltas': apply_deltas,
+            'delta_order': delta_order, 'delta_winlen': delta_winlen,
+            'apply_dct': apply_dct, 'n_dct_coeff': n_dct_coeff,
+            'lifter_coeff': lifter_coeff, 'utt_mnorm': utt_mnorm,
+            'add_energy': add_energy,
+        }
+        self.preemph = preemph
+        self.frate_samp = int(srate * framerate)
+        self.flen_samp = int(srate * window_len)
+        self.fft_len = int(2 ** np.floor(np.log2(self.flen_samp) + 1))
+        self.window = np.hamming(self.flen_samp).astype(np.float32)
+
+        self.fbank = None
+        if apply_fbank:
+            self.fbank = create_fbank(nfilters, self.fft_len, srate=srate,
+                                      lowfreq=cutoff_lfreq,
+                                      highfreq=cutoff_hfreq)
+            self.fbank = np.ascontiguousarray(self.fbank.T, dtype=np.float32)
+
+        # HTK compatibility normalization (probably doesn't change
+        # the accuracy of the recognition).
+        self.norm = np.float32(np.sqrt(2. / nfilters))
+
+        # The DCT, the normalization and the liftering are merged in
+        # a single matrix.
+        self.dct = None
+        if apply_dct:
+            dct_bases = np.cos(np.pi / nfilters * np.outer(
+                np.arange(nfilters) + 0.5, np.arange(1, n_dct_coeff + 1)))
+            lifter = 1 + (lifter_coeff / 2) * np.sin(
+                np.pi * np.arange(1, n_dct_coeff + 1) / lifter_coeff)
+            self.dct = (dct_bases * self.norm * lifter).astype(np.float32)
+
+        # Filter of the derivatives.
+        self.delta_winlen = delta_winlen
+        self.delta_order = delta_order if apply_deltas else 0
+        offsets = np.arange(-delta_winlen, delta_winlen + 1)
+        self.delta_filter = (offsets / (2 * offsets.dot(offsets))) \
+            .astype(np.float32)
+
+        self.utt_mnorm = utt_mnorm
+        self.add_energy = add_energy
+        if apply_dct:
+            self.ncoeffs = n_dct_coeff
+        elif apply_fbank:
+            self.ncoeffs = nfilters
+        else:
+            self.ncoeffs = self.fft_len // 2
+        self.static_dim = self.ncoeffs + (1 if add_energy else 0)
+        self.dim = self.static_dim * (1 + self.delta_order)
+        self._buffers = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_buffers'] = {}
+        return state
+
+    def _buffer(self, name, shape, dtype=np.float32):
+        # Return a (reused) buffer of the given shape. The buffers are
+        # initialized with zeros when they are (re-)allocated.
+        size = int(np.prod(shape))
+        buffer = self._buffers.get(name, None)
+        if buffer is None or len(buffer) < size or buffer.dtype != dtype:
+            if buffer is not None:
+                size = max(size, 2 * len(buffer))
+            buffer = np.zeros(size, dtype=dtype)
+            self._buffers[name] = buffer
+        return buffer[:int(np.prod(shape))].reshape(shape)
+
+    def _nframes(self, signal):
+        return max(0, (len(signal) - self.flen_samp) // self.frate_samp + 1)
+
+    def _frames(self, signal, out, dc_offset):
+        # Overlapping frames of the signal with the DC offset removed,
+        # pre-emphasized and windowed.
+        isize = signal.dtype.itemsize
+        frames = np.lib.stride_tricks.as_strided(
+            signal, shape=(len(out), self.flen_samp),
+            strides=(self.frate_samp * isize, isize), writeable=False)
+        np.multiply(frames[:, :-1], -self.preemph, out=out[:, 1:])
+        out[:, 1:] += frames[:, 1:]
+        np.multiply(frames[:, 0], 1 - self.preemph, out=out[:, 0])
+        out -= np.float32(dc_offset * (1 - self.preemph))
+        out *= self.window
+
+    def _static_features(self, signals, nframes, dc_offsets=None):
+        # Static features of the frames of all the signals. By
+        # default, the DC offset is the mean of each signal.
+        total = sum(nframes)
+        frames = self._buffer('frames', (total, self.fft_len))
+        start = 0
+        for i, (signal, length) in enumerate(zip(signals, nframes)):
+            if length > 0:
+                signal = np.asarray(signal, dtype=np.float32)
+                dc_offset = signal.mean() if dc_offsets is None \
+                    else dc_offsets[i]
+                self._frames(signal, frames[start: start + length,
+                                            :self.flen_samp], dc_offset)
+            start += length
+
+        # The frames are padded with zeros up to the FFT length.
+        spectrum = scipy.fft.rfft(frames, axis=-1)
+        magspec = self._buffer('magspec', (total, self.fft_len // 2))
+        np.abs(spectrum[:, :-1], out=magspec)
+        del spectrum
+
+        if self.fbank is not None:
+            melspec = self._buffer('melspec', (total, self.fbank.shape[1]))
+            np.matmul(magspec, self.fbank, out=melspec)
+        else:
+            melspec = magspec
+        melspec += np.float32(1e-6)
+        np.log(melspec, out=melspec)
+
+        features = self._buffer('static', (total, self.static_dim))
+        ceps = features[:, 1:] if self.add_energy else features
+        if self.dct is not None:
+            np.matmul(melspec, self.dct, out=ceps)
+        else:
+            ceps[:] = melspec
+        if self.add_energy:
+            np.sum(melspec, axis=-1, out=features[:, 0])
+            features[:, 0] *= self.norm
+        return features
+
+    def _add_deltas(self, features):
+        # The derivatives of each order are computed with a single
+        # (vectorized) convolution of the previous order padded with
+        # its first and last frames.
+        nframes, winlen, dim = len(features), self.delta_winlen, \
+            self.static_dim
+        padded = self._buffer('padded', (nframes + 2 * winlen, dim))
+        for order in range(1, self.delta_order + 1):
+            previous = features[:, (order - 1) * dim: order * dim]
+            padded[winlen: winlen + nframes] = previous
+            padded[:winlen] = previous[0]
+            padded[winlen + nframes:] = previous[-1]
+            windows = np.lib.stride_tricks.sliding_window_view(
+                padded, 2 * winlen + 1, axis=0)
+            np.matmul(windows, self.delta_filter,
+                      out=features[:, order * dim: (order + 1) * dim])
+
+    def batch(self, signals):
+        '''Extract the features of several signals. The frames of all
+        the signals are processed together.
+
+        Args:
+            signals (list): List of ``numpy.ndarray`` signals.
+
+        Returns:
+            list of ``numpy.ndarray[nframes, dim]`` (float32)
+
+        '''
+        nframes = [self._nframes(signal) for signal in signals]
+        static = self._static_features(signals, nframes)
+        retval = []
+        start = 0
+        for length in nframes:
+            features = np.empty((length, self.dim), dtype=np.float32)
+            features[:, :self.static_dim] = static[start: start + length]
+            start += length
+            if length > 0:
+                self._add_deltas(features)
+                if self.utt_mnorm:
+                    features -= features.mean(axis=0)
+            retval.append(features)
+        return retval
+
+    def __call__(self, signal):
+        '''Extract the features of a signal.
+
+        Args:
+            signal (``numpy.ndarray``): The raw audio signal.
+
+        Returns:
+            ``numpy.ndarray[nframes, dim]`` (float32)
+
+        '''
+        return self.batch([signal])[0]
+
+
+class StreamingFeatureExtractor:
+    '''Extract the features of a signal given by chunks of arbitrary
+    size (e.g. to process very long recordings with a bounded
+    memory).
+
+    The samples of the incomplete frames and the context needed by
+    the derivatives are carried over from one chunk to the next so
+    that the features are identical to the features extracted by the
+    :any:`FeaturePipeline` on the whole signal, except for:
+
+      * the DC offset: it is the mean of the whole signal for the
+        offline extraction whereas it is the mean of the samples
+        received so far in streaming mode (unless it is given with
+        `dc_offset`),
+      * the frames are output with a delay of ``latency`` frames as
+        the derivatives need the following frames. The last frames
+        are output by :any:`flush` which pads the end of the
+        signal as the offline extraction does.
+
+    The mean normalization of the utterance is not supported.
+
+    Example:
+        >>> pipeline = beer.features.FeaturePipeline.from_conf(conf)
+        >>> extractor = beer.features.StreamingFeatureExtractor(pipeline)
+        >>> for chunk in chunks:
+        ...     process(extractor.accept(chunk))
+        >>> process(extractor.flush())
+
+    '''
+
+    def __init__(self, pipeline, dc_offset=None):
+        '''
+        Args:
+            pipeline (:any:`FeaturePipeline`): Features extractor.
+            dc_offset (float): DC offset of the signal. If not given,
+                it is estimated from the samples received so far.
+        '''
+        if pipeline.utt_mnorm:
+            raise ValueError('The mean normalization of the utterance '
+                             'needs the whole signal')
+        self.pipeline = pipeline
+        self.dc_offset = dc_offset
+        self.reset()
+
+    @property
+    def latency(self):
+        'Delay (in frames) between the input and the output frames.'
+        return self.pipeline.delta_order * self.pipeline.delta_winlen
+
+    def reset(self):
+        'Prepare the extractor for a new signal.'
+        self._samples = np.zeros(0, dtype=np.float32)
+        self._sum = 0.
+        self._count = 0
+        # Context of the derivatives of each order.
+        self._contexts = [None] * (self.pipeline.delta_order + 1)
+        # Frames computed but not output yet (static features and
+        # derivatives of each order).
+        dim = self.pipeline.static_dim
+        self._pending = [np.zeros((0, dim), dtype=np.float32)
+                         for _ in range(self.pipeline.delta_order + 1)]
+
+    def _deltas(self, order, frames, final):
+        # New frames of the derivatives of the given order. `frames`
+        # are the new frames of the previous order.
+        winlen = self.pipeline.delta_winlen
+        context = self._contexts[order]
+        if context is None:
+            if len(frames) == 0:
+                return frames
+            # Beginning of the signal: the first frame is repeated.
+            context = np.repeat(frames[:1], winlen, axis=0)
+        sequence = np.concatenate([context, frames])
+        if final:
+            sequence = np.concatenate(
+                [sequence, np.repeat(sequence[-1:], winlen, axis=0)])
+        nframes = max(0, len(sequence) - 2 * winlen)
+        self._contexts[order] = None if final else sequence[nframes:]
+        if nframes == 0:
+            return sequence[:0]
+        windows = np.lib.stride_tricks.sliding_window_view(
+            sequence, 2 * winlen + 1, axis=0)
+        return windows @ self.pipeline.delta_filter
+
+    def _process(self, frames, final):
+        for order in range(len(self._pending)):
+            if order > 0:
+                frames = self._deltas(order, frames, final)
+            self._pending[order] = np.concatenate([self._pending[order],
+                                                   frames])
+        nframes = min(len(pending) for pending in self._pending)
+        features = np.concatenate([pending[:nframes]
+                                   for pending in self._pending], axis=1)
+        self._pending = [pending[nframes:] for pending in self._pending]
+        return features
+
+    def accept(self, chunk):
+        '''Process a new chunk of the signal.
+
+        Args:
+            chunk (``numpy.ndarray``): Samples of the signal.
+
+        Returns:
+            ``numpy.ndarray[nframes, dim]``: Features of the frames
+                available (possibly none).
+
+        '''
+        chunk = np.asarray(chunk, dtype=np.float32)
+        self._sum += float(chunk.sum(dtype=np.float64))
+        self._count += len(chunk)
+        samples = np.concatenate([self._samples, chunk])
+        nframes = self.pipeline._nframes(samples)
+        dc_offset = self.dc_offset if self.dc_offset is not None \
+            else self._sum / max(1, self._count)
+        frames = np.array(self.pipeline._static_features(
+            [samples], [nframes], [dc_offset]))
+        self._samples = samples[nframes * self.pipeline.frate_samp:]
+        return self._process(frames, final=False)
+
+    def flush(self):
+        '''Output the last frames of the signal and reset the
+        extractor.
+
+        Returns:
+            ``numpy.ndarray[nframes, dim]``: Features of the last
+                frames.
+
+        '''
+        frames = np.zeros((0, self.pipeline.static_dim), dtype=np.float32)
+        features = self._process(frames, final=True)
+        self.reset()
+        return features
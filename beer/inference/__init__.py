@@ -1,2 +1,5 @@
 from .objectives import *
-from .optimizers import *
\ No newline at end of file
+from .optimizers import *
+from .statscache import *
+from .parallel import *
+from .statsfile import *
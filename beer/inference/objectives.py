@@ -48,6 +48,14 @@ def scale_acc_stats(acc_stats, scale):
     return new_stats
 
 
+def _requires_grad(model):
+    '''True if the model has standard (i.e. non-Bayesian) parameters
+    trained by gradient descent.'''
+    for _ in model.modules_parameters():
+        return True
+    return False
+
+
 class EvidenceLowerBoundInstance:
     '''Evidence Lower Bound of a data set given a model.
 
@@ -61,7 +69,7 @@ class EvidenceLowerBoundInstance:
                  datasize):
         self._elbo_value = elbo_value
         self._acc_stats = acc_stats
-        self._model_parameters = set(model_parameters)
+        self._model_parameters = frozenset(model_parameters)
         self._minibatchsize = minibatchsize
         self._datasize = datasize
 
@@ -94,7 +102,7 @@ class EvidenceLowerBoundInstance:
     def backward(self):
         # Pytorch minimizes the loss ! We change the sign of the ELBO
         # just before to compute the gradient.
-        if self._elbo_value.requires_grad:
+        if torch.is_tensor(self._elbo_value) and self._elbo_value.requires_grad:
             (-self._elbo_value).backward()
 
         scale = self._datasize / self._minibatchsize
@@ -103,6 +111,161 @@ class EvidenceLowerBoundInstance:
             parameter.store_stats(scale * acc_stats)
 
 
+class StatsAccumulator:
+    '''Mutable accumulator of the ELBO and of the sufficient statistics
+    of a set of parameters.
+
+    The statistics of all the parameters are stored in a single
+    preallocated buffer and each :any:`EvidenceLowerBoundInstance`
+    added to the accumulator is summed in-place.
+
+    Example:
+        >>> elbo = beer.StatsAccumulator(model.bayesian_parameters(),
+        ...                              datasize=len(X))
+        >>> for batch in batches:
+        ...     elbo += beer.evidence_lower_bound(model, batch,
+        ...                                       datasize=len(X))
+        >>> elbo.backward()
+        >>> optimizer.step()
+
+    '''
+    __repr_str = '{classname}(value={value})'
+
+    def __init__(self, parameters, datasize):
+        '''
+        Args:
+            parameters (seq): Sequence of :any:`BayesianParameter` for
+                which to accumulate the statistics.
+            datasize (int): Number of data points of the total
+                training data.
+        '''
+        self._parameters = list(parameters)
+        self._datasize = datasize
+        tensor = self._parameters[0].stats
+        size = sum(param.stats.numel() for param in self._parameters)
+        self._buffer = torch.zeros(size, dtype=tensor.dtype,
+                                   device=tensor.device)
+        self._build_views()
+        self._elbo_value = 0.
+        self._minibatchsize = 0
+
+    def _build_views(self):
+        self._views = {}
+        offset = 0
+        for param in self._parameters:
+            length = param.stats.numel()
+            self._views[param] = \
+                self._buffer[offset: offset + length].view_as(param.stats)
+            offset += length
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_views']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._build_views()
+
+    def __repr__(self):
+        return self.__repr_str.format(
+            classname=self.__class__.__name__,
+            value=float(self._elbo_value)
+        )
+
+    def __str__(self):
+        return str(self._elbo_value)
+
+    def __float__(self):
+        return float(self._elbo_value)
+
+    @property
+    def datasize(self):
+        'Number of data points of the total training data.'
+        return self._datasize
+
+    def __iadd__(self, elbo):
+        if not isinstance(elbo, EvidenceLowerBoundInstance):
+            raise ValueError('Can only accumulate EvidenceLowerBoundInstance')
+        if self._datasize != elbo._datasize:
+            raise ValueError('Cannot add ELBOs evaluated on different data set')
+        for param, acc_stats in elbo._acc_stats.items():
+            try:
+                self._views[param].add_(acc_stats.detach())
+            except KeyError:
+                raise ValueError('Unknown parameter: {}'.format(param))
+        self._elbo_value += elbo._elbo_value
+        self._minibatchsize += elbo._minibatchsize
+        return self
+
+    def merge(self, other):
+        '''Add (in-place) the content of another accumulator, e.g.
+        computed by another worker. The statistics of the parameters
+        unknown to this accumulator are ignored.
+
+        Args:
+            other (:any:`StatsAccumulator`): Accumulator to merge.
+
+        Returns:
+            :any:`StatsAccumulator`: the accumulator itself.
+
+        '''
+        if self._datasize != other._datasize:
+            raise ValueError('Cannot add ELBOs evaluated on different data set')
+        if self._parameters == other._parameters:
+            self._buffer.add_(other._buffer)
+        else:
+            for param, acc_stats in other._views.items():
+                if param in self._views:
+                    self._views[param].add_(acc_stats)
+        self._elbo_value += other._elbo_value
+        self._minibatchsize += other._minibatchsize
+        return self
+
+    def all_reduce_(self, group=None):
+        '''Sum (in-place) the accumulators of all the processes of a
+        ``torch.distributed`` group.
+
+        Args:
+            group (object): Process group (default: all the
+                processes).
+
+        Returns:
+            :any:`StatsAccumulator`: the accumulator itself.
+
+        '''
+        import torch.distributed as dist
+        dist.all_reduce(self._buffer, group=group)
+        values = torch.tensor([float(self._elbo_value), self._minibatchsize],
+                              dtype=torch.float64)
+        dist.all_reduce(values, group=group)
+        self._elbo_value = float(values[0])
+        self._minibatchsize = int(values[1])
+        return self
+
+    def share_memory_(self):
+        '''Move the buffer of the statistics to shared memory.'''
+        self._buffer.share_memory_()
+        return self
+
+    def reset(self):
+        '''Set the statistics and the value of the ELBO to zero.'''
+        self._buffer.zero_()
+        self._elbo_value = 0.
+        self._minibatchsize = 0
+
+    def backward(self):
+        if self._minibatchsize == 0:
+            raise ValueError('Cannot compute the statistics of an empty '
+                             'accumulator')
+        if torch.is_tensor(self._elbo_value) and self._elbo_value.requires_grad:
+            (-self._elbo_value).backward()
+
+        scale = self._datasize / self._minibatchsize
+        for parameter, acc_stats in self._views.items():
+            parameter.store_stats(scale * acc_stats)
+
+
 class CollapsedEvidenceLowerBoundInstance:
     '''Collapsed Evidence Lower Bound of a data set given a model.
 
@@ -132,7 +295,7 @@ class CollapsedEvidenceLowerBoundInstance:
     def backward(self):
         # Pytorch minimizes the loss ! We change the sign of the ELBO
         # just before to compute the gradient.
-        if self._elbo_value.requires_grad:
+        if torch.is_tensor(self._elbo_value) and self._elbo_value.requires_grad:
             (-self._elbo_value).backward()
             
         for parameter in self._model_parameters:
@@ -173,7 +336,7 @@ class StochasticCollapsedEvidenceLowerBoundInstance:
     def backward(self):
         # Pytorch minimizes the loss ! We change the sign of the ELBO
         # just before to compute the gradient.
-        if self._elbo_value.requires_grad:
+        if torch.is_tensor(self._elbo_value) and self._elbo_value.requires_grad:
             (-self._elbo_value).backward()
             
         scale = self._datasize / self._minibatchsize
@@ -185,7 +348,8 @@ class StochasticCollapsedEvidenceLowerBoundInstance:
     
 
 def evidence_lower_bound(model=None, minibatch_data=None, datasize=-1,
-                         fast_eval=False, **kwargs):
+                         fast_eval=False, stats_cache=None, cache_key=None,
+                         **kwargs):
     '''Evidence Lower Bound objective function of Variational Bayes
     Inference.
 
@@ -205,12 +369,23 @@ def evidence_lower_bound(model=None, minibatch_data=None, datasize=-1,
             provided `minibatch_data` will be used instead.
         fast_eval (boolean): If true, skip computing KL-divergence for the
             global parameters.
+        stats_cache (:any:`SufficientStatisticsCache`): If provided,
+            the sufficient statistics of the data are read from (or
+            stored in) the cache under `cache_key`. The cache should
+            have been created for `model`.
+        cache_key (object): Identifier of the data in the cache.
         kwargs (object): Model specific extra parameters to evalute the
             ELBO.
 
     Returns:
         ``EvidenceLowerBoundInstance``
 
+    Note:
+        If the model has no standard ``pytorch`` parameters (i.e. it is
+        trained with natural gradients only), the ELBO is computed
+        without tracking the gradients and its value is stored as a
+        plain ``float``.
+
     Example:
         >>> # Assume X is our data set and "model" is the model to be
         >>> # trained.
@@ -246,18 +421,28 @@ def evidence_lower_bound(model=None, minibatch_data=None, datasize=-1,
     if datasize <= 0:
         datasize = mb_datasize
     scale = datasize / float(mb_datasize)
-    stats = model.sufficient_statistics(minibatch_data)
-    exp_llh = model.expected_log_likelihood(stats, **kwargs)
-    if not fast_eval:
-        kl_div = model.kl_div_posterior_prior().sum()
-    else:
-        kl_div = 0.
-    elbo_value = float(scale) * exp_llh.sum() - kl_div
-    acc_stats = model.accumulate(torch.tensor(stats))
+    requires_grad = _requires_grad(model)
+    if stats_cache is not None and stats_cache.model is not model:
+        raise ValueError('The sufficient statistics cache was created for '
+                         'another model')
+    with torch.set_grad_enabled(requires_grad):
+        if stats_cache is not None and cache_key is not None:
+            stats = stats_cache.sufficient_statistics(cache_key, minibatch_data)
+        else:
+            stats = model.sufficient_statistics(minibatch_data)
+        exp_llh = model.expected_log_likelihood(stats, **kwargs)
+        if not fast_eval:
+            kl_div = model.kl_div_posterior_prior().sum()
+        else:
+            kl_div = 0.
+        elbo_value = float(scale) * exp_llh.sum() - kl_div
+        acc_stats = model.accumulate(stats.detach())
     model.clear_cache()
+    if not requires_grad:
+        elbo_value = float(elbo_value)
 
     return EvidenceLowerBoundInstance(elbo_value, acc_stats,
-                                      model.bayesian_parameters(),
+                                      model.bayesian_parameters_set(),
                                       mb_datasize, datasize)
 
 
@@ -330,12 +515,13 @@ def stochastic_collapsed_evidence_lower_bound(model, minibatch_data, datasize=-1
     model.clear_cache()
 
     return EvidenceLowerBoundInstance(elbo_value, acc_stats,
-                                      model.bayesian_parameters(),
+                                      model.bayesian_parameters_set(),
                                       mb_datasize, datasize)
 
 
 
 
-__all__ = ['evidence_lower_bound', 'collapsed_evidence_lower_bound',
+__all__ = ['StatsAccumulator', 'evidence_lower_bound',
+           'collapsed_evidence_lower_bound',
            'stochastic_collapsed_evidence_lower_bound']
 
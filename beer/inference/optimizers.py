@@ -1,4 +1,7 @@
 
+from ..models.parameters import BayesianParameterBuffer
+
+
 class BayesianModelOptimizer:
     '''Generic optimizer for :any:`BayesianModel` subclasses.
 
@@ -9,7 +12,7 @@ class BayesianModelOptimizer:
 
     '''
 
-    def __init__(self, groups, lrate=1., std_optim=None):
+    def __init__(self, groups, lrate=1., std_optim=None, contiguous=False):
         '''
         Args:
             parameters (list): List of ``BayesianParameters``.
@@ -17,30 +20,73 @@ class BayesianModelOptimizer:
             std_optim (``torch.optim.Optimizer``): Optimizer for
                 non-Bayesian parameters (i.e. standard ``pytorch``
                 parameters)
+            contiguous (boolean): If true, store the parameters in a
+                single contiguous buffer (see
+                :any:`BayesianParameterBuffer`) so that the update of
+                a group is a single vectorized operation.
         '''
         self._parameters = None # will be set when we defined the grouprs.
+        self._contiguous = contiguous
+        self._buffer = None
         self.groups = groups
         self._lrate = lrate
         self._std_optim = std_optim
-        self._groups = groups
         self._update_count = 0
 
+    def __getstate__(self):
+        # The buffer is re-created when the object is loaded.
+        state = self.__dict__.copy()
+        state['_buffer'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.__dict__.get('_contiguous', False):
+            self._buffer = BayesianParameterBuffer(self._groups)
+        else:
+            self._contiguous = False
+            self._buffer = None
+
     @property
     def groups(self):
         return self._groups
 
     @groups.setter
     def groups(self, value):
-        self._groups = value
+        self._groups = [list(group) for group in value]
         parameters = []
-        for group in value:
+        for group in self._groups:
             parameters += [param for param in group]
         self._parameters = parameters
+        if self._contiguous:
+            self._buffer = BayesianParameterBuffer(self._groups)
+
+    def share_memory_(self):
+        '''Move the parameters to shared memory (only for optimizers
+        created with ``contiguous=True``).'''
+        if self._buffer is None:
+            raise ValueError('Only the parameters of a contiguous '
+                             'optimizer can be shared')
+        self._buffer.share_memory_()
+        return self
+
+    def broadcast_(self, src=0, group=None):
+        '''Replace the parameters by the ones of the process `src` of
+        a ``torch.distributed`` group (only for optimizers created
+        with ``contiguous=True``).'''
+        if self._buffer is None:
+            raise ValueError('Only the parameters of a contiguous '
+                             'optimizer can be broadcast')
+        self._buffer.broadcast_(src, group)
+        return self
 
     def init_step(self):
         'Set all the standard/Bayesian parameters gradient to zero.'
         if self._std_optim is not None:
             self._std_optim.zero_grad()
+        if self._buffer is not None:
+            self._buffer.zero_stats()
+            return
         for parameter in self._parameters:
             parameter.stats.zero_()
 
@@ -50,8 +96,11 @@ class BayesianModelOptimizer:
             self._std_optim.step()
         if self._update_count >= len(self._groups):
             self._update_count = 0
-        for parameter in self._groups[self._update_count]:
-            parameter.natural_grad_update(self._lrate)
+        if self._buffer is not None:
+            self._buffer.natural_grad_update(self._lrate, self._update_count)
+        else:
+            for parameter in self._groups[self._update_count]:
+                parameter.natural_grad_update(self._lrate)
 
         self._update_count += 1
 
@@ -0,0 +1,338 @@
+'Data-parallel training of the models with several processes.'
+
+import multiprocessing
+import queue
+import traceback
+import zlib
+
+import torch
+import torch.distributed as dist
+
+from .objectives import evidence_lower_bound
+from .objectives import StatsAccumulator
+from .optimizers import BayesianModelOptimizer
+
+
+def _refresh_parameters(parameters):
+    # The posteriors have been updated in-place by the parent process,
+    # the values cached by the worker are obsolete.
+    for param in parameters:
+        param.posterior.cache = {}
+        param._dispatch()
+
+
+def _worker(idx, model, features, datasize, acc_stats, counters, version,
+            tasks, results, kwargs):
+    torch.set_num_threads(1)
+    parameters = list(model.bayesian_parameters())
+    local_version = version.value
+    while True:
+        keys = tasks.get()
+        if keys is None:
+            break
+        try:
+            if version.value != local_version:
+                local_version = version.value
+                _refresh_parameters(parameters)
+            for key in keys:
+                elbo = evidence_lower_bound(model, features(key),
+                                            datasize=datasize, **kwargs)
+                acc_stats += elbo
+                counters[idx, 0] += float(elbo)
+                counters[idx, 1] += elbo._minibatchsize
+            results.put((idx, None))
+        except Exception:
+            results.put((idx, traceback.format_exc()))
+
+
+class DataParallelTrainer:
+    '''Train a :any:`BayesianModel` with several worker processes.
+
+    The workers are forked from the current process and share the
+    model with it: the parameters of the model are stored in shared
+    memory and updated in-place by the parent process. Each worker
+    pulls the utterances to process from a queue and accumulates the
+    statistics in its own shared buffer. The buffers are summed and
+    the model is updated by the parent process.
+
+    Note:
+        Only the models trained with natural gradients (i.e. without
+        standard ``pytorch`` parameters) are supported. The workers
+        are created with the "fork" start method which is not
+        available on all the platforms.
+
+    Example:
+        >>> with beer.DataParallelTrainer(model, load_features,
+        ...                               datasize=n_frames,
+        ...                               workers=4) as trainer:
+        ...     for epoch in range(epochs):
+        ...         elbo = trainer.step(uttids)
+
+    '''
+
+    def __init__(self, model, features, datasize, workers=2, lrate=1.,
+                 chunk_size=1, **kwargs):
+        '''
+        Args:
+            model (:any:`BayesianModel`): Model to train.
+            features (function): Function returning the features
+                (``torch.Tensor[n_frames, dim]``) of an utterance given
+                its key. It is called by the worker processes.
+            datasize (int): Number of data points of the total
+                training data.
+            workers (int): Number of worker processes.
+            lrate (float): Learning rate.
+            chunk_size (int): Number of utterances sent at once to a
+                worker.
+            kwargs (object): Extra parameters given to
+                :any:`evidence_lower_bound`.
+        '''
+        if workers < 1:
+            raise ValueError('The number of workers should be at least 1')
+        if any(True for _ in model.modules_parameters()):
+            raise ValueError('Models with standard pytorch parameters are '
+                             'not supported')
+        self.model = model
+        self.features = features
+        self.datasize = datasize
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.kwargs = kwargs
+        self.optimizer = BayesianModelOptimizer(
+            model.mean_field_factorization(), lrate=lrate, contiguous=True)
+        self.optimizer.share_memory_()
+        self._parameters = list(model.bayesian_parameters())
+        self._acc_stats = [
+            StatsAccumulator(self._parameters, datasize).share_memory_()
+            for _ in range(workers)
+        ]
+        self._elbo = StatsAccumulator(self._parameters, datasize)
+        self._counters = torch.zeros(workers, 2,
+                                     dtype=torch.float64).share_memory_()
+        self._context = multiprocessing.get_context('fork')
+        self._version = self._context.Value('i', 0)
+        self._tasks = None
+        self._results = None
+        self._processes = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+
+    def start(self):
+        'Start the worker processes.'
+        if self._processes:
+            return
+        self._tasks = self._context.Queue()
+        self._results = self._context.Queue()
+        for idx in range(self.workers):
+            process = self._context.Process(
+                target=_worker,
+                args=(idx, self.model, self.features, self.datasize,
+                      self._acc_stats[idx], self._counters, self._version,
+                      self._tasks, self._results, self.kwargs),
+                daemon=True
+            )
+            process.start()
+            self._processes.append(process)
+
+    def close(self):
+        'Stop the worker processes.'
+        for process in self._processes:
+            if process.is_alive():
+                self._tasks.put(None)
+        for process in self._processes:
+            process.join()
+        self._processes = []
+
+    def _wait(self, ntasks):
+        while ntasks > 0:
+            try:
+                idx, error = self._results.get(timeout=1.)
+            except queue.Empty:
+                if not all(process.is_alive() for process in self._processes):
+                    raise RuntimeError('A worker process died unexpectedly')
+                continue
+            if error is not None:
+                raise RuntimeError(f'worker {idx} failed:\n{error}')
+            ntasks -= 1
+
+    def accumulate(self, keys):
+        '''Accumulate the ELBO and the statistics of a set of
+        utterances with the worker processes.
+
+        Args:
+            keys (list): Keys of the utterances to process.
+
+        Returns:
+            :any:`StatsAccumulator`: Accumulated ELBO. It is reset by
+                the next call to :any:`accumulate`.
+
+        '''
+        if not self._processes:
+            raise RuntimeError('The workers have not been started')
+        keys = list(keys)
+        ntasks = 0
+        for start in range(0, len(keys), self.chunk_size):
+            self._tasks.put(keys[start: start + self.chunk_size])
+            ntasks += 1
+        self._wait(ntasks)
+
+        self._elbo.reset()
+        for acc_stats, counters in zip(self._acc_stats, self._counters):
+            self._elbo.merge(acc_stats)
+            self._elbo._elbo_value += float(counters[0])
+            self._elbo._minibatchsize += int(counters[1])
+            acc_stats.reset()
+        self._counters.zero_()
+        return self._elbo
+
+    def step(self, keys):
+        '''Accumulate the statistics of a set of utterances and update
+        the model.
+
+        Args:
+            keys (list): Keys of the utterances to process.
+
+        Returns:
+            :any:`StatsAccumulator`: Accumulated ELBO before the
+                update.
+
+        '''
+        elbo = self.accumulate(keys)
+        self.optimizer.init_step()
+        elbo.backward()
+        self.optimizer.step()
+
+        # Notify the workers that the parameters have changed.
+        with self._version.get_lock():
+            self._version.value += 1
+        return elbo
+
+
+class DistributedTrainer:
+    '''Train a :any:`BayesianModel` with several processes
+    communicating with ``torch.distributed`` (e.g. with the "gloo"
+    backend on several machines).
+
+    Each process accumulates the statistics of its shard of the
+    utterances, the statistics are summed with a single all-reduce
+    operation and each process applies the same update to its copy
+    of the model.
+
+    Note:
+        The default process group has to be initialized (see
+        ``torch.distributed.init_process_group``) before creating the
+        trainer. Only the models trained with natural gradients are
+        supported.
+
+    Example:
+        >>> torch.distributed.init_process_group('gloo')
+        >>> trainer = beer.DistributedTrainer(model, load_features,
+        ...                                   datasize=n_frames)
+        >>> for epoch in range(epochs):
+        ...     elbo = trainer.step(uttids)
+
+    '''
+
+    def __init__(self, model, features, datasize, lrate=1., group=None,
+                 **kwargs):
+        '''
+        Args:
+            model (:any:`BayesianModel`): Model to train. The
+                parameters of the process of rank 0 are copied to all
+                the other processes.
+            features (function): Function returning the features
+                (``torch.Tensor[n_frames, dim]``) of an utterance given
+                its key.
+            datasize (int): Number of data points of the total
+                training data.
+            lrate (float): Learning rate.
+            group (object): Process group (default: all the
+                processes).
+            kwargs (object): Extra parameters given to
+                :any:`evidence_lower_bound`.
+        '''
+        if not dist.is_available() or not dist.is_initialized():
+            raise RuntimeError('torch.distributed is not initialized')
+        if any(True for _ in model.modules_parameters()):
+            raise ValueError('Models with standard pytorch parameters are '
+                             'not supported')
+        self.model = model
+        self.features = features
+        self.datasize = datasize
+        self.group = group
+        self.kwargs = kwargs
+        self.rank = dist.get_rank(group)
+        self.world_size = dist.get_world_size(group)
+        self._check_layout()
+        self.optimizer = BayesianModelOptimizer(
+            model.mean_field_factorization(), lrate=lrate, contiguous=True)
+        self.optimizer.broadcast_(src=0, group=group)
+        self._elbo = StatsAccumulator(model.bayesian_parameters(), datasize)
+
+    def _check_layout(self):
+        # The statistics are reduced as flat buffers: all the processes
+        # should have the same parameters in the same order.
+        names = '\n'.join(name for name, _ in
+                          self.model.named_bayesian_parameters())
+        checksum = zlib.crc32(names.encode('utf-8'))
+        checksums = torch.tensor([checksum, -checksum], dtype=torch.int64)
+        dist.all_reduce(checksums, op=dist.ReduceOp.MAX, group=self.group)
+        if checksums[0] != checksum or checksums[1] != -checksum:
+            raise ValueError('The processes have different models')
+
+    def accumulate(self, keys, local=False):
+        '''Accumulate the ELBO and the statistics of a set of
+        utterances over all the processes.
+
+        Args:
+            keys (list): Keys of the utterances to process. The list
+                should be the same for all the processes, each
+                process takes a different shard of it.
+            local (bool): If True, `keys` are the keys of the
+                utterances of the current process only (e.g. the
+                utterances stored in the shards assigned to the
+                process).
+
+        Returns:
+            :any:`StatsAccumulator`: Accumulated ELBO. It is reset by
+                the next call to :any:`accumulate`.
+
+        '''
+        self._elbo.reset()
+        keys = list(keys)
+        if not local:
+            keys = keys[self.rank::self.world_size]
+        for key in keys:
+            self._elbo += evidence_lower_bound(self.model, self.features(key),
+                                               datasize=self.datasize,
+                                               **self.kwargs)
+        return self._elbo.all_reduce_(self.group)
+
+    def step(self, keys, local=False):
+        '''Accumulate the statistics of a set of utterances and update
+        the model.
+
+        Args:
+            keys (list): Keys of the utterances to process (same for
+                all the processes).
+            local (bool): If True, `keys` are the keys of the
+                utterances of the current process only.
+
+        Returns:
+            :any:`StatsAccumulator`: Accumulated ELBO before the
+                update.
+
+        '''
+        elbo = self.accumulate(keys, local=local)
+        self.optimizer.init_step()
+        elbo.backward()
+        self.optimizer.step()
+        return elbo
+
+
+__all__ = ['DataParallelTrainer', 'DistributedTrainer']
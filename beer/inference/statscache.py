@@ -0,0 +1,124 @@
+'Cache of the sufficient statistics of the training data.'
+
+from collections import OrderedDict
+
+
+def _compact(stats):
+    # The cached statistics should not keep alive a larger buffer
+    # (e.g. the features when the statistics are a view of them) so
+    # that the size of the cache is the memory it actually holds.
+    stats = stats.detach()
+    if stats.untyped_storage().nbytes() > stats.numel() * stats.element_size():
+        stats = stats.clone()
+    return stats
+
+
+def _nbytes(stats):
+    return stats.untyped_storage().nbytes()
+
+
+class SufficientStatisticsCache:
+    '''In-memory cache of the sufficient statistics of a model with
+    "Least Recently Used" (LRU) eviction policy.
+
+    Note:
+        The cache is only valid for models for which the sufficient
+        statistics depend on the features only (``Normal*``,
+        ``NormalSet*``, ``MixtureSet``, ``HMM``, ``PhoneLoop``, ...).
+        It should not be used with models having trainable
+        transformations of the features (e.g. VAE).
+
+    Example:
+        >>> stats_cache = beer.SufficientStatisticsCache(model,
+        ...                                               max_size=2**30)
+        >>> for epoch in range(epochs):
+        ...     for utt in dataset.utterances():
+        ...         elbo = beer.evidence_lower_bound(model, utt.features,
+        ...                                          stats_cache=stats_cache,
+        ...                                          cache_key=utt.id)
+
+    '''
+    __repr_str = '{classname}(entries={entries}, size={size}, ' \
+                 'max_size={max_size})'
+
+    def __init__(self, model, max_size=-1):
+        '''
+        Args:
+            model (:any:`BayesianModel`): Model used to compute the
+                sufficient statistics.
+            max_size (int): Maximum size (in bytes) of the cache,
+                i.e. of the memory held by the cached statistics. If
+                set to 0 or a negative value, the size of the cache
+                is not bounded.
+        '''
+        self.model = model
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return self.__repr_str.format(
+            classname=self.__class__.__name__,
+            entries=len(self),
+            size=self.size,
+            max_size=self.max_size
+        )
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __getstate__(self):
+        # The cached statistics are not stored with the object.
+        state = self.__dict__.copy()
+        state['_entries'] = OrderedDict()
+        state['_size'] = 0
+        return state
+
+    @property
+    def size(self):
+        'Current size (in bytes) of the cache.'
+        return self._size
+
+    def clear(self):
+        'Remove all the entries of the cache.'
+        self._entries = OrderedDict()
+        self._size = 0
+
+    def _evict(self):
+        while self.max_size > 0 and self._size > self.max_size:
+            _, stats = self._entries.popitem(last=False)
+            self._size -= _nbytes(stats)
+
+    def sufficient_statistics(self, key, data):
+        '''Sufficient statistics of the data. If the statistics of
+        `key` are not in the cache, they are computed and stored.
+
+        Args:
+            key (object): Hashable identifier of the data (e.g. the
+                utterance id).
+            data (``torch.Tensor[n_frames, dim]``): Data.
+
+        Returns:
+            (``torch.Tensor[n_frames, dim_stats]``): Sufficient \
+                statistics of the data.
+
+        '''
+        try:
+            stats = self._entries[key]
+            self._entries.move_to_end(key)
+            self.hits += 1
+        except KeyError:
+            stats = _compact(self.model.sufficient_statistics(data))
+            self._entries[key] = stats
+            self._size += _nbytes(stats)
+            self.misses += 1
+            self._evict()
+        return stats
+
+
+__all__ = ['SufficientStatisticsCache']
@@ -0,0 +1,244 @@
+'Compact storage of the accumulated statistics.'
+
+import multiprocessing
+
+import numpy as np
+import torch
+
+from .objectives import StatsAccumulator
+
+
+class AccumulatedStatistics:
+    '''Accumulated ELBO and statistics of a model stored in a compact
+    form: the statistics of all the parameters are stored in a single
+    ``float64`` buffer and the parameters are identified by their name
+    in the model (see :any:`BayesianModel.named_bayesian_parameters`).
+
+    Contrary to the :any:`StatsAccumulator`, this object does not hold
+    any reference to the model and can be efficiently stored on disk
+    and summed with the statistics accumulated by other jobs.
+
+    Example:
+        >>> stats = beer.AccumulatedStatistics.from_accumulator(
+        ...     elbo, model, nutts=len(uttids))
+        >>> stats.save('stats.npz')
+        ...
+        >>> stats = beer.merge_statistics(['stats1.npz', 'stats2.npz'])
+        >>> elbo = stats.to_accumulator(model)
+        >>> elbo.backward()
+
+    '''
+    __repr_str = '{classname}(elbo={elbo}, nparams={nparams}, ' \
+                 'nframes={nframes}, nutts={nutts})'
+
+    def __init__(self, names, sizes, stats, elbo=0., nframes=0, nutts=0,
+                 datasize=0):
+        '''
+        Args:
+            names (list): Names of the parameters.
+            sizes (list): Number of elements of the statistics of each
+                parameter.
+            stats (``numpy.ndarray``): Flat buffer of the statistics.
+            elbo (float): Value of the ELBO.
+            nframes (int): Number of frames used to accumulated the
+                statistics.
+            nutts (int): Number of utterances used to accumulated the
+                statistics.
+            datasize (int): Number of data points of the total
+                training data.
+        '''
+        if len(names) != len(sizes) or sum(sizes) != len(stats):
+            raise ValueError('Inconsistent layout of the statistics')
+        self.names = list(names)
+        self.sizes = [int(size) for size in sizes]
+        self.stats = np.asarray(stats, dtype=np.float64)
+        self.elbo = float(elbo)
+        self.nframes = int(nframes)
+        self.nutts = int(nutts)
+        self.datasize = int(datasize)
+
+    def __repr__(self):
+        return self.__repr_str.format(
+            classname=self.__class__.__name__,
+            elbo=self.elbo,
+            nparams=len(self.names),
+            nframes=self.nframes,
+            nutts=self.nutts
+        )
+
+    def copy(self):
+        'Return a copy of the statistics.'
+        return AccumulatedStatistics(self.names, self.sizes,
+                                     self.stats.copy(), elbo=self.elbo,
+                                     nframes=self.nframes, nutts=self.nutts,
+                                     datasize=self.datasize)
+
+    def __iadd__(self, other):
+        if self.datasize != other.datasize:
+            raise ValueError('Cannot add statistics accumulated on '
+                             'different data set')
+        if self.names != other.names or self.sizes != other.sizes:
+            raise ValueError('Cannot add statistics of different models')
+        self.stats += other.stats
+        self.elbo += other.elbo
+        self.nframes += other.nframes
+        self.nutts += other.nutts
+        return self
+
+    @staticmethod
+    def _unique_named_parameters(model):
+        # Parameters shared by several components of a model are
+        # stored only once.
+        seen = set()
+        for name, param in model.named_bayesian_parameters():
+            if param not in seen:
+                seen.add(param)
+                yield name, param
+
+    @classmethod
+    def from_accumulator(cls, acc_stats, model, nutts=0):
+        '''Create the compact statistics from an accumulator.
+
+        Args:
+            acc_stats (:any:`StatsAccumulator`): Accumulated ELBO.
+            model (:any:`BayesianModel`): Model with which the
+                statistics were accumulated.
+            nutts (int): Number of utterances.
+
+        Returns:
+            :any:`AccumulatedStatistics`
+
+        '''
+        names, sizes, stats = [], [], []
+        for name, param in cls._unique_named_parameters(model):
+            try:
+                param_stats = acc_stats._views[param]
+            except KeyError:
+                raise ValueError(f'No statistics for parameter: {name}')
+            names.append(name)
+            sizes.append(param_stats.numel())
+            stats.append(param_stats.detach().reshape(-1).double().numpy())
+        stats = np.concatenate(stats) if stats else np.zeros(0)
+        return cls(names, sizes, stats, elbo=float(acc_stats),
+                   nframes=acc_stats._minibatchsize, nutts=nutts,
+                   datasize=acc_stats.datasize)
+
+    def to_accumulator(self, model):
+        '''Create an accumulator for the parameters of `model` with
+        the statistics.
+
+        Args:
+            model (:any:`BayesianModel`): Model with which the
+                statistics were accumulated.
+
+        Returns:
+            :any:`StatsAccumulator`
+
+        '''
+        acc_stats = StatsAccumulator(model.bayesian_parameters(),
+                                     datasize=self.datasize)
+        offset = 0
+        for name, size in zip(self.names, self.sizes):
+            try:
+                view = acc_stats._views[model.bayesian_parameter(name)]
+            except KeyError:
+                raise ValueError(f'Unknown parameter: {name}')
+            values = torch.from_numpy(self.stats[offset: offset + size])
+            view.copy_(values.view_as(view))
+            offset += size
+        acc_stats._elbo_value = self.elbo
+        acc_stats._minibatchsize = self.nframes
+        return acc_stats
+
+    def save(self, path):
+        '''Store the statistics in a (numpy ".npz") file.
+
+        Args:
+            path (str): Path or file object.
+
+        '''
+        def _save(fid):
+            np.savez(fid, names=np.array(self.names, dtype=str),
+                     sizes=np.array(self.sizes, dtype=np.int64),
+                     stats=self.stats,
+                     elbo=np.float64(self.elbo),
+                     counts=np.array([self.nframes, self.nutts,
+                                      self.datasize], dtype=np.int64))
+        if isinstance(path, str):
+            # We use a file object as numpy will add the ".npz"
+            # extension to the path otherwise.
+            with open(path, 'wb') as fid:
+                _save(fid)
+        else:
+            _save(path)
+
+    @classmethod
+    def load(cls, path):
+        '''Load statistics stored with :any:`save`.
+
+        Args:
+            path (str): Path or file object.
+
+        Returns:
+            :any:`AccumulatedStatistics`
+
+        '''
+        with np.load(path) as archive:
+            nframes, nutts, datasize = archive['counts']
+            return cls(archive['names'].tolist(), archive['sizes'].tolist(),
+                       archive['stats'], elbo=archive['elbo'],
+                       nframes=nframes, nutts=nutts, datasize=datasize)
+
+
+def _merge(items):
+    retval = None
+    for item in items:
+        if isinstance(item, str):
+            item = AccumulatedStatistics.load(item)
+        elif retval is None:
+            # Do not modify the statistics given by the caller.
+            item = item.copy()
+        if retval is None:
+            retval = item
+        else:
+            retval += item
+    return retval
+
+
+def merge_statistics(items, jobs=1, fanin=8):
+    '''Sum several accumulated statistics. The statistics are reduced
+    by a tree of parallel jobs: each job sums (at most) `fanin`
+    statistics and the partial sums are reduced in the same way until
+    a single one remains.
+
+    Args:
+        items (list): List of :any:`AccumulatedStatistics` or of
+            paths to files created with :any:`AccumulatedStatistics.save`.
+        jobs (int): Number of parallel jobs.
+        fanin (int): Number of statistics summed by a job.
+
+    Returns:
+        :any:`AccumulatedStatistics`
+
+    '''
+    items = list(items)
+    if not items:
+        raise ValueError('No statistics to merge')
+    if fanin < 2:
+        raise ValueError('"fanin" should be at least 2')
+    pool = multiprocessing.Pool(jobs) if jobs > 1 else None
+    try:
+        while len(items) > 1 or isinstance(items[0], str):
+            groups = [items[i: i + fanin] for i in range(0, len(items), fanin)]
+            if pool is not None and len(groups) > 1:
+                items = pool.map(_merge, groups)
+            else:
+                items = [_merge(group) for group in groups]
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return items[0]
+
+
+__all__ = ['AccumulatedStatistics', 'merge_statistics']
@@ -9,6 +9,18 @@ from .parameters import BayesianParameter
 from .parameters import BayesianParameterSet
 
 
+class _Registry:
+    'Flattened view of the submodels and parameters of a model.'
+
+    def __init__(self, model):
+        self.submodels = tuple(model._iter_submodels())
+        self.named_parameters = tuple(model._iter_named_bayesian_parameters())
+        self.parameters = tuple(param for _, param in self.named_parameters)
+        self.parameters_by_name = dict(self.named_parameters)
+        self.parameters_set = frozenset(self.parameters)
+        self.kl_divs = None
+        self.kl_div = None
+
 
 class BayesianModel(metaclass=abc.ABCMeta):
     '''Abstract base class for all the models.
@@ -25,16 +37,44 @@ class BayesianModel(metaclass=abc.ABCMeta):
         self._modules = {}
         self._const_parameters = {}
         self._cache = {}
+        self._parents = []
+        self._registry = None
+
+    def __getstate__(self):
+        # The registry is rebuilt when needed after loading the model
+        # and the parents register themselves again (pickling a
+        # submodel should not pickle its parents).
+        state = self.__dict__.copy()
+        state['_registry'] = None
+        state['_parents'] = []
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__dict__.setdefault('_parents', [])
+        self.__dict__.setdefault('_registry', None)
+        for submodel in self._submodels.values():
+            submodel._parents.append(self)
+
+    def _invalidate_registry(self):
+        # The registries of the parents include the submodels and the
+        # parameters of this model.
+        self._registry = None
+        for parent in self._parents:
+            parent._invalidate_registry()
 
     def _register_submodel(self, name, submodel):
         self._unregister_submodel(name)
         self._submodels[name] = submodel
+        submodel._parents.append(self)
 
     def _unregister_submodel(self, name):
+        self._invalidate_registry()
         try:
-            del self._submodels[name]
+            submodel = self._submodels.pop(name)
         except KeyError:
-            pass
+            return
+        submodel._parents.remove(self)
 
     def _register_const_parameter(self, name, param):
         self._unregister_const_parameter(name)
@@ -51,6 +91,7 @@ class BayesianModel(metaclass=abc.ABCMeta):
         self._bayesian_parameters[name] = param
 
     def _unregister_parameter(self, name):
+        self._invalidate_registry()
         try:
             del self._bayesian_parameters[name]
         except KeyError:
@@ -61,6 +102,7 @@ class BayesianModel(metaclass=abc.ABCMeta):
         self._bayesian_parameters[name] = paramset
 
     def _unregister_parameterset(self, name):
+        self._invalidate_registry()
         try:
             del self._bayesian_parameters[name]
         except KeyError:
@@ -105,6 +147,19 @@ class BayesianModel(metaclass=abc.ABCMeta):
             for param in submodel.modules_parameters():
                 yield param
 
+    def named_const_parameters(self, prefix=''):
+        '''Iterate over the constant parameters of the model and of its
+        submodels along with their name.
+
+        Returns:
+            iterable of (str, :any:`ConstantParameter`)
+
+        '''
+        for name, param in self._const_parameters.items():
+            yield prefix + name, param
+        for name, submodel in self._submodels.items():
+            yield from submodel.named_const_parameters(prefix + name + '.')
+
     def const_parameters(self):
         for param in self._const_parameters.values():
             yield param
@@ -112,7 +167,27 @@ class BayesianModel(metaclass=abc.ABCMeta):
             for param in submodel.const_parameters():
                 yield param
 
-    def bayesian_parameters(self):
+    def _iter_submodels(self):
+        for submodel in self._submodels.values():
+            yield submodel
+            # A submodel overriding clear_cache() clears the cache of
+            # its own submodels.
+            if type(submodel).clear_cache is BayesianModel.clear_cache:
+                yield from submodel._iter_submodels()
+
+    def _iter_named_bayesian_parameters(self, prefix=''):
+        for name, param in self._bayesian_parameters.items():
+            if isinstance(param, BayesianParameterSet):
+                paramset = param
+                for i, param in enumerate(paramset):
+                    yield prefix + name + '.' + str(i), param
+            else:
+                yield prefix + name, param
+        for name, submodel in self._submodels.items():
+            yield from submodel._iter_named_bayesian_parameters(
+                prefix + name + '.')
+
+    def _iter_bayesian_parameters(self):
         for param in self._bayesian_parameters.values():
             if isinstance(param, BayesianParameterSet):
                 paramset = param
@@ -121,32 +196,98 @@ class BayesianModel(metaclass=abc.ABCMeta):
             else:
                 yield param
         for submodel in self._submodels.values():
-            for param in submodel.bayesian_parameters():
-                if isinstance(param, BayesianParameterSet):
-                    paramset = param
-                    for param in paramset:
-                        yield param
-                else:
-                    yield param
+            for param in submodel._iter_bayesian_parameters():
+                yield param
+
+    def _get_registry(self):
+        registry = self._registry
+        if registry is None:
+            registry = _Registry(self)
+            self._registry = registry
+        return registry
+
+    def bayesian_parameters(self):
+        '''Iterate over the Bayesian parameters of the model and of its
+        submodels.
+
+        Note:
+            The list of parameters is cached until a submodel or a
+            parameter is registered again.
+
+        '''
+        return iter(self._get_registry().parameters)
+
+    def named_bayesian_parameters(self):
+        '''Iterate over the Bayesian parameters of the model and of its
+        submodels along with their name. The name of a parameter is
+        the path of attributes leading to it (e.g.
+        "modelset.means_precisions.0").
+
+        Returns:
+            iterable of (str, :any:`BayesianParameter`)
+
+        '''
+        return iter(self._get_registry().named_parameters)
+
+    def bayesian_parameter(self, name):
+        '''Get a Bayesian parameter of the model or of its submodels
+        from its name.
+
+        Args:
+            name (str): Name of the parameter (see
+                :any:`named_bayesian_parameters`).
+
+        Returns:
+            :any:`BayesianParameter`
+
+        '''
+        try:
+            return self._get_registry().parameters_by_name[name]
+        except KeyError:
+            raise KeyError(f'Unknown parameter: {name}')
+
+    def bayesian_parameters_set(self):
+        '''Set of the Bayesian parameters of the model and of its
+        submodels.
+
+        Returns:
+            ``frozenset``
+
+        '''
+        return self._get_registry().parameters_set
 
     def clear_cache(self):
         '''Clear the cache.'''
         self._cache = {}
-        for submodel in self._submodels.values():
-            submodel.clear_cache()
+        for submodel in self._get_registry().submodels:
+            if type(submodel).clear_cache is BayesianModel.clear_cache:
+                submodel._cache = {}
+            else:
+                submodel.clear_cache()
 
     def kl_div_posterior_prior(self):
         '''Kullback-Leibler divergence between the posterior/prior
         distribution of the "global" parameters.
 
+        Note:
+            The KL divergence of each parameter is cached until the
+            parameter is updated. The total is summed again only if
+            one of the terms has changed.
+
         Returns:
             float: KL( q || p)
 
         '''
-        retval = 0.
-        for parameter in self.bayesian_parameters():
-            retval += parameter.kl_div().view(1)
-        return retval
+        registry = self._get_registry()
+        kl_divs = [parameter.kl_div() for parameter in registry.parameters]
+        if registry.kl_divs is None or \
+                any(kl_div is not cached_kl_div for kl_div, cached_kl_div
+                    in zip(kl_divs, registry.kl_divs)):
+            retval = 0.
+            for kl_div in kl_divs:
+                retval += kl_div.view(1)
+            registry.kl_divs, registry.kl_div = kl_divs, retval
+        return registry.kl_div
 
     def float(self):
         '''Create a new :any:`BayesianModel` with all the parameters set
@@ -207,6 +348,7 @@ class BayesianModel(metaclass=abc.ABCMeta):
         for name, submodel in self._submodels.items():
             new_submodels[name] = submodel.to(device)
         self._submodels = new_submodels
+        self._invalidate_registry()
         return self
 
     ####################################################################
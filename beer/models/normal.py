@@ -4,6 +4,7 @@ covariance matrix.
 '''
 
 import abc
+from functools import lru_cache
 import math
 import torch
 
@@ -15,6 +16,42 @@ from ..priors import NormalWishartPrior
 from ..priors.normalwishart import _logdet
 
 
+@lru_cache(maxsize=16)
+def _triu_indices(dim):
+    '''Row/column indices of the upper-triangular part of a DxD matrix
+    and the weights to apply when computing an inner product between
+    two symmetric matrices stored in packed form.'''
+    rows, cols = torch.triu_indices(dim, dim)
+    weights = 2 - (rows == cols).long()
+    return rows, cols, weights
+
+
+def _packed_quadratic(data):
+    '''Packed upper-triangular part of x * x^T for each row x of the
+    data, i.e. a ``torch.Tensor[n_frames, D * (D + 1) / 2]``.'''
+    rows, cols, _ = _triu_indices(data.shape[-1])
+    return data[:, rows] * data[:, cols]
+
+
+def _pack_matrix(vec_mat, dim):
+    '''Pack a (set of) vectorized symmetric matrix such that the inner
+    product with the packed sufficient statistics is equal to the inner
+    product of the full matrices.'''
+    rows, cols, weights = _triu_indices(dim)
+    mat = vec_mat.reshape(*vec_mat.shape[:-1], dim, dim)
+    return mat[..., rows, cols] * weights.type(vec_mat.dtype).to(vec_mat.device)
+
+
+def _unpack_matrix(packed, dim):
+    '''Vectorized full symmetric matrix from its packed upper-triangular
+    part (inverse of the packing done by :any:`_packed_quadratic`).'''
+    rows, cols, _ = _triu_indices(dim)
+    mat = packed.new_zeros(*packed.shape[:-1], dim, dim)
+    mat[..., rows, cols] = packed
+    mat[..., cols, rows] = packed
+    return mat.reshape(*packed.shape[:-1], dim * dim)
+
+
 class Normal(BayesianModel):
     '''Normal model with prior over the mean and variance parameter.
 
@@ -213,14 +250,41 @@ class NormalFullCovariance(Normal):
 
     @staticmethod
     def sufficient_statistics(data):
+        # The symmetric part of the statistics (x * x^T) is stored in
+        # packed form: D * (D + 1) / 2 values instead of D^2.
         dtype, device = data.dtype, data.device
         return torch.cat([
-            (-.5 * data[:, :, None] * data[:, None, :]).view(len(data), -1),
+            -.5 * _packed_quadratic(data),
             data,
             -.5 * torch.ones(data.size(0), 1, dtype=dtype, device=device),
             .5 * torch.ones(data.size(0), 1, dtype=dtype, device=device),
         ], dim=-1)
 
+    @staticmethod
+    def _pack_natural_parameters(nparams, dim):
+        return torch.cat([
+            _pack_matrix(nparams[..., :dim ** 2], dim),
+            nparams[..., dim ** 2:]
+        ], dim=-1)
+
+    @staticmethod
+    def _unpack_stats(stats, dim):
+        n_packed = (dim * (dim + 1)) // 2
+        return torch.cat([
+            _unpack_matrix(stats[..., :n_packed], dim),
+            stats[..., n_packed:]
+        ], dim=-1)
+
+    def expected_log_likelihood(self, stats):
+        dim = self.dim
+        nparams = self._pack_natural_parameters(
+            self.mean_precision.expected_natural_parameters(), dim)
+        return stats @ nparams - .5 * dim * math.log(2 * math.pi)
+
+    def accumulate(self, stats, parent_msg=None):
+        acc_stats = self._unpack_stats(stats.sum(dim=0), self.dim)
+        return {self.mean_precision: acc_stats.detach()}
+
     @staticmethod
     def _marginal_log_likelihood(prior, stats):
         mean, k, W, dof = prior.to_std_parameters()
@@ -235,7 +299,7 @@ class NormalFullCovariance(Normal):
 
         quad_mean = (torch.ger(mean, mean).view(-1) * W.view(-1)).sum()
         vec_params = torch.cat([
-            2 * W.view(-1),
+            2 * _pack_matrix(W.view(-1), dim),
             W @ mean,
             2 * quad_mean.view(1)
         ])
@@ -16,6 +16,8 @@ from .normal import Normal
 from .normal import NormalIsotropicCovariance
 from .normal import NormalDiagonalCovariance
 from .normal import NormalFullCovariance
+from .normal import _triu_indices
+from .normal import _unpack_matrix
 from ..priors import IsotropicNormalGammaPrior
 from ..priors import JointIsotropicNormalGammaPrior
 from ..priors import NormalGammaPrior
@@ -178,6 +180,17 @@ class NormalSetFullCovariance(NormalSetNonSharedCovariance):
     def sufficient_statistics(data):
         return NormalFullCovariance.sufficient_statistics(data)
 
+    def expected_log_likelihood(self, stats):
+        dim = self.dim
+        nparams = NormalFullCovariance._pack_natural_parameters(
+            self.means_precisions.expected_natural_parameters(), dim)
+        return stats @ nparams.t() - .5 * dim * math.log(2 * math.pi)
+
+    def accumulate(self, stats, weights):
+        acc_stats = NormalFullCovariance._unpack_stats(weights.t() @ stats,
+                                                       self.dim)
+        return dict(zip(self.means_precisions, acc_stats.detach()))
+
     def marginal_log_likelihood(self, stats):
         m_llhs = []
         for param in self.means_precisions:
@@ -238,24 +251,9 @@ class NormalSetSharedCovariance(NormalSet, metaclass=abc.ABCMeta):
         return [[self.means_precision]]
 
     def marginal_log_likelihood(self, stats):
-        joint_nparams = self.means_precision.posterior.natural_parameters
-        np1, np2 = self._split_natural_parameters(joint_nparams)
-        np1 = torch.ones(len(np2), 1, dtype=np1.dtype,
-                         device=np1.device) * np1.view(1, -1)
-        nparams1 = torch.cat([
-            np1[:, :-1],
-            np2,
-            np1[:, -1].view(-1, 1)
-        ], dim=1)[None]
-
-        new_stats = torch.cat([
-            stats[:, :int(self.dim ** 2)],
-            stats[:, int(self.dim ** 2):-1] / len(self),
-            stats[:, -1].view(-1, 1)
-        ], dim=-1)
-        nparams2 = new_stats[:, None, :] + nparams1
-        post = self.means_precision.posterior
-        return post.joint_log_norm(nparams2) - post.joint_log_norm(nparams1)
+        raise NotImplementedError(
+            'The marginal log-likelihood is only implemented for the set '
+            'of Normal densities with a shared full covariance matrix.')
 
 
 class NormalSetSharedIsotropicCovariance(NormalSetSharedCovariance):
@@ -412,8 +410,9 @@ class NormalSetSharedFullCovariance(NormalSetSharedCovariance):
         return NormalSetElement(mean=means[key], cov=cov)
 
     def _split_stats(self, stats):
-        stats1 = torch.cat([stats[:,:self.dim ** 2], stats[:,-1].view(-1, 1)], dim=-1)
-        stats2 = stats[:, self.dim**2:-1]
+        n_packed = (self.dim * (self.dim + 1)) // 2
+        stats1 = torch.cat([stats[:, :n_packed], stats[:, -1].view(-1, 1)], dim=-1)
+        stats2 = stats[:, n_packed:-1]
         return stats1, stats2
 
     def _split_natural_parameters(self, nparams):
@@ -434,15 +433,44 @@ class NormalSetSharedFullCovariance(NormalSetSharedCovariance):
         stats1, stats2 = self._split_stats(stats)
         nparams = self.means_precision.expected_natural_parameters()
         nparams1, nparams2 = self._split_natural_parameters(nparams)
+        nparams1 = NormalFullCovariance._pack_natural_parameters(nparams1,
+                                                                 self.dim)
         exp_llhs = (stats1 @ nparams1)[:, None] + stats2 @ nparams2.t()
         exp_llhs -= .5 * self.dim * math.log(2 * math.pi)
         return exp_llhs
 
+    def marginal_log_likelihood(self, stats):
+        dim, ncomp = self.dim, len(self)
+        n_packed = (dim * (dim + 1)) // 2
+        post = self.means_precision.posterior
+        np1, np2 = self._split_natural_parameters(post.natural_parameters)
+        nparams1 = torch.cat([
+            np1[:-1].view(1, -1).expand(ncomp, -1),
+            np2,
+            np1[-1].view(1, 1).expand(ncomp, 1)
+        ], dim=1)[None]
+
+        # Posterior given each frame. The quadratic term of the
+        # statistics is kept packed: the matrices are only expanded to
+        # compute their log-determinant.
+        rows, cols, _ = _triu_indices(dim)
+        np_mat = np1[:-1].view(dim, dim)[rows, cols] + stats[:, :n_packed]
+        np2s = np2[None, :, :-1] + stats[:, None, n_packed:-2] / ncomp
+        scales = -2 * (np2[None, :, -1] + stats[:, -2:-1] / ncomp)
+        dof = 2 * (np1[-1] + stats[:, -1:]) + dim + 1 - ncomp
+        quad_means = (np2s[:, :, rows] * np2s[:, :, cols]
+                      / scales[:, :, None]).sum(dim=1)
+        mean_cov = _unpack_matrix(-2 * np_mat - quad_means, dim)
+        mean_cov = mean_cov.view(-1, dim, dim)
+        return post._joint_log_norm(scales, mean_cov, dof) \
+            - post.joint_log_norm(nparams1)
+
     def accumulate(self, stats, resps):
+        n_packed = (self.dim * (self.dim + 1)) // 2
         w_stats = resps.t() @ stats
         acc_stats = torch.cat([
-            w_stats[:, :self.dim**2].sum(dim=0),
-            w_stats[:, self.dim**2: self.dim + (self.dim**2)].contiguous().view(-1),
+            _unpack_matrix(w_stats[:, :n_packed].sum(dim=0), self.dim),
+            w_stats[:, n_packed: n_packed + self.dim].contiguous().view(-1),
             w_stats[:, -2].view(-1),
             w_stats[:, -1].sum().view(1)
         ], dim=0)
@@ -14,15 +14,11 @@ class ConstantParameter:
     def __init__(self, tensor, fixed_dtype=False):
         self.fixed_dtype = fixed_dtype
         self.value = tensor
-        self.uuid = uuid.uuid4()
 
     def __repr__(self):
         return self.__repr_str.format(classname=self.__class__.__name__,
                                       value=self.value)
 
-    def __hash__(self):
-        return hash(self.uuid)
-
     def float_(self):
         'Convert value of the parameter to float precision.'
         if not self.fixed_dtype:
@@ -49,7 +45,10 @@ class BayesianParameter:
 
     Note:
         This class is hashable and therefore can be used as a key in a
-        dictionary.
+        dictionary. The hash is preserved when the parameter is
+        pickled. To refer to a parameter independently of the Python
+        object (e.g. in a file), use its name in the model (see
+        :any:`BayesianModel.named_bayesian_parameters`).
 
     Attributes:
         natural_grad (``torch.Tensor``): Natural gradient of the ELBO
@@ -72,10 +71,13 @@ class BayesianParameter:
             torch.zeros_like(self.prior.natural_parameters, dtype=dtype,
                             device=device, requires_grad=False)
         self.uuid = uuid.uuid4()
+        self._kl_div_cache = None
     
     def __getstate__(self):
         self.stats = torch.tensor(self.stats)
-        return self.__dict__
+        state = self.__dict__.copy()
+        state['_kl_div_cache'] = None
+        return state
     
     def __repr__(self):
         return self.__repr_str.format(prior=self.prior, posterior=self.posterior)
@@ -87,6 +89,8 @@ class BayesianParameter:
         return hash(self) == hash(other)
 
     def _dispatch(self):
+        # The natural parameters may have been modified in-place.
+        self._kl_div_cache = None
         for callback in self._callbacks:
             callback()
 
@@ -145,8 +149,21 @@ class BayesianParameter:
         self._dispatch()
 
     def kl_div(self):
-        '''KL divergence posterior/prior.'''
-        return ExpFamilyPrior.kl_div(self.posterior, self.prior)
+        '''KL divergence posterior/prior.
+
+        Note:
+            The value is cached until the parameter is updated.
+
+        '''
+        prior_nparams = self.prior.natural_parameters
+        posterior_nparams = self.posterior.natural_parameters
+        cache = self.__dict__.get('_kl_div_cache', None)
+        if cache is None or cache[0] is not prior_nparams \
+                or cache[1] is not posterior_nparams:
+            kl_div = ExpFamilyPrior.kl_div(self.posterior, self.prior)
+            cache = (prior_nparams, posterior_nparams, kl_div)
+            self._kl_div_cache = cache
+        return cache[2]
 
     def float_(self):
         '''Convert value of the parameter to float precision.'''
@@ -219,8 +236,188 @@ class BayesianParameterSet:
             param.to_(device)
 
 
+class BayesianParameterBuffer:
+    '''Contiguous storage of the natural parameters of the prior and
+    of the posterior and of the accumulated statistics of groups of
+    :any:`BayesianParameter`.
+
+    Each parameter of the groups is bound to views of the buffer so
+    that the natural gradient update of a whole group reduces to a
+    single vectorized operation.
+
+    Note:
+        The parameters should have the same type and be on the same
+        device. If the type or the device of the parameters is
+        changed, a new buffer has to be created.
+
+    Note:
+        A prior shared by several parameters (e.g. the components of
+        a :any:`NormalSet`) is bound to the view of the first of
+        these parameters; the columns of the other parameters hold a
+        copy of it which is refreshed only when the prior is
+        replaced.
+
+    '''
+
+    def __init__(self, groups):
+        '''
+        Args:
+            groups (list): List of list of :any:`BayesianParameter`
+                (e.g. the mean field groups of a model).
+        '''
+        self._groups = [list(group) for group in groups]
+        parameters = [param for group in self._groups for param in group]
+        if not parameters:
+            raise ValueError('No parameters to store in the buffer')
+        tensor = parameters[0].prior.natural_parameters
+        dtypes = set(param.prior.natural_parameters.dtype
+                     for param in parameters)
+        devices = set(param.prior.natural_parameters.device
+                      for param in parameters)
+        if len(dtypes) > 1 or len(devices) > 1:
+            raise ValueError('The parameters should have the same type '
+                             'and be on the same device')
+        total_size = sum(param.prior.natural_parameters.numel()
+                         for param in parameters)
+
+        # The buffer has 3 rows: the prior natural parameters, the
+        # posterior natural parameters and the accumulated statistics.
+        self.buffer = torch.zeros(3, total_size, dtype=tensor.dtype,
+                                  device=tensor.device)
+        self._views = {}
+        self._group_bounds = []
+        offset = 0
+        for group in self._groups:
+            start = offset
+            for param in group:
+                shape = param.prior.natural_parameters.shape
+                size = param.prior.natural_parameters.numel()
+                self._views[param] = tuple(
+                    row[offset: offset + size].view(shape)
+                    for row in self.buffer
+                )
+                offset += size
+            self._group_bounds.append((start, offset))
+
+        self._priors, self._prior_bounds, self._param_priors = {}, {}, {}
+        self._bounds = {param: (None, None) for param in parameters}
+        self.sync()
+
+    def __len__(self):
+        return len(self._views)
+
+    def __contains__(self, param):
+        return param in self._views
+
+    def _group_priors(self):
+        # Parameters of each (distinct) prior. The priors are compared
+        # by identity.
+        priors = {}
+        for param in self._views:
+            priors.setdefault(param.prior, []).append(param)
+        self._priors = priors
+        self._prior_bounds = {prior: self._prior_bounds.get(prior)
+                              for prior in priors}
+        self._param_priors = {param: param.prior for param in self._views}
+
+    def _bind_prior(self, prior):
+        if prior.natural_parameters is self._prior_bounds[prior]:
+            return
+        params = self._priors[prior]
+        value = prior.natural_parameters.detach()
+        for param in params:
+            self._views[param][0].copy_(value)
+        prior.natural_parameters = self._views[params[0]][0]
+        self._prior_bounds[prior] = prior.natural_parameters
+
+    def _bind(self, param):
+        _, posterior_view, stats_view = self._views[param]
+        posterior_t, stats_t = self._bounds[param]
+        if self._param_priors.get(param) is not param.prior:
+            self._group_priors()
+        self._bind_prior(param.prior)
+        if param.posterior.natural_parameters is not posterior_t:
+            posterior_view.copy_(param.posterior.natural_parameters.detach())
+            param.posterior.natural_parameters = posterior_view
+        if param.stats is not stats_t:
+            stats_view.copy_(param.stats.detach())
+            param.stats = stats_view
+        self._bounds[param] = (param.posterior.natural_parameters,
+                               param.stats)
+
+    def sync(self):
+        '''Copy into the buffer the values of the parameters that have
+        been replaced since the last update (e.g. by
+        :any:`BayesianParameter.store_stats`) and bind them again to
+        the buffer.'''
+        for param in self._views:
+            self._bind(param)
+
+    def share_memory_(self):
+        '''Move the buffer to shared memory so that the parameters
+        updated by one process are seen by the processes forked from
+        it.'''
+        self.buffer.share_memory_()
+        return self
+
+    def broadcast_(self, src=0, group=None):
+        '''Replace the parameters by the ones of the process `src` of
+        a ``torch.distributed`` group.
+
+        Args:
+            src (int): Rank of the source process.
+            group (object): Process group (default: all the
+                processes).
+
+        '''
+        import torch.distributed as dist
+        self.sync()
+        dist.broadcast(self.buffer, src, group=group)
+        for prior in self._priors:
+            prior.cache = {}
+        for param in self._views:
+            param.posterior.cache = {}
+            param._dispatch()
+        return self
+
+    def zero_stats(self):
+        'Set the accumulated statistics of all the parameters to zero.'
+        self.buffer[2].zero_()
+        for param in self._views:
+            if param.stats is not self._bounds[param][1]:
+                param.stats = self._views[param][2]
+                self._bounds[param] = (self._bounds[param][0], param.stats)
+
+    def natural_grad_update(self, lrate, group_idx=None):
+        '''Natural gradient update of the posterior distribution of
+        the parameters.
+
+        Args:
+            lrate (float): Learning rate.
+            group_idx (int): Index of the group to update. If None,
+                all the parameters are updated.
+
+        '''
+        if group_idx is None:
+            start, end = 0, self.buffer.shape[1]
+            parameters = self._views
+        else:
+            start, end = self._group_bounds[group_idx]
+            parameters = self._groups[group_idx]
+        for param in parameters:
+            self._bind(param)
+        prior, posterior, stats = self.buffer[:, start:end]
+        posterior.lerp_(prior + stats, lrate)
+        for param in parameters:
+            # The posterior is modified in-place, its cached values
+            # have to be discarded.
+            param.posterior.cache = {}
+            param._dispatch()
+
+
 __all__ = [
     'ConstantParameter',
     'BayesianParameter',
+    'BayesianParameterBuffer',
     'BayesianParameterSet'
 ]
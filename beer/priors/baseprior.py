@@ -115,17 +115,32 @@ class ExpFamilyPrior(metaclass=abc.ABCMeta):
             self.cache['exp_stats'] = exp_stats
         return exp_stats
 
+    def _expected_value(self):
+        # Generic (and slow) fallback for priors that do not provide a
+        # closed-form expression of their expected value.
+        copied_tensor = torch.tensor(self.natural_parameters,
+                                     requires_grad=True)
+        log_norm = self.log_norm(copied_tensor)
+        ta.backward(log_norm)
+        return copied_tensor.grad.detach()
+
     def expected_value(self):
         '''Mean value of the random variable w.r.t. to the distribution.
 
+        Note:
+            The value is cached until the natural parameters of the
+            distribution are modified. Subclasses should override
+            :any:`_expected_value` with a closed-form expression.
+
         Returns:
             ``torch.Tensor``
         '''
-        copied_tensor = torch.tensor(self.natural_parameters,
-                                     requires_grad=True)
-        log_norm = self.log_norm(copied_tensor)
-        ta.backward(log_norm)
-        return copied_tensor.grad.detach()
+        try:
+            exp_value = self.cache['exp_value']
+        except KeyError:
+            exp_value = self._expected_value()
+            self.cache['exp_value'] = exp_value
+        return exp_value
 
     @abc.abstractmethod
     def _log_norm(self, natural_parameters=None):
@@ -31,8 +31,8 @@ class DirichletPrior(ExpFamilyPrior):
             alphas=alphas
         )
 
-    def expected_value(self):
-        alphas = self.to_std_parameters(self.natural_parameters)
+    def _expected_value(self):
+        alphas = self.to_std_parameters()
         return alphas / alphas.sum()
 
     def to_natural_parameters(self, std_parameters=None):
@@ -46,7 +46,7 @@ class DirichletPrior(ExpFamilyPrior):
         return (natural_parameters + 1)
 
     def _expected_sufficient_statistics(self):
-        alphas = self.to_std_parameters(self.natural_parameters)
+        alphas = self.to_std_parameters()
         return (torch.digamma(alphas) - torch.digamma(alphas.sum()))
 
     def _log_norm(self, natural_parameters=None):
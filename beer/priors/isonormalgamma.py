@@ -69,7 +69,7 @@ class IsotropicNormalGammaPrior(ExpFamilyPrior):
             shape / precision
         )
 
-    def expected_value(self):
+    def _expected_value(self):
         mean, _, shape, rate = self.to_std_parameters()
         return mean.view(-1), shape.view(-1) / rate.view(-1)
 
@@ -169,7 +169,7 @@ class JointIsotropicNormalGammaPrior(ExpFamilyPrior):
             shape={shape}, rate={rate}
         )
 
-    def expected_value(self):
+    def _expected_value(self):
         means, _, shape, rate = self.to_std_parameters()
         return means, shape / rate
 
@@ -4,6 +4,7 @@ import math
 import torch
 from .baseprior import ExpFamilyPrior
 from .wishart import _logdet
+from .wishart import _inverse
 
 
 class MatrixNormalPrior(ExpFamilyPrior):
@@ -42,8 +43,8 @@ class MatrixNormalPrior(ExpFamilyPrior):
             cov=repr(cov)
         )
 
-    def expected_value(self):
-        mean, _ = self.to_std_parameters(self.natural_parameters)
+    def _expected_value(self):
+        mean, _ = self.to_std_parameters()
         return mean
 
     def to_natural_parameters(self, mean, cov):
@@ -56,12 +57,12 @@ class MatrixNormalPrior(ExpFamilyPrior):
             natural_parameters = self.natural_parameters
         dim1, dim2 = self.dims
         precision = - 2 *natural_parameters[:int(dim1**2)].view(dim1, dim1)
-        cov = precision.inverse()
+        cov = _inverse(precision)
         mean = cov @ natural_parameters[int(dim1**2):].view(dim1, dim2)
         return mean, cov
 
     def _expected_sufficient_statistics(self):
-        mean, cov = self.to_std_parameters(self.natural_parameters)
+        mean, cov = self.to_std_parameters()
         return torch.cat([
             (self.dims[1] * cov + mean @ mean.t()).view(-1),
             mean.view(-1)
@@ -71,7 +72,7 @@ class MatrixNormalPrior(ExpFamilyPrior):
         if natural_parameters is None:
             natural_parameters = self.natural_parameters
         mean, cov = self.to_std_parameters(natural_parameters)
-        precision = cov.inverse()
+        precision = _inverse(cov)
         log_norm = - self.dims[1] * .5 * _logdet(precision)
         log_norm += .5 * torch.trace(mean.t() @ precision @  mean)
         return log_norm
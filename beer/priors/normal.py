@@ -43,8 +43,8 @@ class NormalFullCovariancePrior(ExpFamilyPrior):
             precision=repr(self.precision_prior)
         )
 
-    def expected_value(self):
-        mean, _ = self.to_std_parameters(self.natural_parameters)
+    def _expected_value(self):
+        mean, _ = self.to_std_parameters()
         return mean
 
     def to_natural_parameters(self, mean, scale):
@@ -58,12 +58,15 @@ class NormalFullCovariancePrior(ExpFamilyPrior):
         return mean, scale
 
     def _expected_sufficient_statistics(self):
-        mean, scale = self.to_std_parameters(self.natural_parameters)
+        # Gradient of the log-normalizer: with L the precision matrix,
+        # E[L mu] = E[L] mean and
+        # E[mu^T L mu] = mean^T E[L] mean + dim / scale.
+        mean, scale = self.to_std_parameters()
         dim = len(mean)
         precision = self.precision_prior.expected_value()
         mean_quad = torch.trace(precision @ torch.ger(mean, mean))
         return torch.cat([
-            precision.inverse() @ mean,
+            precision @ mean,
             (mean_quad + dim / scale).view(1)
         ])
 
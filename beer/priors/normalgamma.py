@@ -51,7 +51,7 @@ class NormalGammaPrior(ExpFamilyPrior):
             shape={shape}, rates={rates}
         )
 
-    def expected_value(self):
+    def _expected_value(self):
         mean, _, shape, rates = self.to_std_parameters()
         return mean.view(-1), shape.view(-1) / rates.view(-1)
 
@@ -153,7 +153,7 @@ class JointNormalGammaPrior(ExpFamilyPrior):
             shape={shape}, rates={rates}
         )
 
-    def expected_value(self):
+    def _expected_value(self):
         means, _, shape, rates = self.to_std_parameters()
         return means, shape / rates
 
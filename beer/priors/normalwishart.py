@@ -4,6 +4,7 @@ import math
 import torch
 from .baseprior import ExpFamilyPrior
 from .wishart import _logdet
+from .wishart import _inverse
 
 
 class NormalWishartPrior(ExpFamilyPrior):
@@ -57,7 +58,7 @@ class NormalWishartPrior(ExpFamilyPrior):
             mean_precision={mean_precision}, dof={dof}
         )
 
-    def expected_value(self):
+    def _expected_value(self):
         mean, _, mean_precision, dof = self.to_std_parameters()
         mean, mean_precision, dof = mean[0], mean_precision[0], dof[0]
         return mean, dof * mean_precision
@@ -92,10 +93,9 @@ class NormalWishartPrior(ExpFamilyPrior):
         mean = np2 / scale
         mean_quad = mean[:, :, None] * mean[:, None, :]
         M = -2 * np1 - scale[:, :, None] * mean_quad
-        eye = M.new_ones(M.size(-1)).diag().expand_as(M)
-        M_inv, _ = torch.gesv(eye, M)
+        M_inv = _inverse(M)
 
-        return mean, scale, M_inv.contiguous(), dof
+        return mean, scale, M_inv, dof
 
     def _expected_sufficient_statistics(self):
         mean, scale, mean_precision, dof = self.to_std_parameters()
@@ -186,7 +186,7 @@ class JointNormalWishartPrior(ExpFamilyPrior):
             mean_precision={mean_precision}, dof={dof}
         )
 
-    def expected_value(self):
+    def _expected_value(self):
         means, _, mean_precision, dof = self.to_std_parameters()
         return means, dof * mean_precision
 
@@ -214,7 +214,7 @@ class JointNormalWishartPrior(ExpFamilyPrior):
         dof = 2 * np4 + dim + 1 - ncomp
         means = np2s / scales[:, None]
         quad_means = (scales[:, None] * means).t() @ means
-        mean_precision = torch.inverse(-2 * np1 - quad_means)
+        mean_precision = _inverse(-2 * np1 - quad_means)
 
         return means, scales, mean_precision, dof
 
@@ -268,24 +268,27 @@ class JointNormalWishartPrior(ExpFamilyPrior):
         quad_means = (np2s[:, :, :, None] * means[:, :, None, :]).sum(dim=1)
         mean_cov = -2 * np1 - quad_means
 
-        # Inverting the set of covariance matrix.
-        #eye = mean_cov.new_ones(mean_cov.size(-1)).diag().expand_as(mean_cov)
-        #mean_precision, _ = torch.gesv(eye, mean_cov)
-
+        # We don't invert the set of covariance matrices: the
+        # log-normalizer only needs their (batched) log-determinant.
         return means, scales[:, :, 0], mean_cov, dof
 
     def joint_log_norm(self, natural_parameters):
         _, scales, mean_cov, dof = \
             self.joint_to_std_parameters(natural_parameters)
+        return self._joint_log_norm(scales, mean_cov, dof)
+
+    def _joint_log_norm(self, scales, mean_cov, dof):
+        '''Log-normalizer from the (batched) standard parameters as
+        returned by :any:`joint_to_std_parameters`.'''
         dtype, device = mean_cov.dtype, mean_cov.device
         dim = self._dim
 
-        ldet = -_logdet(mean_cov).view(len(natural_parameters), -1)
+        ldet = -_logdet(mean_cov).view(len(mean_cov), -1)
         lognorm_prec = .5 * dof * ldet
         seq = torch.arange(1, dim + 1, 1, dtype=dtype, device=device)
         tmp = dof[:, :] + 1 - seq[None, :]
         lognorm_prec += torch.lgamma(.5 * tmp).sum(dim=-1)[:, None]
-        lognorm_prec = lognorm_prec.view(len(natural_parameters), -1)
+        lognorm_prec = lognorm_prec.view(len(mean_cov), -1)
         lognorm_prec += .5 * dof * dim * math.log(2)
         lognorm_prec += .25 * dim * (dim - 1) * math.log(math.pi)
         lognorm = -.5 * dim  * scales.log()
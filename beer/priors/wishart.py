@@ -5,16 +5,39 @@ import torch
 from .baseprior import ExpFamilyPrior
 
 
-def _logdet(mats):
-    '''Log determinant of a positive definite matrix.'''
+def _cholesky(mats):
+    '''Batched Cholesky decomposition of a set of positive definite
+    matrices.
+
+    Args:
+        mats (``torch.Tensor[...,dim,dim]``): Positive definite
+            matrices.
+
+    Returns:
+        ``torch.Tensor[N,dim,dim]``: Lower triangular factors.
+
+    '''
     dim = mats.shape[-1]
-    vmats = mats.view(-1, dim, dim)
-    retval = []
-    for mat in vmats:
-        if mat.requires_grad:
-            mat.register_hook(lambda grad: .5 * (grad + grad.t()))
-        retval.append(2 * torch.log(torch.diag(torch.potrf(mat))).sum().view(1))
-    return torch.cat(retval).view(-1, 1)
+    vmats = mats.reshape(-1, dim, dim)
+    if vmats.requires_grad:
+        vmats.register_hook(lambda grad: .5 * (grad + grad.transpose(-2, -1)))
+    return torch.linalg.cholesky(vmats)
+
+
+def _logdet(mats):
+    '''Log determinant of a (set of) positive definite matrix.'''
+    diags = torch.diagonal(_cholesky(mats), dim1=-2, dim2=-1)
+    return 2 * torch.log(diags).sum(dim=-1).view(-1, 1)
+
+
+def _inverse(mats):
+    '''Inverse of a (set of) positive definite matrix computed from
+    its Cholesky factor with a batched triangular solve.'''
+    chol = _cholesky(mats)
+    eye = torch.eye(chol.shape[-1], dtype=chol.dtype, device=chol.device)
+    chol_inv = torch.linalg.solve_triangular(chol, eye.expand_as(chol),
+                                             upper=False)
+    return (chol_inv.transpose(-2, -1) @ chol_inv).view(mats.shape)
 
 
 class WishartPrior(ExpFamilyPrior):
@@ -70,8 +93,8 @@ class WishartPrior(ExpFamilyPrior):
         nparams[-1] = .5 * (new_dof - dim - 1)
         self.natural_parameters = nparams
 
-    def expected_value(self):
-        scale, dof = self.to_std_parameters(self.natural_parameters)
+    def _expected_value(self):
+        scale, dof = self.to_std_parameters()
         return dof * scale
 
     def to_natural_parameters(self, scale, dof):
@@ -81,16 +104,18 @@ class WishartPrior(ExpFamilyPrior):
             .5 * (dof - dim - 1).view(1),
         ])
 
-    def _to_std_parameters(self, natural_parameters):
-        dim = math.sqrt(len(natural_parameters) - 1)
+    def _to_std_parameters(self, natural_parameters=None):
+        if natural_parameters is None:
+            natural_parameters = self.natural_parameters
+        dim = int(math.sqrt(len(natural_parameters) - 1))
         np1 = natural_parameters[:-1].reshape((dim, dim))
         np2 = natural_parameters[-1]
-        scale = torch.inverse(-2 * np1)
+        scale = _inverse(-2 * np1)
         dof = 2 * np2 + dim + 1
         return scale.contiguous().view((dim, dim)), dof
 
     def _expected_sufficient_statistics(self):
-        scale, dof = self.to_std_parameters(self.natural_parameters)
+        scale, dof = self.to_std_parameters()
         dtype, device = scale.dtype, scale.device
         dim = len(scale)
         scale_logdet = _logdet(scale)
@@ -19,6 +19,7 @@ import test_nnet
 import test_problayers
 import test_arnet
 import test_create_model
+import test_dataset
 import test_bayesmodel
 import test_expfamilyprior
 import test_features
@@ -39,6 +40,7 @@ testcases = {
     'test_priors': test_priors,
     'test_bayesmodel': test_bayesmodel,
     'test_create_model': test_create_model,
+    'test_dataset': test_dataset,
     'test_mixture': test_mixture,
     'test_normal': test_normal,
     'test_subspacemodels': test_subspacemodels,
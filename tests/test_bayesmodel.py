@@ -7,6 +7,7 @@ import sys
 sys.path.insert(0, './')
 sys.path.insert(0, './tests')
 import glob
+import pickle
 import yaml
 import numpy as np
 import torch
@@ -211,8 +212,204 @@ class TestBayesianModel(BaseTest):
         self.weights /= self.weights.sum()
 
 
+class TestBayesianParameterBuffer(BaseTest):
+
+    def setUp(self):
+        self.dim = int(1 + torch.randint(20, (1, 1)).item())
+        self.npoints = int(1 + torch.randint(100, (1, 1)).item())
+        self.data = torch.randn(self.npoints, self.dim).type(self.type)
+        mean = torch.randn(self.dim).type(self.type)
+        cov = torch.eye(self.dim).type(self.type)
+        modelset = beer.NormalSet.create(mean, cov, 3, cov_type='diagonal',
+                                         noise_std=1.)
+        self.model = beer.Mixture.create(modelset)
+        self.lrate = float(torch.rand(1).item())
+
+    def test_create(self):
+        groups = self.model.mean_field_factorization()
+        buffer = beer.BayesianParameterBuffer(groups)
+        params = list(self.model.bayesian_parameters())
+        self.assertEqual(len(buffer), len(params))
+        for param in params:
+            self.assertTrue(param in buffer)
+
+    def test_shared_prior(self):
+        params = list(self.model.modelset.means_precisions)
+        prior = params[0].prior
+        buffer = beer.BayesianParameterBuffer([params])
+        prior_tensor = prior.natural_parameters
+        prior.cache['dummy'] = None
+        buffer.sync()
+        self.assertTrue(prior.natural_parameters is prior_tensor)
+        self.assertTrue('dummy' in prior.cache)
+        for param in params:
+            self.assertTrue(param.prior is prior)
+            self.assertArraysAlmostEqual(buffer._views[param][0].numpy(),
+                                         prior_tensor.numpy())
+
+    def test_natural_grad_update(self):
+        model2 = pickle.loads(pickle.dumps(self.model))
+        optim1 = beer.BayesianModelOptimizer(
+            self.model.mean_field_factorization(), lrate=self.lrate)
+        optim2 = beer.BayesianModelOptimizer(
+            model2.mean_field_factorization(), lrate=self.lrate,
+            contiguous=True)
+        for _ in range(2 * len(optim1.groups)):
+            for model, optim in [(self.model, optim1), (model2, optim2)]:
+                optim.init_step()
+                elbo = beer.evidence_lower_bound(model, self.data,
+                                                 datasize=len(self.data))
+                elbo.backward()
+                optim.step()
+        params1 = list(self.model.bayesian_parameters())
+        params2 = list(model2.bayesian_parameters())
+        for param1, param2 in zip(params1, params2):
+            self.assertArraysAlmostEqual(
+                param1.posterior.natural_parameters.numpy(),
+                param2.posterior.natural_parameters.numpy()
+            )
+            self.assertArraysAlmostEqual(
+                param1.expected_natural_parameters().numpy(),
+                param2.expected_natural_parameters().numpy()
+            )
+
+        # The buffer is re-created when the optimizer is loaded.
+        optim2 = pickle.loads(pickle.dumps(optim2))
+        self.assertTrue(optim2._buffer is not None)
+
+
+class TestBayesianModelRegistry(BaseTest):
+
+    def setUp(self):
+        self.dim = int(1 + torch.randint(20, (1, 1)).item())
+        self.mean = torch.randn(self.dim).type(self.type)
+        self.cov = torch.eye(self.dim).type(self.type)
+        modelset = beer.NormalSet.create(self.mean, self.cov, 3,
+                                         cov_type='diagonal')
+        self.model = beer.Mixture.create(modelset)
+
+    def test_bayesian_parameters(self):
+        params = list(self.model.bayesian_parameters())
+        self.assertEqual(params,
+                         list(self.model._iter_bayesian_parameters()))
+        self.assertEqual(self.model.bayesian_parameters_set(), set(params))
+        self.assertEqual(len(params), 4)
+
+    def test_named_bayesian_parameters(self):
+        named_params = list(self.model.named_bayesian_parameters())
+        self.assertEqual([name for name, _ in named_params],
+                         ['weights', 'modelset.means_precisions.0',
+                          'modelset.means_precisions.1',
+                          'modelset.means_precisions.2'])
+        self.assertEqual([param for _, param in named_params],
+                         list(self.model.bayesian_parameters()))
+        for name, param in named_params:
+            self.assertTrue(self.model.bayesian_parameter(name) is param)
+        with self.assertRaises(KeyError):
+            self.model.bayesian_parameter('modelset.means_precisions.3')
+
+        # The names do not depend on the instance of the model.
+        model = pickle.loads(pickle.dumps(self.model))
+        self.assertEqual([name for name, _ in named_params],
+                         [name for name, _ in
+                          model.named_bayesian_parameters()])
+
+    def test_invalidation(self):
+        params1 = set(self.model.bayesian_parameters())
+
+        # Register a new submodel.
+        modelset = beer.NormalSet.create(self.mean, self.cov, 2,
+                                         cov_type='diagonal')
+        self.model.modelset = modelset
+        params2 = set(self.model.bayesian_parameters())
+        self.assertEqual(len(params2), 3)
+        self.assertEqual(len(params1.intersection(params2)), 1)
+
+        # Register a new parameter in a submodel.
+        submodel = beer.NormalSet.create(self.mean, self.cov, 2,
+                                         cov_type='diagonal')
+        modelset.means_precisions = submodel.means_precisions
+        params3 = set(self.model.bayesian_parameters())
+        self.assertEqual(params3, (params1 & params2) |
+                         set(submodel.means_precisions))
+        self.assertEqual(self.model.bayesian_parameters_set(), params3)
+
+    def test_independent_registries(self):
+        registry = self.model._get_registry()
+        modelset = beer.NormalSet.create(self.mean, self.cov, 2,
+                                         cov_type='diagonal')
+        model = beer.Mixture.create(modelset)
+        model_registry = model._get_registry()
+        modelset_registry = modelset._get_registry()
+
+        # Only the registries of the model and of its parents are
+        # rebuilt.
+        submodel = beer.NormalSet.create(self.mean, self.cov, 2,
+                                         cov_type='diagonal')
+        modelset.means_precisions = submodel.means_precisions
+        self.assertTrue(self.model._get_registry() is registry)
+        self.assertTrue(modelset._get_registry() is not modelset_registry)
+        self.assertTrue(model._get_registry() is not model_registry)
+        self.assertEqual(set(model.bayesian_parameters()),
+                         {model.weights, *submodel.means_precisions})
+
+    def test_kl_div_cache(self):
+        data = torch.randn(10, self.dim).type(self.type)
+        for contiguous in [False, True]:
+            optim = beer.BayesianModelOptimizer(
+                self.model.mean_field_factorization(), lrate=.5,
+                contiguous=contiguous)
+            for _ in range(len(optim.groups)):
+                kl_div1 = self.model.kl_div_posterior_prior()
+                self.assertTrue(kl_div1 is
+                                self.model.kl_div_posterior_prior())
+                kl_div2 = 0.
+                for param in self.model.bayesian_parameters():
+                    kl_div2 += float(beer.priors.ExpFamilyPrior.kl_div(
+                        param.posterior, param.prior))
+                self.assertAlmostEqual(float(kl_div1), float(kl_div2),
+                                       places=self.tolplaces)
+                optim.init_step()
+                elbo = beer.evidence_lower_bound(self.model, data)
+                elbo.backward()
+                optim.step()
+
+    def test_clear_cache(self):
+        calls = []
+
+        class TrackedNormalSet(type(self.model.modelset)):
+            def clear_cache(self):
+                calls.append(self)
+                super().clear_cache()
+
+        modelset = self.model.modelset
+        modelset.__class__ = TrackedNormalSet
+        modelset._cache['dummy'] = None
+        self.model.clear_cache()
+        self.assertEqual(calls, [modelset])
+        self.assertEqual(modelset._cache, {})
+
+    def test_pickle(self):
+        list(self.model.bayesian_parameters())
+        model = pickle.loads(pickle.dumps(self.model))
+        self.assertTrue(model._registry is None)
+        self.assertEqual(len(list(model.bayesian_parameters())), 4)
+
+        # The parents are registered again when the model is loaded.
+        submodel = beer.NormalSet.create(self.mean, self.cov, 2,
+                                         cov_type='diagonal')
+        model.modelset.means_precisions = submodel.means_precisions
+        self.assertEqual(len(list(model.bayesian_parameters())), 3)
+
+        # Loading a submodel does not load its parents.
+        modelset = pickle.loads(pickle.dumps(self.model.modelset))
+        self.assertEqual(modelset._parents, [])
+
+
 __all__ = [
     'TestBayesianParameter',
     'TestBayesianParameterSet',
+    'TestBayesianParameterBuffer',
+    'TestBayesianModelRegistry',
     'TestBayesianModel'
 ]
@@ -0,0 +1,467 @@
+'Test the Dataset structure of the command line interface.'
+
+# pylint: disable=C0413
+# Not all the modules can be placed at the top of the files as we need
+# first to change the PYTHONPATH before to import the modules.
+import sys
+sys.path.insert(0, './')
+sys.path.insert(0, './tests')
+import os
+import struct
+import tempfile
+import numpy as np
+import torch
+
+from beer.cli.dataset import Dataset, PrefetchIterator
+from beer.cli.featurestore import FeatureStore, FeatureStoreWriter
+from beer.cli.featurestore import build_index, load_features
+from beer.cli.featurestore import read_index, write_index
+from beer.cli import featurecache
+from beer.cli.featurecache import FeatureCache
+from beer.cli.featurestats import accumulate
+from beer.cli.kaldi import KaldiArchive
+from basetest import BaseTest
+
+
+class TestDataset(BaseTest):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.dim = int(1 + torch.randint(10, (1, 1)).item())
+        self.feats = {
+            f'utt{i}': np.random.randn(
+                int(1 + torch.randint(50, (1, 1)).item()),
+                self.dim
+            ).astype(np.float32)
+            for i in range(10)
+        }
+        feapath = os.path.join(self.tmpdir.name, 'feats.npz')
+        np.savez_compressed(feapath, **self.feats)
+        size = sum(len(fea) for fea in self.feats.values())
+        self.dataset = Dataset(feapath, torch.zeros(self.dim),
+                               torch.ones(self.dim), size)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_lengths(self):
+        lengths = self.dataset.lengths()
+        self.assertEqual(lengths, {uttid: len(fea)
+                                   for uttid, fea in self.feats.items()})
+        self.assertEqual(len(self.dataset), len(self.feats))
+
+        # Lengths given at creation: the features are not opened.
+        dataset = Dataset('missing.npz', self.dataset.mean,
+                          self.dataset.var, self.dataset.size,
+                          _lengths=lengths)
+        self.assertEqual(len(dataset), len(self.feats))
+        self.assertTrue(dataset.lengths() is lengths)
+
+    def test_utterances_prefetch(self):
+        utts = list(self.dataset.utterances(random_order=False, prefetch=3))
+        self.assertEqual([utt.id for utt in utts], sorted(self.feats))
+        for utt in utts:
+            self.assertEqual(utt.features.dtype, torch.float32)
+            self.assertArraysAlmostEqual(utt.features.numpy(),
+                                         self.feats[utt.id])
+
+    def test_batches(self):
+        batches = list(self.dataset.batches(3, bucketing=True, prefetch=2))
+        self.assertEqual(len(batches), 4)
+        uttids = [utt.id for batch in batches for utt in batch]
+        self.assertEqual(sorted(uttids), sorted(self.feats))
+
+        # With bucketing, the batches do not overlap in length.
+        ranges = sorted((min(len(utt.features) for utt in batch),
+                         max(len(utt.features) for utt in batch))
+                        for batch in batches)
+        for (_, max_len), (min_len, _) in zip(ranges[:-1], ranges[1:]):
+            self.assertLessEqual(max_len, min_len)
+
+    def test_prefetch_error(self):
+        def items():
+            yield 1
+            raise IOError('cannot read')
+        iterator = PrefetchIterator(items())
+        self.assertEqual(next(iterator), 1)
+        with self.assertRaises(IOError):
+            next(iterator)
+        with self.assertRaises(StopIteration):
+            next(iterator)
+
+
+class TestFeatureStore(BaseTest):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.dim = int(1 + torch.randint(10, (1, 1)).item())
+        self.feats = {
+            f'utt{i}': np.random.randn(
+                int(1 + torch.randint(50, (1, 1)).item()),
+                self.dim
+            ).astype(np.float32)
+            for i in range(10)
+        }
+        self.storepath = os.path.join(self.tmpdir.name, 'store')
+        with FeatureStoreWriter(self.storepath) as writer:
+            for uttid, fea in self.feats.items():
+                writer.add(uttid, fea)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_read(self):
+        store = load_features(self.storepath)
+        self.assertTrue(isinstance(store, FeatureStore))
+        self.assertEqual(len(store), len(self.feats))
+        self.assertEqual(sorted(store.keys()), sorted(self.feats))
+        for uttid, fea in self.feats.items():
+            self.assertEqual(store[uttid].dtype, fea.dtype)
+            self.assertArraysAlmostEqual(store[uttid], fea)
+        self.assertEqual(store.lengths(), {uttid: len(fea)
+                                           for uttid, fea in self.feats.items()})
+
+    def test_zero_copy(self):
+        store = FeatureStore(self.storepath)
+        shard = store._shard(0)
+        for uttid in self.feats:
+            self.assertTrue(np.shares_memory(store[uttid], shard))
+
+    def test_dimension_mismatch(self):
+        writer = FeatureStoreWriter(os.path.join(self.tmpdir.name, 'bad'))
+        writer.add('utt0', np.zeros((2, 3)))
+        with self.assertRaises(ValueError):
+            writer.add('utt1', np.zeros((2, 4)))
+        writer.close()
+
+    def test_abort(self):
+        storepath = os.path.join(self.tmpdir.name, 'aborted')
+        with self.assertRaises(IOError):
+            with FeatureStoreWriter(storepath, shard=2) as writer:
+                writer.add('utt0', self.feats['utt0'])
+                raise IOError('cannot read utt1')
+        self.assertEqual(os.listdir(storepath), [])
+
+    def test_dataset(self):
+        size = sum(len(fea) for fea in self.feats.values())
+        dataset = Dataset(self.storepath, torch.zeros(self.dim),
+                          torch.ones(self.dim), size)
+        self.assertEqual(len(dataset), len(self.feats))
+        self.assertEqual(dataset.lengths(),
+                         {uttid: len(fea) for uttid, fea in self.feats.items()})
+        for utt in dataset.utterances(random_order=False):
+            self.assertArraysAlmostEqual(utt.features.numpy(),
+                                         self.feats[utt.id])
+
+    def test_shards(self):
+        storepath = os.path.join(self.tmpdir.name, 'sharded')
+        uttids = sorted(self.feats)
+        writers = [FeatureStoreWriter(storepath, shard=shard)
+                   for shard in range(3)]
+        # The writers of the different shards are used concurrently.
+        for i, uttid in enumerate(uttids):
+            writers[i % 3].add(uttid, self.feats[uttid])
+        for writer in writers:
+            writer.close()
+
+        store = load_features(storepath)
+        self.assertEqual(sorted(store.keys()), uttids)
+        self.assertEqual(store.shards(), {shard: uttids[shard::3]
+                                          for shard in range(3)})
+        for uttid, fea in self.feats.items():
+            self.assertArraysAlmostEqual(store[uttid], fea)
+
+        self.assertEqual(build_index(storepath), len(uttids))
+        self.assertEqual(FeatureStore(storepath).index, store.index)
+
+    def test_partition(self):
+        storepath = os.path.join(self.tmpdir.name, 'sharded')
+        uttids = sorted(self.feats)
+        for shard in range(4):
+            with FeatureStoreWriter(storepath, shard=shard) as writer:
+                for uttid in uttids[shard::4]:
+                    writer.add(uttid, self.feats[uttid])
+        store = FeatureStore(storepath)
+        parts = store.partition(2)
+        self.assertEqual(len(parts), 2)
+        self.assertEqual(sorted(parts[0] + parts[1]), uttids)
+        for uttids in store.shards().values():
+            self.assertTrue(set(uttids) <= set(parts[0]) or
+                            set(uttids) <= set(parts[1]))
+
+    def test_precision(self):
+        for precision, dtype, tol in [('float16', np.float16, 1e-2),
+                                      ('int16', np.int16, 1e-3),
+                                      ('int8', np.int8, 5e-2)]:
+            with self.subTest(precision=precision):
+                storepath = os.path.join(self.tmpdir.name, precision)
+                with FeatureStoreWriter(storepath, shard=1,
+                                        precision=precision) as writer:
+                    for uttid, fea in self.feats.items():
+                        writer.add(uttid, fea)
+                max_error, rms_error = writer.quantization_error()
+                self.assertGreater(max_error, 0.)
+                self.assertLessEqual(rms_error, max_error)
+
+                store = FeatureStore(storepath)
+                self.assertEqual(store._shard(1).dtype, dtype)
+                for uttid, fea in self.feats.items():
+                    fea2 = store[uttid]
+                    self.assertEqual(fea2.shape, fea.shape)
+                    error = np.abs(fea2.astype(np.float64) - fea)
+                    self.assertLessEqual(error.max(), max_error + 1e-6)
+                    # The error is relative to the range of the values.
+                    ranges = fea.max(axis=0) - fea.min(axis=0)
+                    self.assertTrue(np.all(error <= tol * ranges + 1e-3))
+
+    def test_quantized_constant_dimension(self):
+        fea = np.random.randn(20, 3).astype(np.float32)
+        fea[:, 1] = 3.3
+        for precision in ['int16', 'int8']:
+            with self.subTest(precision=precision):
+                storepath = os.path.join(self.tmpdir.name, precision)
+                with FeatureStoreWriter(storepath,
+                                        precision=precision) as writer:
+                    writer.add('utt1', fea)
+                fea2 = FeatureStore(storepath)['utt1']
+                self.assertTrue(np.all(fea2[:, 1] == fea[:, 1]))
+
+    def test_quantized_index_order(self):
+        storepath = os.path.join(self.tmpdir.name, 'int8')
+        with FeatureStoreWriter(storepath, precision='int8') as writer:
+            for uttid, fea in self.feats.items():
+                writer.add(uttid, fea)
+        expected = {uttid: FeatureStore(storepath)[uttid]
+                    for uttid in self.feats}
+
+        # The index is re-ordered and filtered.
+        index = read_index(os.path.join(storepath, 'index.0'))
+        uttids = sorted(index, reverse=True)[:-2]
+        write_index(os.path.join(storepath, 'index'),
+                    [(uttid,) + index[uttid] for uttid in uttids])
+        store = FeatureStore(storepath)
+        self.assertEqual(sorted(store.keys()), sorted(uttids))
+        for uttid in uttids:
+            self.assertArraysAlmostEqual(store[uttid], expected[uttid])
+
+    def test_bad_precision(self):
+        with self.assertRaises(ValueError):
+            FeatureStoreWriter(os.path.join(self.tmpdir.name, 'bad'),
+                               precision='int4')
+
+
+class TestDatasetStatistics(BaseTest):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.dim = int(1 + torch.randint(10, (1, 1)).item())
+        # Large offset to check the numerical stability.
+        self.feats = {
+            f'spk{i % 3}_utt{i}': 1e4 + np.random.randn(
+                int(1 + torch.randint(50, (1, 1)).item()),
+                self.dim
+            )
+            for i in range(20)
+        }
+        self.utt2spk = {uttid: uttid.split('_')[0] for uttid in self.feats}
+        self.feapath = os.path.join(self.tmpdir.name, 'feats.npz')
+        np.savez(self.feapath, **self.feats)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_accumulate(self):
+        all_feats = np.concatenate(list(self.feats.values()))
+        for jobs in [1, 3]:
+            with self.subTest(jobs=jobs):
+                stats = accumulate(self.feapath, jobs=jobs,
+                                   utt2spk=self.utt2spk, chunk_size=3)
+                self.assertEqual(stats.nframes, len(all_feats))
+                self.assertArraysAlmostEqual(stats.mean.numpy(),
+                                             all_feats.mean(axis=0))
+                self.assertArraysAlmostEqual(stats.var.numpy(),
+                                             all_feats.var(axis=0))
+                self.assertEqual(stats.lengths,
+                                 {uttid: len(fea)
+                                  for uttid, fea in self.feats.items()})
+                self.assertEqual(sorted(stats.spk_stats),
+                                 ['spk0', 'spk1', 'spk2'])
+                for spk, (mean, var, count) in stats.spk_stats.items():
+                    feats = np.concatenate([
+                        fea for uttid, fea in self.feats.items()
+                        if self.utt2spk[uttid] == spk
+                    ])
+                    self.assertEqual(count, len(feats))
+                    self.assertArraysAlmostEqual(mean.numpy(),
+                                                 feats.mean(axis=0))
+                    self.assertArraysAlmostEqual(var.numpy(),
+                                                 feats.var(axis=0))
+
+
+def _kaldi_int32(value):
+    return b'\x04' + struct.pack('<i', value)
+
+
+def _kaldi_matrix(token, nrows, ncols, payload, min_value=0., range_=0.):
+    data = b'\0B' + token.encode() + b' '
+    if token in ('FM', 'DM'):
+        data += _kaldi_int32(nrows) + _kaldi_int32(ncols)
+    else:
+        data += struct.pack('<ffii', min_value, range_, nrows, ncols)
+    return data + payload
+
+
+def _uncompress_cm_reference(min_value, range_, headers, data):
+    # Straightforward implementation of Kaldi's decompression.
+    def uint16_to_float(value):
+        return min_value + range_ * 1.52590218966964e-05 * value
+    ncols, nrows = data.shape
+    matrix = np.zeros((nrows, ncols))
+    for col in range(ncols):
+        p0, p25, p75, p100 = [uint16_to_float(h) for h in headers[col]]
+        for row in range(nrows):
+            value = int(data[col, row])
+            if value <= 64:
+                matrix[row, col] = p0 + (p25 - p0) * value / 64
+            elif value <= 192:
+                matrix[row, col] = p25 + (p75 - p25) * (value - 64) / 128
+            else:
+                matrix[row, col] = p75 + (p100 - p75) * (value - 192) / 63
+    return matrix
+
+
+class TestKaldiArchive(BaseTest):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        nrows = int(1 + torch.randint(50, (1, 1)).item())
+        ncols = int(1 + torch.randint(10, (1, 1)).item())
+        self.expected = {}
+        chunks = []
+
+        fm = np.random.randn(nrows, ncols).astype(np.float32)
+        chunks.append(('uttfm', _kaldi_matrix('FM', nrows, ncols,
+                                              fm.tobytes())))
+        self.expected['uttfm'] = fm
+
+        dm = np.random.randn(nrows, ncols)
+        chunks.append(('uttdm', _kaldi_matrix('DM', nrows, ncols,
+                                              dm.tobytes())))
+        self.expected['uttdm'] = dm
+
+        min_value, range_ = -3., 7.
+        cm2 = np.random.randint(0, 2 ** 16, size=(nrows, ncols)).astype('<u2')
+        chunks.append(('uttcm2', _kaldi_matrix('CM2', nrows, ncols,
+                                               cm2.tobytes(), min_value,
+                                               range_)))
+        self.expected['uttcm2'] = min_value + range_ / 65535 * cm2
+
+        cm3 = np.random.randint(0, 2 ** 8, size=(nrows, ncols)).astype('u1')
+        chunks.append(('uttcm3', _kaldi_matrix('CM3', nrows, ncols,
+                                               cm3.tobytes(), min_value,
+                                               range_)))
+        self.expected['uttcm3'] = min_value + range_ / 255 * cm3
+
+        headers = np.sort(np.random.randint(0, 2 ** 16, size=(ncols, 4)),
+                          axis=1).astype('<u2')
+        cm = np.random.randint(0, 2 ** 8, size=(ncols, nrows)).astype('u1')
+        chunks.append(('uttcm', _kaldi_matrix('CM', nrows, ncols,
+                                              headers.tobytes() + cm.tobytes(),
+                                              min_value, range_)))
+        self.expected['uttcm'] = _uncompress_cm_reference(min_value, range_,
+                                                          headers, cm)
+
+        self.arkpath = os.path.join(self.tmpdir.name, 'feats.ark')
+        self.scppath = os.path.join(self.tmpdir.name, 'feats.scp')
+        with open(self.arkpath, 'wb') as ark, open(self.scppath, 'w') as scp:
+            for uttid, data in chunks:
+                ark.write(uttid.encode() + b' ')
+                print(uttid, f'{self.arkpath}:{ark.tell()}', file=scp)
+                ark.write(data)
+        self.nrows = nrows
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_read(self):
+        for path in [self.arkpath, self.scppath]:
+            with self.subTest(path=path):
+                feats = load_features(path)
+                self.assertTrue(isinstance(feats, KaldiArchive))
+                self.assertEqual(sorted(feats.keys()), sorted(self.expected))
+                for uttid, expected in self.expected.items():
+                    self.assertEqual(feats[uttid].shape, expected.shape)
+                    self.assertTrue(np.allclose(feats[uttid], expected,
+                                                atol=1e-4))
+                self.assertEqual(feats.lengths(),
+                                 {uttid: self.nrows for uttid in self.expected})
+
+    def test_zero_copy(self):
+        feats = KaldiArchive(self.scppath)
+        fea = feats['uttfm']
+        self.assertTrue(fea.flags.writeable)
+        self.assertFalse(fea.flags.owndata)
+        self.assertTrue(np.shares_memory(fea, feats['uttfm']))
+
+    def test_dataset(self):
+        dataset = Dataset(self.scppath, torch.zeros(1), torch.ones(1),
+                          self.nrows * len(self.expected))
+        self.assertEqual(len(dataset), len(self.expected))
+        self.assertEqual(dataset.lengths()['uttcm'], self.nrows)
+        for utt in dataset.utterances():
+            self.assertEqual(utt.features.dtype, torch.float32)
+            self.assertTrue(np.allclose(utt.features.numpy(),
+                                        self.expected[utt.id], atol=1e-4))
+
+
+class TestFeatureCache(BaseTest):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.wavpath = os.path.join(self.tmpdir.name, 'utt.wav')
+        with open(self.wavpath, 'wb') as fid:
+            fid.write(b'audio')
+        self.conf = {'nfilters': 26, 'srate': 16000}
+        self.cache = FeatureCache(os.path.join(self.tmpdir.name, 'cache'),
+                                  self.conf)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_put_get(self):
+        key = self.cache.key(self.wavpath)
+        self.assertIsNone(self.cache.get(key))
+        features = np.random.randn(10, 3).astype(np.float32)
+        self.cache.put(key, features)
+        self.assertArraysAlmostEqual(self.cache.get(key), features)
+
+        # Same audio and configuration.
+        cache = FeatureCache(self.cache.path, dict(self.conf))
+        self.assertEqual(cache.key(self.wavpath), key)
+
+    def test_invalidation(self):
+        key = self.cache.key(self.wavpath)
+        cmd = f'cat {self.wavpath} |'
+        cmd_key = self.cache.key(cmd)
+        self.assertNotEqual(key, cmd_key)
+
+        cache = FeatureCache(self.cache.path, {'nfilters': 30, 'srate': 16000})
+        self.assertNotEqual(cache.key(self.wavpath), key)
+
+        # The audio file has been modified.
+        with open(self.wavpath, 'wb') as fid:
+            fid.write(b'new audio')
+        self.assertNotEqual(self.cache.key(self.wavpath), key)
+        self.assertNotEqual(self.cache.key(cmd), cmd_key)
+
+    def test_code_files(self):
+        # The key depends on the extraction of the features and on the
+        # reading of the audio.
+        names = [os.path.basename(path) for path in featurecache._CODE_FILES]
+        self.assertEqual(names, ['features.py', 'extract.py'])
+        for path in featurecache._CODE_FILES:
+            self.assertTrue(os.path.isfile(path))
+
+
+__all__ = ['TestDataset', 'TestFeatureStore', 'TestDatasetStatistics',
+           'TestKaldiArchive', 'TestFeatureCache']
@@ -7,6 +7,8 @@ import sys
 sys.path.insert(0, './')
 sys.path.insert(0, './tests')
 
+import os
+import tempfile
 import beer
 import numpy as np
 from basetest import BaseTest
@@ -28,4 +30,187 @@ class TestFbank(BaseTest):
         self.assertTrue(np.allclose(ref_fea, fea_d_dd))
 
 
-__all__ = ['TestFbank']
+def _reference_features(signal, conf):
+    # Features computed with the basic functions of the module.
+    melspec, fft_len = beer.features.short_term_mspec(
+        signal, flen=conf['window_len'], frate=conf['framerate'],
+        preemph=conf['preemph'], srate=conf['srate'])
+    fbank = beer.features.create_fbank(conf['nfilters'], fft_len,
+                                       srate=conf['srate'],
+                                       lowfreq=conf['cutoff_lfreq'],
+                                       highfreq=conf['cutoff_hfreq'])
+    log_melspec = np.log(1e-6 + melspec @ fbank.T)
+    norm = np.sqrt(2. / conf['nfilters'])
+    dct_bases = np.zeros((conf['nfilters'], conf['n_dct_coeff']))
+    for m in range(conf['n_dct_coeff']):
+        dct_bases[:, m] = np.cos((m + 1) * np.pi / conf['nfilters'] * \
+                                 (np.arange(conf['nfilters']) + 0.5))
+    lifter = 1 + (conf['lifter_coeff'] / 2) * np.sin(np.pi * \
+        (1 + np.arange(conf['n_dct_coeff'])) / conf['lifter_coeff'])
+    features = (log_melspec @ dct_bases) * norm * lifter
+    features = np.c_[log_melspec.sum(axis=-1) * norm, features]
+    features = beer.features.add_deltas(
+        features, tuple([conf['delta_winlen']] * conf['delta_order']))
+    if conf['utt_mnorm']:
+        features -= features.mean(axis=0)
+    return features
+
+
+class TestFeaturePipeline(BaseTest):
+
+    def setUp(self):
+        self.signals = [(1000 * np.random.randn(4000 + 731 * i)).astype(np.int16)
+                        for i in range(3)]
+
+    def test_features(self):
+        for utt_mnorm in [False, True]:
+            with self.subTest(utt_mnorm=utt_mnorm):
+                conf = dict(beer.features.FeaturePipeline.default_conf,
+                            utt_mnorm=utt_mnorm)
+                pipeline = beer.features.FeaturePipeline.from_conf(conf)
+                for signal in self.signals:
+                    features = pipeline(signal)
+                    expected = _reference_features(signal, conf)
+                    self.assertEqual(features.dtype, np.float32)
+                    self.assertEqual(features.shape, expected.shape)
+                    self.assertEqual(features.shape[1], pipeline.dim)
+                    self.assertTrue(np.allclose(features, expected,
+                                                rtol=1e-4, atol=1e-3))
+
+    def test_batch(self):
+        pipeline = beer.features.FeaturePipeline.from_conf({'utt_mnorm': True})
+        batch = pipeline.batch(self.signals)
+        self.assertEqual(len(batch), len(self.signals))
+        for signal, features in zip(self.signals, batch):
+            self.assertTrue(np.allclose(features, pipeline(signal)))
+
+    def test_short_signal(self):
+        pipeline = beer.features.FeaturePipeline.from_conf({})
+        self.assertEqual(pipeline(np.zeros(10)).shape, (0, pipeline.dim))
+
+    def test_unknown_setting(self):
+        with self.assertRaises(ValueError):
+            beer.features.FeaturePipeline.from_conf({'nfilter': 30})
+
+
+class TestStreamingFeatureExtractor(BaseTest):
+
+    def setUp(self):
+        self.signal = (1000 * np.random.randn(8000) + 20).astype(np.int16)
+        self.pipeline = beer.features.FeaturePipeline.from_conf({})
+
+    def _stream(self, extractor, chunk_sizes):
+        features, start = [], 0
+        for chunk_size in chunk_sizes:
+            features.append(extractor.accept(
+                self.signal[start: start + chunk_size]))
+            start += chunk_size
+        features.append(extractor.accept(self.signal[start:]))
+        features.append(extractor.flush())
+        return np.concatenate(features)
+
+    def test_chunks(self):
+        expected = self.pipeline(self.signal)
+        dc_offset = self.signal.astype(np.float32).mean()
+        extractor = beer.features.StreamingFeatureExtractor(
+            self.pipeline, dc_offset=dc_offset)
+        for chunk_sizes in [[1, 159, 160], [1000] * 7, [4000], [3, 5, 7, 11]]:
+            with self.subTest(chunk_sizes=chunk_sizes):
+                features = self._stream(extractor, chunk_sizes)
+                self.assertEqual(features.shape, expected.shape)
+                self.assertTrue(np.allclose(features, expected, atol=1e-3))
+
+    def test_latency(self):
+        extractor = beer.features.StreamingFeatureExtractor(self.pipeline)
+        nframes = self.pipeline._nframes(self.signal)
+        features = extractor.accept(self.signal)
+        self.assertEqual(len(features), nframes - extractor.latency)
+        self.assertEqual(len(extractor.flush()), extractor.latency)
+
+    def test_mean_normalization(self):
+        pipeline = beer.features.FeaturePipeline.from_conf({'utt_mnorm': True})
+        with self.assertRaises(ValueError):
+            beer.features.StreamingFeatureExtractor(pipeline)
+
+
+class TestPipedAudioReader(BaseTest):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.entries = []
+        for i in range(10):
+            path = os.path.join(self.tmpdir.name, f'utt{i}')
+            with open(path, 'wb') as fid:
+                fid.write(f'audio{i}'.encode())
+            inwav = f'cat {path} |' if i % 3 else path
+            self.entries.append((f'utt{i}', inwav, None))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_read(self):
+        # The CLI commands are imported here as they depend on
+        # optional packages.
+        from beer.cli.subcommands.features.extract import PipedAudioReader
+        groups = [self.entries[i: i + 3] for i in range(0, 10, 3)]
+        skipped = self.entries[1][1]
+        reader = PipedAudioReader(iter(groups), jobs=4, depth=2,
+                                  skip=lambda inwav: inwav == skipped)
+        results = list(reader)
+        self.assertEqual([len(group) for group in results], [3, 3, 3, 1])
+        for i, (uttid, inwav, data) in enumerate(sum(results, [])):
+            self.assertEqual((uttid, inwav), self.entries[i][:2])
+            if i % 3 and inwav != skipped:
+                self.assertEqual(data, f'audio{i}'.encode())
+            else:
+                self.assertIsNone(data)
+
+    def test_read_error(self):
+        from beer.cli.subcommands.features.extract import process_group
+        pipeline = beer.features.FeaturePipeline.from_conf({})
+        missing = os.path.join(self.tmpdir.name, 'missing.wav')
+        for inwav in [missing, 'false |']:
+            with self.subTest(inwav=inwav):
+                with self.assertRaisesRegex(ValueError, '^bad: '):
+                    process_group([('bad', inwav, None)], pipeline)
+
+    def test_error(self):
+        from beer.cli.subcommands.features.extract import PipedAudioReader
+        reader = PipedAudioReader(iter([self.entries[:2],
+                                        [('bad', 'false |', None)]]))
+        self.assertEqual(len(next(reader)), 2)
+        with self.assertRaises(ValueError):
+            next(reader)
+
+
+class TestResample(BaseTest):
+
+    def setUp(self):
+        self.signal = (1000 * np.random.randn(8000)).astype(np.int16)
+
+    def test_resample(self):
+        import scipy.signal
+        for srate, target_srate in [(8000, 16000), (44100, 16000)]:
+            resampled = beer.features.resample(self.signal, srate,
+                                               target_srate)
+            expected = scipy.signal.resample_poly(
+                self.signal.astype(np.float64), target_srate, srate)
+            self.assertEqual(resampled.dtype, np.float32)
+            self.assertEqual(len(resampled), len(expected))
+            self.assertArraysAlmostEqual(resampled / 1000, expected / 1000)
+
+    def test_same_rate(self):
+        resampled = beer.features.resample(self.signal, 16000, 16000)
+        self.assertArraysAlmostEqual(resampled, self.signal)
+
+    def test_features(self):
+        pipeline = beer.features.FeaturePipeline.from_conf({})
+        signal = beer.features.resample(self.signal, 8000,
+                                        pipeline.conf['srate'])
+        features = pipeline(signal)
+        self.assertEqual(features.shape[1], pipeline.dim)
+        self.assertTrue(np.all(np.isfinite(features)))
+
+
+__all__ = ['TestFbank', 'TestFeaturePipeline', 'TestStreamingFeatureExtractor',
+           'TestPipedAudioReader', 'TestResample']
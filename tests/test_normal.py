@@ -414,6 +414,151 @@ class TestNormalSetSharedFullCovariance(BaseTest):
         self.assertArraysAlmostEqual(acc_stats1.numpy(), acc_stats2.numpy())
 
 
+class TestPackedFullCovarianceStatistics(BaseTest):
+
+    def setUp(self):
+        self.dim = int(1 + torch.randint(20, (1, 1)).item())
+        self.npoints = int(1 + torch.randint(100, (1, 1)).item())
+        self.data = torch.randn(self.npoints, self.dim).type(self.type)
+        self.mean = torch.randn(self.dim).type(self.type)
+        self.model = beer.NormalFullCovariance.create(
+            self.mean, torch.eye(self.dim).type(self.type))
+        data = self.data
+        self.full_stats = torch.cat([
+            (-.5 * data[:, :, None] * data[:, None, :]).view(len(data), -1),
+            data,
+            -.5 * torch.ones(len(data), 1).type(self.type),
+            .5 * torch.ones(len(data), 1).type(self.type),
+        ], dim=-1)
+
+    def test_exp_llh(self):
+        stats = self.model.sufficient_statistics(self.data)
+        nparams = self.model.mean_precision.expected_natural_parameters()
+        exp_llh1 = self.full_stats @ nparams
+        exp_llh1 -= .5 * self.dim * math.log(2 * math.pi)
+        exp_llh2 = self.model.expected_log_likelihood(stats)
+        self.assertArraysAlmostEqual(exp_llh1.numpy(), exp_llh2.numpy())
+
+    def test_accumulate(self):
+        stats = self.model.sufficient_statistics(self.data)
+        acc_stats1 = self.full_stats.sum(dim=0)
+        acc_stats2 = self.model.accumulate(stats)[self.model.mean_precision]
+        self.assertArraysAlmostEqual(acc_stats1.numpy(), acc_stats2.numpy())
+
+
+
+class TestPackedFullCovarianceSetStatistics(BaseTest):
+
+    def setUp(self):
+        self.dim = int(1 + torch.randint(10, (1, 1)).item())
+        self.npoints = int(1 + torch.randint(100, (1, 1)).item())
+        self.ncomp = int(1 + torch.randint(5, (1, 1)).item())
+        self.data = torch.randn(self.npoints, self.dim).type(self.type)
+        self.mean = torch.randn(self.dim).type(self.type)
+        self.cov = torch.eye(self.dim).type(self.type)
+        self.model = beer.NormalSet.create(self.mean, self.cov, self.ncomp,
+                                           cov_type='full')
+        self.shared_model = beer.NormalSet.create(self.mean, self.cov,
+                                                  self.ncomp,
+                                                  cov_type='full',
+                                                  shared_cov=True)
+        self.resps = torch.rand(self.npoints, self.ncomp).type(self.type)
+        data = self.data
+        self.full_stats = torch.cat([
+            (-.5 * data[:, :, None] * data[:, None, :]).view(len(data), -1),
+            data,
+            -.5 * torch.ones(len(data), 1).type(self.type),
+            .5 * torch.ones(len(data), 1).type(self.type),
+        ], dim=-1)
+
+    def test_exp_llh(self):
+        stats = self.model.sufficient_statistics(self.data)
+        nparams = self.model.means_precisions.expected_natural_parameters()
+        exp_llh1 = self.full_stats @ nparams.t()
+        exp_llh1 -= .5 * self.dim * math.log(2 * math.pi)
+        exp_llh2 = self.model.expected_log_likelihood(stats)
+        self.assertArraysAlmostEqual(exp_llh1.numpy(), exp_llh2.numpy())
+
+    def test_accumulate(self):
+        stats = self.model.sufficient_statistics(self.data)
+        acc_stats1 = self.resps.t() @ self.full_stats
+        acc_stats2 = self.model.accumulate(stats, self.resps)
+        for i, param in enumerate(self.model.means_precisions):
+            self.assertArraysAlmostEqual(acc_stats1[i].numpy(),
+                                         acc_stats2[param].numpy())
+
+    def test_marginal_log_likelihood(self):
+        stats = self.model.sufficient_statistics(self.data)
+        m_llhs1 = []
+        for param in self.model.means_precisions:
+            mean, k, W, dof = param.posterior.to_std_parameters()
+            mean, W = mean.view(-1), W.view(self.dim, self.dim)
+            alpha = 1 + 1 / k
+            lnorm = .5 * torch.logdet(W) + torch.lgamma(.5 * (dof + 1))
+            lnorm -= torch.lgamma(.5 * (dof - self.dim + 1))
+            lnorm -= .5 * self.dim * torch.log(alpha * math.pi)
+            vec_params = torch.cat([
+                2 * W.view(-1),
+                W @ mean,
+                (2 * mean @ W @ mean).view(1)
+            ])
+            kernel = 1 - self.full_stats[:, :-1] @ vec_params / alpha
+            m_llhs1.append(-.5 * (dof + 1) * kernel.log() + lnorm)
+        m_llhs1 = torch.stack(m_llhs1, dim=-1)
+        m_llhs2 = self.model.marginal_log_likelihood(stats)
+        self.assertArraysAlmostEqual(m_llhs1.numpy(), m_llhs2.numpy())
+
+    def test_shared_exp_llh(self):
+        model = self.shared_model
+        stats = model.sufficient_statistics(self.data)
+        nparams = model.means_precision.expected_natural_parameters()
+        nparams1, nparams2 = model._split_natural_parameters(nparams)
+        stats1 = torch.cat([self.full_stats[:, :self.dim ** 2],
+                            self.full_stats[:, -1:]], dim=-1)
+        stats2 = self.full_stats[:, self.dim ** 2:-1]
+        exp_llh1 = (stats1 @ nparams1)[:, None] + stats2 @ nparams2.t()
+        exp_llh1 -= .5 * self.dim * math.log(2 * math.pi)
+        exp_llh2 = model.expected_log_likelihood(stats)
+        self.assertArraysAlmostEqual(exp_llh1.numpy(), exp_llh2.numpy())
+
+    def test_shared_accumulate(self):
+        model = self.shared_model
+        stats = model.sufficient_statistics(self.data)
+        dim2 = self.dim ** 2
+        w_stats = self.resps.t() @ self.full_stats
+        acc_stats1 = torch.cat([
+            w_stats[:, :dim2].sum(dim=0),
+            w_stats[:, dim2:dim2 + self.dim].reshape(-1),
+            w_stats[:, -2],
+            w_stats[:, -1].sum().view(1)
+        ])
+        acc_stats2 = model.accumulate(stats, self.resps)[model.means_precision]
+        self.assertArraysAlmostEqual(acc_stats1.numpy(), acc_stats2.numpy())
+
+    def test_shared_marginal_log_likelihood(self):
+        model = self.shared_model
+        stats = model.sufficient_statistics(self.data)
+        post = model.means_precision.posterior
+        np1, np2 = model._split_natural_parameters(post.natural_parameters)
+        np1 = np1.view(1, -1).repeat(self.ncomp, 1)
+        nparams1 = torch.cat([np1[:, :-1], np2, np1[:, -1:]], dim=1)[None]
+        new_stats = torch.cat([
+            self.full_stats[:, :self.dim ** 2],
+            self.full_stats[:, self.dim ** 2:-1] / self.ncomp,
+            self.full_stats[:, -1:]
+        ], dim=-1)
+        nparams2 = new_stats[:, None, :] + nparams1
+        m_llhs1 = post.joint_log_norm(nparams2) - post.joint_log_norm(nparams1)
+        m_llhs2 = model.marginal_log_likelihood(stats)
+        self.assertArraysAlmostEqual(m_llhs1.numpy(), m_llhs2.numpy())
+
+    def test_shared_diagonal_marginal_log_likelihood(self):
+        model = beer.NormalSet.create(self.mean, self.cov, self.ncomp,
+                                      cov_type='diagonal', shared_cov=True)
+        stats = model.sufficient_statistics(self.data)
+        with self.assertRaises(NotImplementedError):
+            model.marginal_log_likelihood(stats)
+
 __all__ = [
     'TestNormalDiagonalCovariance',
     'TestNormalFullCovariance',
@@ -422,5 +567,7 @@ __all__ = [
     'TestNormalSetSharedDiagonalCovariance',
     'TestNormalSetSharedFullCovariance',
     'TestNormalIsotropicCovariance',
-    'TestNormalsotropicCovarianceSet'
+    'TestNormalsotropicCovarianceSet',
+    'TestPackedFullCovarianceStatistics',
+    'TestPackedFullCovarianceSetStatistics'
 ]
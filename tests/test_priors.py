@@ -21,6 +21,15 @@ class BaseTestPrior(BaseTest):
         stats2 = copied_tensor.grad
         self.assertArraysAlmostEqual(stats1.numpy(), stats2.numpy())
 
+    def test_expected_value_cache(self):
+        exp_value1 = self.prior.expected_value()
+        exp_value2 = self.prior.expected_value()
+        self.assertTrue(exp_value1 is exp_value2)
+        self.prior.natural_parameters = self.prior.natural_parameters.clone()
+        self.assertTrue('exp_value' not in self.prior.cache)
+        exp_value3 = self.prior.expected_value()
+        self.assertFalse(exp_value1 is exp_value3)
+
 ########################################################################
 # Dirichlet.
 ########################################################################
@@ -307,6 +316,34 @@ class TestJointNormalWishartPrior(BaseTestPrior):
                                      self.prior.natural_parameters.numpy())
 
 
+########################################################################
+# Batched linear algebra helpers.
+########################################################################
+
+class TestWishartUtils(BaseTest):
+
+    def setUp(self):
+        dim = 5
+        self.mats = torch.randn(4, dim, dim).type(self.type)
+        self.mats = self.mats @ self.mats.transpose(-2, -1) \
+            + torch.eye(dim).type(self.type)
+
+    def test_logdet(self):
+        logdets = beer.priors.wishart._logdet(self.mats)
+        self.assertEqual(logdets.shape, (len(self.mats), 1))
+        for mat, logdet in zip(self.mats, logdets):
+            _, ref_logdet = mat.slogdet()
+            self.assertAlmostEqual(float(logdet), float(ref_logdet),
+                                   places=self.tolplaces)
+
+    def test_inverse(self):
+        inv_mats = beer.priors.wishart._inverse(self.mats)
+        self.assertEqual(inv_mats.shape, self.mats.shape)
+        for mat, inv_mat in zip(self.mats, inv_mats):
+            self.assertArraysAlmostEqual(inv_mat.numpy(),
+                                         mat.inverse().numpy())
+
+
 __all__ = [
     'TestDirichletPrior',
     'TestGammaPrior',
@@ -317,5 +354,6 @@ __all__ = [
     'TestJointNormalWishartPrior',
     'TestNormalGammaPrior',
     'TestNormalWishartPrior',
-    'TestWishartPrior'
+    'TestWishartPrior',
+    'TestWishartUtils'
 ]
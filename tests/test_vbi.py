@@ -3,7 +3,11 @@
 import sys
 sys.path.insert(0, './')
 import glob
+import multiprocessing
 import os
+import pickle
+import tempfile
+import types
 import unittest
 import yaml
 import torch
@@ -155,4 +159,363 @@ class TestEvidenceLowerbound(BaseTest):
                     previous = elbo
 
 
-__all__ = ['TestEvidenceLowerbound']
+class TestSufficientStatisticsCache(BaseTest):
+
+    def setUp(self):
+        self.dim = int(1 + torch.randint(20, (1, 1)).item())
+        self.npoints = int(1 + torch.randint(100, (1, 1)).item())
+        self.data = torch.randn(self.npoints, self.dim).type(self.type)
+        mean = torch.randn(self.dim).type(self.type)
+        cov = torch.eye(self.dim).type(self.type)
+        self.model = beer.NormalDiagonalCovariance.create(mean, cov)
+
+    def test_sufficient_statistics(self):
+        stats_cache = beer.SufficientStatisticsCache(self.model)
+        stats1 = self.model.sufficient_statistics(self.data)
+        stats2 = stats_cache.sufficient_statistics('utt1', self.data)
+        stats3 = stats_cache.sufficient_statistics('utt1', self.data)
+        self.assertArraysAlmostEqual(stats1.numpy(), stats2.numpy())
+        self.assertTrue(stats2 is stats3)
+        self.assertEqual(stats_cache.hits, 1)
+        self.assertEqual(stats_cache.misses, 1)
+        self.assertEqual(stats_cache.size,
+                         stats1.numel() * stats1.element_size())
+
+    def test_eviction(self):
+        stats = self.model.sufficient_statistics(self.data)
+        entry_size = stats.numel() * stats.element_size()
+        stats_cache = beer.SufficientStatisticsCache(self.model,
+                                                     max_size=2 * entry_size)
+        stats_cache.sufficient_statistics('utt1', self.data)
+        stats_cache.sufficient_statistics('utt2', self.data)
+        stats_cache.sufficient_statistics('utt1', self.data)
+        stats_cache.sufficient_statistics('utt3', self.data)
+        self.assertEqual(len(stats_cache), 2)
+        self.assertTrue('utt1' in stats_cache)
+        self.assertFalse('utt2' in stats_cache)
+        self.assertTrue('utt3' in stats_cache)
+        self.assertLessEqual(stats_cache.size, 2 * entry_size)
+
+    def test_elbo(self):
+        stats_cache = beer.SufficientStatisticsCache(self.model)
+        elbo1 = beer.evidence_lower_bound(self.model, self.data)
+        for _ in range(2):
+            elbo2 = beer.evidence_lower_bound(self.model, self.data,
+                                              stats_cache=stats_cache,
+                                              cache_key='utt1')
+            self.assertAlmostEqual(float(elbo1), float(elbo2),
+                                   places=self.tolplaces)
+
+    def test_other_model(self):
+        model = pickle.loads(pickle.dumps(self.model))
+        stats_cache = beer.SufficientStatisticsCache(model)
+        with self.assertRaises(ValueError):
+            beer.evidence_lower_bound(self.model, self.data,
+                                      stats_cache=stats_cache,
+                                      cache_key='utt1')
+
+    def test_size_of_views(self):
+        # Statistics which are a view of a larger tensor (here, the
+        # data itself) are copied.
+        model = types.SimpleNamespace(sufficient_statistics=lambda data: data)
+        stats_cache = beer.SufficientStatisticsCache(model)
+        data = torch.randn(10, self.dim).type(self.type)
+        stats = stats_cache.sufficient_statistics('utt1', data[:1])
+        self.assertEqual(stats.untyped_storage().nbytes(),
+                         stats.numel() * stats.element_size())
+        self.assertEqual(stats_cache.size,
+                         stats.numel() * stats.element_size())
+
+
+class TestNaturalGradientEvidenceLowerBound(BaseTest):
+
+    def setUp(self):
+        self.dim = int(1 + torch.randint(20, (1, 1)).item())
+        self.npoints = int(1 + torch.randint(100, (1, 1)).item())
+        self.data = torch.randn(self.npoints, self.dim).type(self.type)
+        mean = torch.randn(self.dim).type(self.type)
+        cov = torch.eye(self.dim).type(self.type)
+        self.model = beer.NormalDiagonalCovariance.create(mean, cov)
+
+    def test_no_grad(self):
+        elbo = beer.evidence_lower_bound(datasize=len(self.data))
+        for _ in range(2):
+            elbo += beer.evidence_lower_bound(self.model, self.data,
+                                              datasize=len(self.data))
+        self.assertTrue(isinstance(elbo._elbo_value, float))
+        elbo.backward()
+        stats = self.model.sufficient_statistics(self.data).sum(dim=0)
+        self.assertFalse(self.model.mean_precision.stats.requires_grad)
+        self.assertArraysAlmostEqual(self.model.mean_precision.stats.numpy(),
+                                     stats.numpy())
+
+
+class TestStatsAccumulator(BaseTest):
+
+    def setUp(self):
+        self.dim = int(1 + torch.randint(20, (1, 1)).item())
+        self.npoints = int(1 + torch.randint(100, (1, 1)).item())
+        self.data = torch.randn(self.npoints, self.dim).type(self.type)
+        mean = torch.randn(self.dim).type(self.type)
+        cov = torch.eye(self.dim).type(self.type)
+        modelset = beer.NormalSet.create(mean, cov, 3, cov_type='diagonal')
+        self.model = beer.Mixture.create(modelset)
+        self.datasize = 2 * len(self.data)
+
+    def test_accumulate(self):
+        elbo1 = beer.evidence_lower_bound(datasize=self.datasize)
+        elbo2 = beer.StatsAccumulator(self.model.bayesian_parameters(),
+                                      datasize=self.datasize)
+        for _ in range(2):
+            elbo = beer.evidence_lower_bound(self.model, self.data,
+                                             datasize=self.datasize)
+            elbo1 += elbo
+            elbo2 += elbo
+        self.assertAlmostEqual(float(elbo1), float(elbo2),
+                               places=self.tolplaces)
+        for param in self.model.bayesian_parameters():
+            self.assertArraysAlmostEqual(elbo1._acc_stats[param].numpy(),
+                                         elbo2._views[param].numpy())
+
+    def test_merge(self):
+        elbo1 = beer.StatsAccumulator(self.model.bayesian_parameters(),
+                                      datasize=self.datasize)
+        elbo2 = beer.StatsAccumulator(self.model.bayesian_parameters(),
+                                      datasize=self.datasize)
+        elbo = beer.evidence_lower_bound(self.model, self.data,
+                                         datasize=self.datasize)
+        elbo1 += elbo
+        elbo2 += elbo
+        elbo2 = pickle.loads(pickle.dumps(elbo2))
+        elbo1.merge(elbo2)
+        self.assertAlmostEqual(float(elbo1), 2 * float(elbo),
+                               places=self.tolplaces)
+        elbo1.backward()
+        for param in self.model.bayesian_parameters():
+            self.assertArraysAlmostEqual(param.stats.numpy(),
+                                         2 * elbo._acc_stats[param].numpy())
+
+    def test_reset(self):
+        elbo1 = beer.StatsAccumulator(self.model.bayesian_parameters(),
+                                      datasize=self.datasize)
+        elbo1 += beer.evidence_lower_bound(self.model, self.data,
+                                           datasize=self.datasize)
+        elbo1.reset()
+        self.assertEqual(float(elbo1), 0.)
+        for param in self.model.bayesian_parameters():
+            self.assertAlmostEqual(float(elbo1._views[param].abs().sum()), 0.)
+
+    def test_backward_empty(self):
+        elbo = beer.StatsAccumulator(self.model.bayesian_parameters(),
+                                     datasize=self.datasize)
+        with self.assertRaises(ValueError):
+            elbo.backward()
+
+
+class TestDataParallelTrainer(BaseTest):
+
+    def setUp(self):
+        self.dim = int(1 + torch.randint(10, (1, 1)).item())
+        self.data = {
+            str(i): torch.randn(int(1 + torch.randint(50, (1, 1)).item()),
+                                self.dim).type(self.type)
+            for i in range(10)
+        }
+        self.datasize = sum(len(fea) for fea in self.data.values())
+        mean = torch.randn(self.dim).type(self.type)
+        cov = torch.eye(self.dim).type(self.type)
+        modelset = beer.NormalSet.create(mean, cov, 3, cov_type='diagonal')
+        self.model = beer.Mixture.create(modelset)
+
+    def test_step(self):
+        model = pickle.loads(pickle.dumps(self.model))
+        optim = beer.BayesianModelOptimizer(model.mean_field_factorization())
+        elbos1 = []
+        for _ in range(3):
+            elbo = beer.StatsAccumulator(model.bayesian_parameters(),
+                                         datasize=self.datasize)
+            for key in sorted(self.data):
+                elbo += beer.evidence_lower_bound(model, self.data[key],
+                                                  datasize=self.datasize)
+            optim.init_step()
+            elbo.backward()
+            optim.step()
+            elbos1.append(float(elbo))
+
+        elbos2 = []
+        with beer.DataParallelTrainer(self.model, self.data.__getitem__,
+                                      self.datasize, workers=2) as trainer:
+            for _ in range(3):
+                elbos2.append(float(trainer.step(self.data.keys())))
+        self.assertArraysAlmostEqual(elbos1, elbos2)
+        for param1, param2 in zip(model.bayesian_parameters(),
+                                  self.model.bayesian_parameters()):
+            self.assertArraysAlmostEqual(
+                param1.posterior.natural_parameters.numpy(),
+                param2.posterior.natural_parameters.numpy()
+            )
+
+    def test_worker_error(self):
+        def features(key):
+            raise KeyError(key)
+        with beer.DataParallelTrainer(self.model, features, self.datasize,
+                                      workers=2) as trainer:
+            with self.assertRaises(RuntimeError):
+                trainer.step(self.data.keys())
+
+
+class TestAccumulatedStatistics(BaseTest):
+
+    def setUp(self):
+        self.dim = int(1 + torch.randint(10, (1, 1)).item())
+        self.data = [torch.randn(int(1 + torch.randint(50, (1, 1)).item()),
+                                 self.dim).type(self.type)
+                     for i in range(5)]
+        self.datasize = sum(len(fea) for fea in self.data)
+        mean = torch.randn(self.dim).type(self.type)
+        cov = torch.eye(self.dim).type(self.type)
+        modelset = beer.NormalSet.create(mean, cov, 3, cov_type='diagonal')
+        self.model = beer.Mixture.create(modelset)
+        self.elbos = []
+        for fea in self.data:
+            elbo = beer.StatsAccumulator(self.model.bayesian_parameters(),
+                                         datasize=self.datasize)
+            elbo += beer.evidence_lower_bound(self.model, fea,
+                                              datasize=self.datasize)
+            self.elbos.append(elbo)
+
+    def test_save_load(self):
+        stats = beer.AccumulatedStatistics.from_accumulator(
+            self.elbos[0], self.model, nutts=1)
+        with tempfile.TemporaryFile() as fid:
+            stats.save(fid)
+            fid.seek(0)
+            stats2 = beer.AccumulatedStatistics.load(fid)
+        self.assertEqual(stats.names, stats2.names)
+        self.assertEqual(stats.sizes, stats2.sizes)
+        self.assertArraysAlmostEqual(stats.stats, stats2.stats)
+        self.assertAlmostEqual(stats.elbo, stats2.elbo)
+        self.assertEqual(stats2.nframes, len(self.data[0]))
+        self.assertEqual(stats2.nutts, 1)
+        self.assertEqual(stats2.datasize, self.datasize)
+
+        elbo = stats2.to_accumulator(self.model)
+        self.assertAlmostEqual(float(elbo), float(self.elbos[0]),
+                               places=self.tolplaces)
+        for param in self.model.bayesian_parameters():
+            self.assertArraysAlmostEqual(elbo._views[param].numpy(),
+                                         self.elbos[0]._views[param].numpy())
+
+    def test_merge(self):
+        total = beer.StatsAccumulator(self.model.bayesian_parameters(),
+                                      datasize=self.datasize)
+        for elbo in self.elbos:
+            total.merge(elbo)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            paths = []
+            for i, elbo in enumerate(self.elbos):
+                path = os.path.join(tmpdir, f'stats{i}.npz')
+                beer.AccumulatedStatistics.from_accumulator(
+                    elbo, self.model, nutts=1).save(path)
+                paths.append(path)
+            for jobs in [1, 2]:
+                stats = beer.merge_statistics(paths, jobs=jobs, fanin=2)
+                self.assertEqual(stats.nutts, len(self.elbos))
+                elbo = stats.to_accumulator(self.model)
+                self.assertAlmostEqual(float(elbo), float(total),
+                                       places=self.tolplaces)
+                for param in self.model.bayesian_parameters():
+                    self.assertArraysAlmostEqual(
+                        elbo._views[param].numpy(),
+                        total._views[param].numpy()
+                    )
+
+
+def _distributed_training(rank, world_size, init_method, model, data,
+                          datasize, results, local=False):
+    torch.distributed.init_process_group('gloo', init_method=init_method,
+                                         rank=rank, world_size=world_size)
+    if rank != 0:
+        # The parameters of the rank 0 should be used by all processes.
+        for param in model.bayesian_parameters():
+            param.posterior.natural_parameters = \
+                param.posterior.natural_parameters + 1
+    trainer = beer.DistributedTrainer(model, data.__getitem__, datasize)
+    keys = sorted(data)
+    if local:
+        # Contiguous (instead of interleaved) partition of the keys.
+        size = (len(keys) + world_size - 1) // world_size
+        keys = keys[rank * size: (rank + 1) * size]
+    elbos = [float(trainer.step(keys, local=local)) for _ in range(3)]
+    params = [param.posterior.natural_parameters.numpy()
+              for param in model.bayesian_parameters()]
+    results.put((rank, elbos, params))
+    torch.distributed.destroy_process_group()
+
+
+class TestDistributedTrainer(BaseTest):
+
+    def setUp(self):
+        self.dim = int(1 + torch.randint(10, (1, 1)).item())
+        self.data = {
+            str(i): torch.randn(int(1 + torch.randint(50, (1, 1)).item()),
+                                self.dim).type(self.type)
+            for i in range(10)
+        }
+        self.datasize = sum(len(fea) for fea in self.data.values())
+        mean = torch.randn(self.dim).type(self.type)
+        cov = torch.eye(self.dim).type(self.type)
+        modelset = beer.NormalSet.create(mean, cov, 3, cov_type='diagonal')
+        self.model = beer.Mixture.create(modelset)
+
+    def test_step(self):
+        self._test_step(local=False)
+
+    def test_step_local(self):
+        self._test_step(local=True)
+
+    def _test_step(self, local):
+        model = pickle.loads(pickle.dumps(self.model))
+        optim = beer.BayesianModelOptimizer(model.mean_field_factorization())
+        elbos1 = []
+        for _ in range(3):
+            elbo = beer.StatsAccumulator(model.bayesian_parameters(),
+                                         datasize=self.datasize)
+            for key in sorted(self.data):
+                elbo += beer.evidence_lower_bound(model, self.data[key],
+                                                  datasize=self.datasize)
+            optim.init_step()
+            elbo.backward()
+            optim.step()
+            elbos1.append(float(elbo))
+        params1 = [param.posterior.natural_parameters.numpy()
+                   for param in model.bayesian_parameters()]
+
+        world_size = 2
+        context = multiprocessing.get_context('fork')
+        results = context.Queue()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            init_method = 'file://' + os.path.join(tmpdir, 'init')
+            processes = [
+                context.Process(target=_distributed_training,
+                                args=(rank, world_size, init_method,
+                                      self.model, self.data, self.datasize,
+                                      results, local))
+                for rank in range(world_size)
+            ]
+            for process in processes:
+                process.start()
+            outputs = [results.get(timeout=120) for _ in processes]
+            for process in processes:
+                process.join()
+
+        for _, elbos2, params2 in outputs:
+            self.assertArraysAlmostEqual(elbos1, elbos2)
+            for param1, param2 in zip(params1, params2):
+                self.assertArraysAlmostEqual(param1, param2)
+
+
+__all__ = ['TestEvidenceLowerbound', 'TestSufficientStatisticsCache',
+           'TestNaturalGradientEvidenceLowerBound', 'TestStatsAccumulator',
+           'TestDataParallelTrainer', 'TestDistributedTrainer',
+           'TestAccumulatedStatistics']